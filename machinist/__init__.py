@@ -20,11 +20,11 @@ transitions.  The current state of the machine changes to a new value each time
 an input is mapped to an output (though the new value may be the same as the
 old value).
 
-For this implementation of finite state machines, L{twisted.python.constants}
-is used for the definitions of all inputs, outputs, and states.  All inputs
-must be defined as L{NamedConstant} attributes of a L{Names} subclass.  All
-outputs must be similarly defined on another class.  And likewise, all states
-must be defined this way as well.
+The inputs, outputs, and states of a finite state machine are each defined in
+one of three ways: as L{NamedConstant} attributes of a
+L{twisted.python.constants.Names} subclass, as the members of an
+L{enum.Enum} subclass, or as a sequence of hashable values (such as strings).
+The three collections need not be defined the same way.
 
 For example, the symbols for an extremely simple finite state machine might be
 defined like this::
@@ -40,6 +40,18 @@ defined like this::
     class State(Names):
         baz = NamedConstant()
 
+or, equivalently, like this::
+
+    from enum import Enum
+
+    class Input(Enum):
+        foo = 1
+
+    Output = ["bar"]
+    State = ["baz"]
+
+in which case the symbols are C{Input.foo}, C{"bar"} and C{"baz"}.
+
 A transition table is also required to construct a new finite state machine.
 The transition table is a L{dict} that has all of the possible states as its
 keys.  Associated with each key is a value that is another L{dict}.  These
@@ -51,7 +63,7 @@ transition as well as the next state which will become the current state of the
 machine when this transition occurs.
 
 For example, a transition table using the inputs, outputs, and states defined
-in the example above might be defined like this::
+in the first example above might be defined like this::
 
     transitions = TransitionTable({
         State.baz: {
@@ -97,50 +109,133 @@ have.
 """
 
 __all__ = [
-    "IFiniteStateMachine", "IOutputExecutor", "IRichInput",
+    "IFiniteStateMachine", "IRejectingFiniteStateMachine", "IOutputExecutor",
+    "IRichInput",
     "StateMachineDefinitionError", "ExtraTransitionState",
     "MissingTransitionState", "ExtraTransitionInput",
     "MissingTransitionInput", "ExtraTransitionOutput",
     "MissingTransitionOutput", "ExtraTransitionNextState",
     "MissingTransitionNextState", "InvalidInitialState",
-    "ExtraInputContext",
-    "UnhandledInput", "IllegalInput", "WrongState",
+    "ExtraInputContext", "UnhandledTimeoutInput", "InvalidStatefulState",
+    "UnhandledInput", "IllegalInput", "WrongState", "REJECTED",
 
-    "Transition", "TransitionTable", "trivialInput",
+    "Transition", "TransitionTable", "trivialInput", "singletonInput",
+    "payloadInput", "TimerWheel", "scheduleTimeouts",
+    "ProcessShards", "OffloadingOutputer", "OutputBatch", "BatchingOutputer",
     "constructFiniteStateMachine",
-    "MethodSuffixOutputer", "stateful",
+    "CompiledDefinition", "compileDefinition", "constructFromDefinition",
+    "definitionFingerprint",
+    "interpretedFiniteStateMachine", "generatedFiniteStateMachine",
+    "generatedSource", "dispatchingFiniteStateMachine",
+    "minimizeTable", "TableAnalysis", "analyzeTable", "pruneTable",
+    "productDefinition", "flattenHierarchy",
+    "DefinitionMismatch", "saveDefinition", "loadDefinition",
+    "MethodSuffixOutputer", "stateful", "statefulRecord", "statefulView",
+    "clearStatefulOnExit",
+
+    "AsyncioDriver", "AwaitingOutputer",
 
     "LOG_FSM_INITIALIZE",
     "LOG_FSM_TRANSITION",
+    "LOG_FSM_REJECTED",
 
     "__version__",
     ]
 
+from importlib import import_module
+
 from ._interface import (
-    IFiniteStateMachine, IOutputExecutor, IRichInput,
+    IFiniteStateMachine, IRejectingFiniteStateMachine, IOutputExecutor,
+    IRichInput,
 )
 
-try:
-    from ._logging import (
-        LOG_FSM_INITIALIZE,
-        LOG_FSM_TRANSITION,
-    )
-except ImportError:
-    LOG_FSM_INITIALIZE = LOG_FSM_TRANSITION = None
-
 from ._fsm import (
     StateMachineDefinitionError, ExtraTransitionState,
     MissingTransitionState, ExtraTransitionInput,
     MissingTransitionInput, ExtraTransitionOutput,
     MissingTransitionOutput, ExtraTransitionNextState,
     MissingTransitionNextState, InvalidInitialState,
-    ExtraInputContext,
-    UnhandledInput, IllegalInput, WrongState,
-
-    Transition, TransitionTable, trivialInput, constructFiniteStateMachine,
-    MethodSuffixOutputer, stateful,
+    ExtraInputContext, UnhandledTimeoutInput, InvalidStatefulState,
+    UnhandledInput, IllegalInput, WrongState, REJECTED,
+
+    Transition, TransitionTable, trivialInput, singletonInput,
+    constructFiniteStateMachine,
+    compileDefinition, constructFromDefinition,
+    interpretedFiniteStateMachine,
+    MethodSuffixOutputer, stateful, clearStatefulOnExit, scheduleTimeouts,
 )
 
-from ._version import get_versions
-__version__ = get_versions()['version']
-del get_versions
+from ._definition import CompiledDefinition, definitionFingerprint
+
+from ._codegen import generatedFiniteStateMachine, generatedSource
+
+from ._dispatch import dispatchingFiniteStateMachine
+
+from ._minimize import minimizeTable
+
+from ._analysis import TableAnalysis, analyzeTable, pruneTable
+
+from ._product import productDefinition
+
+from ._hierarchy import flattenHierarchy
+
+from ._payload import payloadInput
+
+from ._timer import TimerWheel
+
+from ._offload import ProcessShards, OffloadingOutputer
+
+from ._batch import OutputBatch, BatchingOutputer
+
+from ._record import statefulRecord, statefulView
+
+from ._cache import DefinitionMismatch, saveDefinition, loadDefinition
+
+from ._lazy import installLazyAttributes
+
+
+
+def _version():
+    """
+    Determine the version of machinist.  In a source checkout this may run
+    git, so it is only done the first time C{__version__} is used.
+    """
+    from ._version import get_versions
+    return get_versions()['version']
+
+
+
+def _optionalAttribute(module, name):
+    """
+    Create a function to get an attribute of a module of machinist which
+    depends on something that might not be installed: L{machinist._logging}
+    imports eliot and L{machinist._asyncio} needs L{asyncio}.  The module is
+    only imported the first time the attribute is used.
+
+    @param module: The name of the module, relative to L{machinist}.
+    @param name: The name of the attribute.
+
+    @return: A no-argument callable returning the attribute or C{None} if
+        the module cannot be imported.
+    """
+    def get():
+        try:
+            imported = import_module("." + module, __name__)
+        except ImportError:
+            return None
+        return getattr(imported, name)
+    return get
+
+
+
+installLazyAttributes(__name__, {
+    "__version__": _version,
+    "LOG_FSM_INITIALIZE": _optionalAttribute(
+        "_logging", "LOG_FSM_INITIALIZE"),
+    "LOG_FSM_TRANSITION": _optionalAttribute(
+        "_logging", "LOG_FSM_TRANSITION"),
+    "LOG_FSM_REJECTED": _optionalAttribute(
+        "_logging", "LOG_FSM_REJECTED"),
+    "AsyncioDriver": _optionalAttribute("_asyncio", "AsyncioDriver"),
+    "AwaitingOutputer": _optionalAttribute("_asyncio", "AwaitingOutputer"),
+})
@@ -0,0 +1,165 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_analysis -*-
+
+"""
+Analysis of the graph formed by the states and transitions of a transition
+table.
+"""
+
+from ._fsm import TransitionTable
+from ._definition import _symbols
+
+
+
+class TableAnalysis(object):
+    """
+    The results of L{analyzeTable}.
+
+    @ivar reachable: A L{frozenset} of the states which can be entered from
+        the initial state (including the initial state itself).
+
+    @ivar unreachable: A L{frozenset} of the states of the table which are not
+        C{reachable}.
+
+    @ivar terminal: A L{frozenset} of the reachable terminal states: those in
+        which every input handled leads back to the same state without any
+        output (see L{_FiniteStateMachine._isTerminal}).
+
+    @ivar dead: A L{frozenset} of the reachable states from which no terminal
+        state can be reached.  Note that every state of a machine which is
+        meant to run forever (and so has no terminal states) is dead.
+
+    @ivar unusedInputs: A L{frozenset} of the inputs which are not handled in
+        any reachable state.
+    """
+    def __init__(self, reachable, unreachable, terminal, dead, unusedInputs):
+        self.reachable = reachable
+        self.unreachable = unreachable
+        self.terminal = terminal
+        self.dead = dead
+        self.unusedInputs = unusedInputs
+
+
+    def __repr__(self):
+        return (
+            "<TableAnalysis reachable=%d unreachable=%d terminal=%d dead=%d "
+            "unusedInputs=%d>" % (
+                len(self.reachable), len(self.unreachable),
+                len(self.terminal), len(self.dead), len(self.unusedInputs)))
+
+
+
+def _successors(table, state):
+    """
+    Find the next states of all of the transitions of a state, including
+    its default.
+
+    @type table: L{TransitionTable}
+
+    @return: A L{list} of states.
+    """
+    row = table.table.get(state, {})
+    successors = [transition.nextState for transition in row.values()]
+    default = table._default(state)
+    if default is not None:
+        successors.append(default.nextState)
+    return successors
+
+
+
+def _reachable(table, initial):
+    """
+    Find the states reachable from a state.
+
+    @type table: L{TransitionTable}
+
+    @return: A L{set} of states.
+    """
+    seen = set([initial])
+    pending = [initial]
+    while pending:
+        for nextState in _successors(table, pending.pop()):
+            if nextState not in seen:
+                seen.add(nextState)
+                pending.append(nextState)
+    return seen
+
+
+
+def analyzeTable(table, initial, inputs=None):
+    """
+    Work out which parts of a transition table a state machine can use.
+
+    @param table: The table to analyze.
+    @type table: L{TransitionTable}
+
+    @param initial: The initial state.
+
+    @param inputs: If not C{None}, the input alphabet in any of the forms
+        accepted by L{constructFiniteStateMachine}.  Otherwise, the inputs
+        handled anywhere in the table are used (so defaults are only taken
+        into account for states which do not handle all of those).
+
+    @rtype: L{TableAnalysis}
+    """
+    if inputs is None:
+        inputs = set(input for row in table.table.values() for input in row)
+    else:
+        inputs = set(_symbols(inputs))
+    reachable = _reachable(table, initial)
+
+    terminal = set(
+        state for state in reachable if table._isTerminal(state, inputs))
+
+    # Search backwards from the terminal states for the states which can
+    # reach one of them.
+    predecessors = {}
+    for state in reachable:
+        for nextState in _successors(table, state):
+            predecessors.setdefault(nextState, set()).add(state)
+    live = set(terminal)
+    pending = list(terminal)
+    while pending:
+        for state in predecessors.get(pending.pop(), ()):
+            if state not in live:
+                live.add(state)
+                pending.append(state)
+
+    unusedInputs = set(inputs)
+    for state in reachable:
+        if table._default(state) is not None:
+            unusedInputs.clear()
+            break
+        unusedInputs.difference_update(table.table.get(state, {}))
+
+    allStates = set(table.table) | set(table.defaults)
+    return TableAnalysis(
+        frozenset(reachable), frozenset(allStates - reachable),
+        frozenset(terminal), frozenset(reachable - live),
+        frozenset(unusedInputs))
+
+
+
+def pruneTable(table, initial):
+    """
+    Remove the states which cannot be reached from the initial state.
+
+    @param table: The table to prune.
+    @type table: L{TransitionTable}
+
+    @param initial: The initial state.
+
+    @return: A new L{TransitionTable} with only the reachable states of
+        C{table}.
+    """
+    reachable = _reachable(table, initial)
+    return TransitionTable(
+        dict((state, dict(row))
+             for (state, row) in table.table.items() if state in reachable),
+        dict((state, default)
+             for (state, default) in table.defaults.items()
+             if state in reachable),
+        table.globalDefault,
+        dict((state, timeout)
+             for (state, timeout) in table.timeouts.items()
+             if state in reachable))
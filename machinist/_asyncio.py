@@ -0,0 +1,383 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_asyncio -*-
+
+"""
+Drive state machines with inputs from asyncio.
+
+An L{AsyncioDriver} takes inputs for a state machine from an
+L{asyncio.Queue} or an asynchronous iterator and gives them to the machine
+one at a time.  The transition itself is as synchronous as ever.  If the
+machine's outputs are executed by an L{AwaitingOutputer}, whatever they
+return is awaited, in order, before the next input is taken::
+
+    outputer = AwaitingOutputer(MethodSuffixOutputer(world))
+    fsm = constructFiniteStateMachine(..., outputer, logger)
+    done = driver.drive(fsm, queue, outputer)
+
+Any number of machines can be driven on the same loop.  Each machine gives
+way to the others after every input, so a machine whose inputs are always
+ready cannot keep the rest waiting.
+
+This module does not use the C{async} and C{await} keywords so that the
+package can still be compiled by Python 2, but it can only be imported where
+L{asyncio} is available.
+"""
+
+import asyncio
+
+from zope.interface import implementer
+
+from ._interface import IOutputExecutor
+
+
+
+@implementer(IOutputExecutor)
+class AwaitingOutputer(object):
+    """
+    An L{IOutputExecutor} which keeps whatever the output executor it wraps
+    returns for an L{AsyncioDriver} to await.
+
+    The wrapped executor is called during the transition, like any other, so
+    it sees the context of the input being received.  A coroutine function
+    does not run until it is awaited, though, by which time the machine is in
+    its new state.
+
+    @ivar _executor: The wrapped L{IOutputExecutor}.
+    @ivar _pending: A L{list} of the awaitables returned by C{_executor}
+        which have not yet been taken by a driver.
+    """
+    def __init__(self, executor):
+        """
+        @param executor: The L{IOutputExecutor} to wrap.  Its C{output}
+            method may return an awaitable or C{None}.
+        """
+        self._executor = executor
+        self._pending = []
+
+
+    def __repr__(self):
+        return "<AwaitingOutputer / %r>" % (self._executor,)
+
+
+    def identifier(self):
+        """
+        Delegate to the wrapped executor.
+        """
+        return self._executor.identifier()
+
+
+    def output(self, output, context):
+        """
+        Execute an output with the wrapped executor and keep what it returns
+        if that is not C{None}.
+
+        @see: L{IOutputExecutor.output}
+        """
+        result = self._executor.output(output, context)
+        if result is not None:
+            self._pending.append(result)
+
+
+    def _take(self):
+        """
+        @return: The awaitables returned since the last call, in the order
+            they were returned.
+        @rtype: L{list}
+        """
+        pending = self._pending
+        self._pending = []
+        return pending
+
+
+
+def _discard(awaitables):
+    """
+    Close coroutines which will never be awaited, so that they are not
+    reported as having been forgotten.
+    """
+    for awaitable in awaitables:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+
+
+
+class _Drive(object):
+    """
+    The driving of one state machine by an L{AsyncioDriver}.
+
+    At any time a drive is either waiting for an input, waiting for an output
+    or has a call to L{_step} scheduled with the loop.
+
+    @ivar done: The L{asyncio.Future} returned by L{AsyncioDriver.drive}.
+    @ivar _waiting: The L{asyncio.Future} for the input or output being
+        waited for, or C{None}.
+    @ivar _outputs: An iterator over the awaitables of the current transition
+        which have not been waited for yet.
+    @ivar _stopping: C{True} once the drive has been asked to stop after the
+        current input.
+    """
+    def __init__(self, loop, fsm, inputs, outputer):
+        self._loop = loop
+        self._fsm = fsm
+        self._outputer = outputer
+        if isinstance(inputs, asyncio.Queue):
+            self._nextInput = self._fromQueue(inputs)
+        else:
+            self._nextInput = self._fromIterator(inputs.__aiter__())
+        self.done = loop.create_future()
+        self._waiting = None
+        self._outputs = iter(())
+        self._stopping = False
+        loop.call_soon(self._step)
+
+
+    def _fromQueue(self, queue):
+        """
+        @return: A function returning the next input on C{queue} or an
+            awaitable for it.
+        """
+        def nextInput():
+            try:
+                return True, queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False, queue.get()
+        return nextInput
+
+
+    def _fromIterator(self, iterator):
+        """
+        @return: A function returning an awaitable for the next input from
+            the asynchronous iterator C{iterator}.
+        """
+        def nextInput():
+            return False, iterator.__anext__()
+        return nextInput
+
+
+    def stop(self):
+        """
+        Stop taking inputs.  If the outputs of an input are being awaited,
+        the drive stops once they are done.
+        """
+        self._stopping = True
+        if self._waiting is not None and self._outputs is None:
+            # Only waiting for an input, which can be abandoned.
+            self._waiting.cancel()
+
+
+    def cancel(self):
+        """
+        Stop at once, cancelling whatever is being awaited.
+        """
+        self._stopping = True
+        if self._waiting is not None:
+            self._waiting.cancel()
+        if self.done.done():
+            # done itself was cancelled.
+            if self._outputs is not None:
+                _discard(self._outputs)
+        else:
+            self._finish(None, cancelled=True)
+
+
+    def _step(self):
+        """
+        Take the next input, if there is one, or wait for it.
+        """
+        if self.done.done():
+            return
+        if self._stopping:
+            self._finish(None)
+            return
+        self._outputs = None
+        try:
+            ready, value = self._nextInput()
+        except Exception as e:
+            self._finish(e)
+            return
+        if ready:
+            self._receive(value)
+        else:
+            self._wait(value, self._gotInput)
+
+
+    def _wait(self, awaitable, callback):
+        """
+        Call C{callback} with the future for C{awaitable} once it is done.
+        """
+        try:
+            self._waiting = asyncio.ensure_future(awaitable, loop=self._loop)
+        except Exception as e:
+            self._finish(e)
+        else:
+            self._waiting.add_done_callback(callback)
+
+
+    def _gotInput(self, future):
+        self._waiting = None
+        if self.done.done():
+            return
+        if future.cancelled():
+            self._finish(None, cancelled=not self._stopping)
+            return
+        exception = future.exception()
+        if isinstance(exception, StopAsyncIteration):
+            self._finish(None)
+        elif exception is not None:
+            self._finish(exception)
+        else:
+            self._receive(future.result())
+
+
+    def _receive(self, input):
+        """
+        Give an input to the state machine and then await its outputs.
+        """
+        try:
+            self._fsm.receive(input)
+        except Exception as e:
+            if self._outputer is not None:
+                _discard(self._outputer._take())
+            self._finish(e)
+            return
+        if self._outputer is not None:
+            self._outputs = iter(self._outputer._take())
+        else:
+            self._outputs = iter(())
+        self._nextOutput()
+
+
+    def _nextOutput(self):
+        """
+        Await the next output of the current transition or, once there are
+        none left, give way to the other machines before the next input.
+        """
+        for awaitable in self._outputs:
+            self._wait(awaitable, self._outputDone)
+            return
+        self._loop.call_soon(self._step)
+
+
+    def _outputDone(self, future):
+        self._waiting = None
+        if self.done.done():
+            return
+        if future.cancelled():
+            self._finish(None, cancelled=True)
+        elif future.exception() is not None:
+            self._finish(future.exception())
+        else:
+            self._nextOutput()
+
+
+    def _finish(self, exception, cancelled=False):
+        """
+        Resolve C{done}.
+
+        @param exception: The exception the drive failed with, or C{None}.
+        @param cancelled: Whether to cancel C{done} rather than resolve it.
+        """
+        if self._outputs is not None:
+            _discard(self._outputs)
+        self._outputs = iter(())
+        if cancelled:
+            self.done.cancel()
+        elif exception is not None:
+            self.done.set_exception(exception)
+        else:
+            self.done.set_result(None)
+
+
+
+class AsyncioDriver(object):
+    """
+    An L{AsyncioDriver} gives state machines inputs from queues or
+    asynchronous iterators and awaits their outputs.
+
+    @ivar _loop: See L{__init__}.
+    @ivar _drives: A L{set} of the L{_Drive}s which are not done.
+    """
+    def __init__(self, loop=None):
+        """
+        @param loop: The L{asyncio} event loop to run on, or C{None} to use
+            the current event loop.
+        """
+        self._loop = loop
+        self._drives = set()
+
+
+    def _getLoop(self):
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+
+    def drive(self, fsm, inputs, outputer=None):
+        """
+        Start giving a state machine inputs.
+
+        Each input is received by the machine and the awaitables kept by
+        C{outputer} are awaited, one after the other, before the next input
+        is taken.  Other machines driven on the same loop get their turn
+        between inputs.
+
+        @param fsm: An L{IFiniteStateMachine} provider.
+
+        @param inputs: An L{asyncio.Queue} or asynchronous iterable of inputs
+            for C{fsm}.
+
+        @param outputer: The L{AwaitingOutputer} executing the outputs of
+            C{fsm}, or C{None} if its outputs have nothing to be awaited.
+
+        @return: An L{asyncio.Future} which is resolved with C{None} once an
+            asynchronous iterable is exhausted or the driver is stopped.  It
+            fails with the exception of an input which could not be received
+            or of an output which failed, and is cancelled if the driver is
+            cancelled.  Cancelling it stops only this machine, at once.
+        """
+        drive = _Drive(self._getLoop(), fsm, inputs, outputer)
+        self._drives.add(drive)
+
+        def finished(done):
+            self._drives.discard(drive)
+            if done.cancelled():
+                # Someone cancelled the future returned by drive.
+                drive.cancel()
+        drive.done.add_done_callback(finished)
+        return drive.done
+
+
+    def stop(self):
+        """
+        Shut down cleanly: stop taking inputs, letting the outputs of inputs
+        already received finish.  Inputs still queued are left on their
+        queues.
+
+        @return: An L{asyncio.Future} which is resolved with C{None} when
+            every machine has stopped, whether or not they stopped cleanly.
+        """
+        loop = self._getLoop()
+        stopped = loop.create_future()
+        drives = list(self._drives)
+        if not drives:
+            stopped.set_result(None)
+            return stopped
+        for drive in drives:
+            drive.stop()
+
+        def allStopped(gathered):
+            if not stopped.done():
+                stopped.set_result(None)
+        asyncio.gather(
+            *[drive.done for drive in drives],
+            return_exceptions=True).add_done_callback(allStopped)
+        return stopped
+
+
+    def cancel(self):
+        """
+        Stop every machine at once, cancelling the inputs and outputs they
+        are waiting for.
+        """
+        for drive in list(self._drives):
+            drive.cancel()
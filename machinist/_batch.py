@@ -0,0 +1,176 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_batch -*-
+
+"""
+Batching of the outputs of many state machines.
+
+When many machines transition in the same tick, executing each output on its
+own (a socket write, a database update) wastes the chance to do them
+together.  A L{BatchingOutputer} for each machine adds its outputs to a
+shared L{OutputBatch} instead, which hands them to a callback at the end of
+the tick, grouped by output symbol::
+
+    def execute(output, entries):
+        # entries is a list of (identifier, context) tuples.
+        ...
+
+    batch = OutputBatch(execute)
+    fsm = constructFiniteStateMachine(
+        ..., BatchingOutputer(identifier, batch), logger)
+
+The outputs of each machine are divided into rounds: a machine's first
+output in the batch is in the first round, its second output in the second
+round and so on.  The callback is called for each output symbol in the first
+round, then for each in the second round, and so on, so every machine's
+outputs are still executed in the order the machine produced them.
+
+Contexts are kept until the batch is flushed, by which time the machine may
+be in a different state.
+"""
+
+from zope.interface import implementer
+
+from ._interface import IOutputExecutor
+
+
+
+class OutputBatch(object):
+    """
+    An L{OutputBatch} collects the outputs of many state machines and hands
+    them to a callback, grouped by output symbol, once per tick.
+
+    @ivar _callback: See L{__init__}.
+    @ivar _clock: See L{__init__}.
+    @ivar _automatic: See L{__init__}.
+
+    @ivar _rounds: A L{list} of the rounds of the current batch.  Each round
+        is a L{tuple} of a L{list} of C{(output, entries)} tuples, in the
+        order the outputs were first added to the round, and a L{dict}
+        mapping each output to its C{entries}, a L{list} of C{(identifier,
+        context)} tuples.
+    @ivar _positions: A L{dict} mapping identifiers to the number of outputs
+        added for them in the current batch.
+    @ivar _call: The call scheduled with C{_clock} to flush the batch, or
+        C{None} if the batch is empty or only flushed explicitly.
+    """
+    def __init__(self, callback, clock=None, automatic=True):
+        """
+        @param callback: A callable to execute the outputs of the batch.  It
+            is called with an output symbol and a L{list} of C{(identifier,
+            context)} tuples, one for each machine with that output in the
+            round.
+
+        @param clock: The L{IReactorTime} provider to schedule flushes with,
+            or C{None} to use the global reactor.
+
+        @param automatic: If C{True}, flush the batch at the end of each tick
+            in which outputs are added.  If C{False}, the batch is only
+            flushed by calling L{flush}.
+        """
+        if automatic and clock is None:
+            from twisted.internet import reactor as clock
+        self._callback = callback
+        self._clock = clock
+        self._automatic = automatic
+        self._rounds = []
+        self._positions = {}
+        self._call = None
+
+
+    def __len__(self):
+        """
+        @return: The number of outputs waiting to be flushed.
+        """
+        return sum(self._positions.values())
+
+
+    def add(self, identifier, output, context):
+        """
+        Add an output to the batch.
+
+        @param identifier: The identifier of the machine the output is for.
+            Outputs with the same identifier are kept in order.
+
+        @param output: The output symbol.
+
+        @param context: The context the output was executed with.
+        """
+        position = self._positions.get(identifier, 0)
+        self._positions[identifier] = position + 1
+        if position == len(self._rounds):
+            self._rounds.append(([], {}))
+        groups, entries = self._rounds[position]
+        try:
+            group = entries[output]
+        except KeyError:
+            group = entries[output] = []
+            groups.append((output, group))
+        group.append((identifier, context))
+        if self._automatic and self._call is None:
+            self._call = self._clock.callLater(0, self.flush)
+
+
+    def flush(self):
+        """
+        Hand the outputs of the batch to the callback, round by round.
+
+        Outputs added by the callback go in the next batch.  If the callback
+        raises an exception, it is logged and the rest of the batch is still
+        flushed.
+        """
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+        rounds = self._rounds
+        self._rounds = []
+        self._positions = {}
+        for groups, entries in rounds:
+            for output, group in groups:
+                try:
+                    self._callback(output, group)
+                except Exception:
+                    from twisted.python import log
+                    log.err(None, "Unhandled error in output batch callback")
+
+
+
+@implementer(IOutputExecutor)
+class BatchingOutputer(object):
+    """
+    An L{IOutputExecutor} which adds every output to an L{OutputBatch}
+    rather than executing it.
+
+    @ivar _identifier: See L{__init__}.
+    @ivar _batch: See L{__init__}.
+    """
+    def __init__(self, identifier, batch):
+        """
+        @param identifier: The identifier of the machine, which the
+            outputs are added to the batch with.
+        @type identifier: L{unicode}
+
+        @param batch: The L{OutputBatch} to add outputs to.
+        """
+        self._identifier = identifier
+        self._batch = batch
+
+
+    def __repr__(self):
+        return "<BatchingOutputer %s>" % (self._identifier,)
+
+
+    def identifier(self):
+        """
+        @see: L{IOutputExecutor.identifier}
+        """
+        return self._identifier
+
+
+    def output(self, output, context):
+        """
+        Add the output to the batch.
+
+        @see: L{IOutputExecutor.output}
+        """
+        self._batch.add(self._identifier, output, context)
@@ -0,0 +1,320 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_cache -*-
+
+"""
+On-disk storage for compiled state machine definitions.
+
+Assembling a large L{TransitionTable} and checking it for correctness can
+dominate the start-up time of a process which uses many state machines.  The
+functions in this module save the result of L{compileDefinition} to a file
+which can later be loaded without repeating any of that work::
+
+    try:
+        definition = loadDefinition(
+            path, Input, Output, State, richInputs, inputContext,
+            fingerprint=EXPECTED_FINGERPRINT)
+    except (IOError, DefinitionMismatch):
+        definition = compileDefinition(
+            Input, Output, State, buildTable(), State.initial,
+            richInputs, inputContext)
+        saveDefinition(definition, path)
+
+The file consists of a short header followed by the arrays of the definition's
+L{_DenseTable} as little-endian 32 bit integers, each aligned to four bytes,
+so that the file can be mapped directly into memory.  The dense table expands
+the defaults of the definition, so the header also records the defaults and
+which transitions were given explicitly.
+"""
+
+__all__ = [
+    "DefinitionMismatch", "saveDefinition", "loadDefinition",
+]
+
+from array import array
+from json import dumps, loads
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from sys import byteorder
+
+from ._definition import (
+    CompiledDefinition, _DenseTable, _symbols, _symbolKey, _interfaceName,
+)
+from ._fsm import Transition, TransitionTable, _checkConsistency
+
+
+_MAGIC = b"machinist-table\n"
+_VERSION = 2
+_PREAMBLE = Struct("<16sII")
+
+# The order in which the arrays of a _DenseTable are stored.
+_ARRAYS = ("cells", "nextStates", "outputOffsets", "outputIndexes")
+
+
+
+class DefinitionMismatch(Exception):
+    """
+    A saved definition does not match the definition it was expected to be.
+    """
+
+
+
+def _names(symbols):
+    return [_symbolKey(symbol) for symbol in symbols]
+
+
+
+def _contextNames(inputContext):
+    return sorted(
+        [_symbolKey(output), _interfaceName(interface)]
+        for (output, interface) in inputContext.items())
+
+
+
+def _littleEndian(integers):
+    """
+    Convert an L{array} of native integers to little-endian bytes.
+    """
+    if byteorder == "big":
+        integers = array(integers.typecode, integers)
+        integers.byteswap()
+    try:
+        return integers.tobytes()
+    except AttributeError:
+        return integers.tostring()
+
+
+
+def _fromLittleEndian(data):
+    """
+    Convert little-endian bytes to an L{array} of native integers.
+    """
+    integers = array("i")
+    try:
+        integers.frombytes(data)
+    except AttributeError:
+        integers.fromstring(data)
+    if byteorder == "big":
+        integers.byteswap()
+    return integers
+
+
+
+def _transitionIndexes(dense, transition):
+    """
+    Describe a transition by the indexes of its symbols.
+
+    @return: A L{list} of the L{list} of output indexes and the index of the
+        next state.
+    """
+    return [
+        [dense.outputs.index(output) for output in transition.output],
+        dense.states.index(transition.nextState)]
+
+
+
+def _indexedTransition(dense, indexes):
+    """
+    Reverse L{_transitionIndexes}.
+
+    @rtype: L{Transition}
+    """
+    outputIndexes, nextState = indexes
+    return Transition(
+        [dense.outputs[index] for index in outputIndexes],
+        dense.states[nextState])
+
+
+
+def saveDefinition(definition, path):
+    """
+    Write a compiled definition to a file.
+
+    @type definition: L{CompiledDefinition}
+
+    @param path: The name of the file to write.
+    @type path: L{str}
+    """
+    dense = definition.dense
+    header = {
+        u"fingerprint": definition.fingerprint,
+        u"inputs": _names(dense.inputs),
+        u"outputs": _names(dense.outputs),
+        u"states": _names(dense.states),
+        u"initial": dense.states.index(definition.initial),
+        u"inputContext": _contextNames(definition.inputContext),
+        u"lengths": [len(getattr(dense, name)) for name in _ARRAYS],
+    }
+    table = definition.table
+    if table.defaults:
+        header[u"defaults"] = [
+            [dense.states.index(state),
+             _transitionIndexes(dense, table.defaults[state])]
+            for state in dense.states if state in table.defaults]
+    if table.globalDefault is not None:
+        header[u"globalDefault"] = _transitionIndexes(
+            dense, table.globalDefault)
+    if table.defaults or table.globalDefault is not None:
+        # The cells of states with a default are all filled in, so record
+        # which of them were given explicitly.
+        header[u"explicit"] = [
+            [s, [i for (i, input) in enumerate(dense.inputs)
+                 if input in table.table.get(state, {})]]
+            for (s, state) in enumerate(dense.states)
+            if table._default(state) is not None]
+    timeouts = table.timeouts
+    if timeouts:
+        header[u"timeouts"] = [
+            [dense.states.index(state), timeouts[state][0],
+             dense.inputs.index(timeouts[state][1])]
+            for state in dense.states if state in timeouts]
+    header = dumps(header, sort_keys=True).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+        f.write(header)
+        for name in _ARRAYS:
+            f.write(_littleEndian(getattr(dense, name)))
+
+
+
+def loadDefinition(path, inputs, outputs, states, richInputs, inputContext,
+                   fingerprint=None):
+    """
+    Read a compiled definition written by L{saveDefinition}.
+
+    The definition is not checked for correctness again.  The symbols,
+    transitions and input context it contains are only checked to be
+    compatible with the given symbol collections, rich inputs and input
+    context.
+
+    @param path: The name of the file to read.
+    @type path: L{str}
+
+    @param inputs: See L{constructFiniteStateMachine}
+    @param outputs: See L{constructFiniteStateMachine}
+    @param states: See L{constructFiniteStateMachine}
+    @param richInputs: See L{constructFiniteStateMachine}
+    @param inputContext: See L{constructFiniteStateMachine}
+
+    @param fingerprint: If not C{None}, the fingerprint the saved definition
+        is required to have.
+
+    @raise IOError: If the file cannot be read.
+
+    @raise DefinitionMismatch: If the file does not contain a saved definition
+        or if the saved definition is not compatible with the given
+        arguments.
+
+    @raise DoesNotImplement: If any of the rich input types fails to
+        implement the interfaces required by the outputs it can produce.
+
+    @rtype: L{CompiledDefinition}
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            raise DefinitionMismatch(path)
+    try:
+        return _loadDefinition(
+            data, path, inputs, outputs, states, richInputs, inputContext,
+            fingerprint)
+    finally:
+        data.close()
+
+
+
+def _loadDefinition(data, path, inputs, outputs, states, richInputs,
+                    inputContext, fingerprint):
+    """
+    Interpret the contents of a file written by L{saveDefinition}.
+
+    @param data: The contents of the file.
+    @type data: L{mmap}
+
+    @see: L{loadDefinition}
+    """
+    try:
+        magic, version, length = _PREAMBLE.unpack(data[:_PREAMBLE.size])
+    except Exception:
+        raise DefinitionMismatch(path)
+    if magic != _MAGIC or version != _VERSION:
+        raise DefinitionMismatch(path)
+    offset = _PREAMBLE.size
+    try:
+        header = loads(data[offset:offset + length].decode("utf-8"))
+    except ValueError:
+        raise DefinitionMismatch(path)
+    offset += length
+    try:
+        lengths = header[u"lengths"]
+        saved = header[u"fingerprint"]
+        names = [header[kind] for kind in (u"inputs", u"outputs", u"states")]
+        context = header[u"inputContext"]
+        initial = header[u"initial"]
+        timeouts = header.get(u"timeouts", [])
+        defaults = header.get(u"defaults", [])
+        globalDefault = header.get(u"globalDefault")
+        explicit = dict(header.get(u"explicit", []))
+    except (KeyError, TypeError, AttributeError):
+        # The header is JSON, but not the header of a saved definition.
+        raise DefinitionMismatch(path)
+    if len(data) != offset + 4 * sum(lengths):
+        raise DefinitionMismatch(path)
+
+    if fingerprint is not None and fingerprint != saved:
+        raise DefinitionMismatch(fingerprint, saved)
+
+    symbols = _symbols(inputs), _symbols(outputs), _symbols(states)
+    for (kind, found, given) in zip(
+            (u"inputs", u"outputs", u"states"), names, symbols):
+        if found != _names(given):
+            raise DefinitionMismatch(kind, found)
+    if context != _contextNames(inputContext):
+        raise DefinitionMismatch(u"inputContext", context)
+
+    arrays = []
+    for count in lengths:
+        arrays.append(_fromLittleEndian(data[offset:offset + count * 4]))
+        offset += count * 4
+    dense = _DenseTable(*(symbols + tuple(arrays)))
+
+    transitions = []
+    for (n, nextState) in enumerate(dense.nextStates):
+        start, end = dense.outputOffsets[n], dense.outputOffsets[n + 1]
+        transitions.append(Transition(
+            [dense.outputs[index] for index in dense.outputIndexes[start:end]],
+            dense.states[nextState]))
+
+    table = {}
+    width = len(dense.inputs)
+    for (s, state) in enumerate(dense.states):
+        row = table[state] = {}
+        for (i, input) in enumerate(dense.inputs):
+            number = dense.cells[s * width + i]
+            if number != -1:
+                row[input] = transitions[number]
+        if s in explicit:
+            # Leave the inputs handled by a default to the default.
+            for i in set(range(width)) - set(explicit[s]):
+                del row[dense.inputs[i]]
+
+    if globalDefault is not None:
+        globalDefault = _indexedTransition(dense, globalDefault)
+    table = TransitionTable(
+        table,
+        dict((dense.states[state], _indexedTransition(dense, transition))
+             for (state, transition) in defaults),
+        globalDefault,
+        dict((dense.states[state], (seconds, dense.inputs[input]))
+             for (state, seconds, input) in timeouts))
+    # The rich inputs are not part of the saved definition, so check them
+    # as constructFiniteStateMachine would.
+    _checkConsistency(richInputs, table, dense.states, inputContext)
+    definition = CompiledDefinition(
+        inputs, outputs, states, table, dense.states[initial],
+        tuple(richInputs), inputContext, saved)
+    definition._dense = dense
+    return definition
@@ -0,0 +1,285 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_codegen -*-
+
+"""
+A state machine engine which generates Python source specialized to a single
+definition.
+
+The generated code has one function for each distinct transition.  The
+function records the next state and delivers the transition's outputs,
+adapting the input for each output which has an input context, without
+consulting any tables.  Each state is represented by a L{dict} mapping the
+inputs it handles to those functions, so receiving an input is a single
+lookup and call.
+
+The source only depends on the parts of the definition which contribute to its
+fingerprint, so it is compiled once for each fingerprint.  The symbols,
+interfaces and rich input types themselves are supplied when the compiled code
+is run for a particular definition.  L{generatedSource} returns the source for
+a definition; it is also registered with L{linecache} so that tracebacks
+through generated code show it.
+"""
+
+import linecache
+
+from zope.interface import implementer
+
+from ._interface import IRejectingFiniteStateMachine, IRichInput
+from ._fsm import IllegalInput, UnhandledInput, REJECTED, _singletons
+from ._definition import _symbols, _symbolName
+
+
+# Maps definition fingerprints to the source and code object generated for
+# them.
+_compiled = {}
+
+
+
+def _comment(symbol):
+    """
+    Describe a symbol for use in a comment in generated source.
+    """
+    return str(_symbolName(symbol).encode("unicode_escape").decode("ascii"))
+
+
+
+def _generate(definition):
+    """
+    Create the source of a module defining a state machine class for a
+    definition.
+
+    @type definition: L{CompiledDefinition}
+
+    @return: The source as a native string.
+    """
+    dense = definition.dense
+    contextOutputs = frozenset(definition.inputContext)
+    width = len(dense.inputs)
+
+    lines = [
+        "# Generated by machinist for definition",
+        "# %s" % (str(definition.fingerprint),),
+        "",
+        "def _reject(self, symbol):",
+        "    try:",
+        "        legal = symbol in INPUTS",
+        "    except TypeError:",
+        "        legal = False",
+        "    if not legal:",
+        "        raise IllegalInput(symbol)",
+        "    raise UnhandledInput(self._state, symbol)",
+        "",
+    ]
+
+    for (number, nextState) in enumerate(dense.nextStates):
+        start = dense.outputOffsets[number]
+        end = dense.outputOffsets[number + 1]
+        lines.extend([
+            "",
+            "def _transition%d(self, input):" % (number,),
+            "    # -> %s" % (_comment(dense.states[nextState]),),
+            "    self._state = S%d" % (nextState,),
+            "    self._row = ROW%d" % (nextState,),
+        ])
+        if end > start:
+            lines.append("    output = self._world.output")
+        for index in dense.outputIndexes[start:end]:
+            if dense.outputs[index] in contextOutputs:
+                context = "A%d(input)" % (index,)
+            else:
+                context = "input"
+            lines.append("    output(O%d, %s)  # %s" % (
+                index, context, _comment(dense.outputs[index])))
+        lines.append("    return OUTPUT%d" % (number,))
+        lines.append("")
+
+    for (s, state) in enumerate(dense.states):
+        lines.append("")
+        lines.append("# %s" % (_comment(state),))
+        lines.append("ROW%d = {" % (s,))
+        for (i, input) in enumerate(dense.inputs):
+            number = dense.cells[s * width + i]
+            if number != -1:
+                lines.append("    I%d: _transition%d,  # %s" % (
+                    i, number, _comment(input)))
+        lines.append("}")
+
+    lines.extend([
+        "",
+        "",
+        "@implementer(IRejectingFiniteStateMachine)",
+        "class GeneratedFiniteStateMachine(object):",
+        "    def __init__(self, world):",
+        "        self._world = world",
+        "        self._state = S%d" % (dense.states.index(definition.initial),),
+        "        self._row = ROW%d" % (dense.states.index(definition.initial),),
+        "",
+        "    def __repr__(self):",
+        "        return '<FSM / %s>' % (self._world,)",
+        "",
+        "    @property",
+        "    def state(self):",
+        "        return self._state",
+        "",
+        "    def receive(self, input):",
+        "        try:",
+        "            symbol = SINGLETONS.get(input)",
+        "        except TypeError:",
+        "            symbol = None",
+        "        if symbol is None:",
+        "            if providedBy(input):",
+        "                symbol = input.symbol()",
+        "                if not isinstance(input, RICH_INPUTS):",
+        "                    raise IllegalInput(symbol)",
+        "            else:",
+        "                symbol = input",
+        "        try:",
+        "            transition = self._row[symbol]",
+        "        except (KeyError, TypeError):",
+        "            _reject(self, symbol)",
+        "        return transition(self, input)",
+        "",
+        "    def tryReceive(self, input):",
+        "        try:",
+        "            symbol = SINGLETONS.get(input)",
+        "        except TypeError:",
+        "            symbol = None",
+        "        if symbol is None:",
+        "            if providedBy(input):",
+        "                if not isinstance(input, RICH_INPUTS):",
+        "                    return REJECTED",
+        "                symbol = input.symbol()",
+        "            else:",
+        "                symbol = input",
+        "        try:",
+        "            transition = self._row[symbol]",
+        "        except (KeyError, TypeError):",
+        "            return REJECTED",
+        "        return transition(self, input)",
+        "",
+        "    def handles(self, input):",
+        "        if providedBy(input):",
+        "            if not isinstance(input, RICH_INPUTS):",
+        "                return False",
+        "            input = input.symbol()",
+        "        try:",
+        "            return input in self._row",
+        "        except TypeError:",
+        "            return False",
+        "",
+        "    def _isTerminal(self, state):",
+        "        return state in TERMINAL",
+        "",
+    ])
+    return "\n".join(lines)
+
+
+
+def _code(definition):
+    """
+    Find or create the compiled code for a definition.
+
+    @type definition: L{CompiledDefinition}
+
+    @return: A L{tuple} of the source and the code object compiled from it.
+    """
+    fingerprint = definition.fingerprint
+    try:
+        return _compiled[fingerprint]
+    except KeyError:
+        pass
+    source = _generate(definition)
+    filename = "<machinist-generated %s>" % (fingerprint,)
+    code = compile(source, filename, "exec")
+    # Let tracebacks and debuggers show the generated code.
+    linecache.cache[filename] = (
+        len(source), None, [line + "\n" for line in source.splitlines()],
+        filename)
+    _compiled[fingerprint] = source, code
+    return source, code
+
+
+
+def _namespace(definition):
+    """
+    Create the globals which the generated code for a definition expects.
+
+    @type definition: L{CompiledDefinition}
+    """
+    dense = definition.dense
+    namespace = {
+        "implementer": implementer,
+        "IRejectingFiniteStateMachine": IRejectingFiniteStateMachine,
+        "providedBy": IRichInput.providedBy,
+        "IllegalInput": IllegalInput,
+        "UnhandledInput": UnhandledInput,
+        "REJECTED": REJECTED,
+        "INPUTS": frozenset(_symbols(definition.inputs)),
+        "RICH_INPUTS": definition.richInputs,
+        "SINGLETONS": _singletons(definition.richInputs),
+    }
+    for (prefix, symbols) in [
+            ("I", dense.inputs), ("O", dense.outputs), ("S", dense.states)]:
+        for (n, symbol) in enumerate(symbols):
+            namespace["%s%d" % (prefix, n)] = symbol
+    for (n, output) in enumerate(dense.outputs):
+        if output in definition.inputContext:
+            namespace["A%d" % (n,)] = definition.inputContext[output]
+
+    # Return the same output lists as the table does.
+    width = len(dense.inputs)
+    table = definition.table
+    for (s, state) in enumerate(dense.states):
+        for (i, input) in enumerate(dense.inputs):
+            number = dense.cells[s * width + i]
+            if number != -1:
+                namespace.setdefault(
+                    "OUTPUT%d" % (number,),
+                    table._transition(state, input).output)
+
+    namespace["TERMINAL"] = frozenset(
+        state for state in dense.states
+        if table._isTerminal(state, namespace["INPUTS"]))
+    return namespace
+
+
+
+def generatedSource(definition):
+    """
+    Get the source generated for a definition by
+    L{generatedFiniteStateMachine}, for example to read while debugging.
+
+    @type definition: L{CompiledDefinition}
+
+    @return: The source of a Python module, as a native string.
+    """
+    return _code(definition)[0]
+
+
+
+def generatedFiniteStateMachine(definition, world):
+    """
+    An engine for L{constructFromDefinition} (or
+    L{constructFiniteStateMachine}) which runs code generated specifically for
+    the definition.
+
+    The resulting state machine behaves exactly like one created by
+    L{interpretedFiniteStateMachine}.  Generating and compiling the code makes
+    creating the first state machine from a definition more expensive, in
+    exchange for cheaper handling of each input.
+
+    @type definition: L{CompiledDefinition}
+
+    @param world: The L{IOutputExecutor} provider to drive with the outputs
+        of the state machine.
+
+    @return: An L{IFiniteStateMachine} provider
+    """
+    try:
+        machineType = definition._engines[generatedFiniteStateMachine]
+    except KeyError:
+        namespace = _namespace(definition)
+        exec(_code(definition)[1], namespace)
+        machineType = namespace["GeneratedFiniteStateMachine"]
+        definition._engines[generatedFiniteStateMachine] = machineType
+    return machineType(world)
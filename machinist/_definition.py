@@ -0,0 +1,341 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_definition -*-
+
+"""
+Validated, reusable state machine definitions.
+"""
+
+__all__ = [
+    "CompiledDefinition", "definitionFingerprint",
+]
+
+from array import array
+from hashlib import sha256
+from json import dumps
+
+
+def _symbols(names):
+    """
+    Get all of the symbols defined by a collection of symbols.
+
+    If the symbols are the members of an L{enum.Enum} subclass whose values
+    are integers numbered from zero (for example, an L{enum.IntEnum}) they
+    are ordered by value.  The position of each such symbol in the result,
+    and so in a L{_DenseTable}, is its value.
+
+    @param names: A L{twisted.python.constants.Names} subclass, an
+        L{enum.Enum} subclass or a sequence of hashable values.
+
+    @return: A L{tuple} of the symbols defined by C{names}, in definition
+        order unless they are ordered by value as described above.
+    """
+    try:
+        iterconstants = names.iterconstants
+    except AttributeError:
+        symbols = tuple(names)
+    else:
+        return tuple(iterconstants())
+
+    # Only the members of a class have a declared order other than the one
+    # they are given in.  Sequences of plain integers keep theirs.
+    if isinstance(names, type) and all(
+            isinstance(symbol, int) for symbol in symbols):
+        ordered = tuple(sorted(symbols))
+        if ordered == tuple(range(len(symbols))):
+            return ordered
+    return symbols
+
+
+
+_TEXT = (bytes, type(u""))
+
+try:
+    _INTEGERS = (int, long)
+except NameError:
+    _INTEGERS = (int,)
+
+
+
+def _symbolName(symbol):
+    """
+    Get a stable textual name for a symbol.
+
+    Constants and text are named by themselves.  Other symbols are named by
+    their type and L{repr}, so that (for example) C{1} and C{"1"} have
+    different names.
+
+    @param symbol: A symbol from an input, output, or state alphabet.
+
+    @rtype: L{unicode}
+    """
+    try:
+        name = symbol.name
+    except AttributeError:
+        if isinstance(symbol, _TEXT):
+            name = symbol
+        elif isinstance(symbol, _INTEGERS) and not isinstance(symbol, bool):
+            # Not repr, which gives Python 2 longs a suffix.
+            name = u"int:%d" % (symbol,)
+        else:
+            name = u"%s:%r" % (type(symbol).__name__, symbol)
+    if isinstance(name, bytes):
+        name = name.decode("utf-8")
+    return name
+
+
+
+def _symbolKey(symbol):
+    """
+    Get a stable textual name for a symbol which no other symbol of a
+    different type can have, for use in fingerprints and saved definitions.
+
+    @see: L{_symbolName}
+
+    @rtype: L{unicode}
+    """
+    if isinstance(symbol, _TEXT) and not hasattr(symbol, "name"):
+        return u"str:" + _symbolName(symbol)
+    return _symbolName(symbol)
+
+
+
+def _interfaceName(interface):
+    """
+    Get a stable textual name for an input context requirement.
+
+    @param interface: An L{Interface} subclass (or any other object naming the
+        requirements of an input).
+
+    @rtype: L{unicode}
+    """
+    try:
+        return interface.__identifier__
+    except AttributeError:
+        return u"%s.%s" % (interface.__module__, interface.__name__)
+
+
+
+def definitionFingerprint(inputs, outputs, states, table, initial,
+                          inputContext):
+    """
+    Compute a deterministic content hash of a state machine definition.
+
+    The fingerprint only depends on the names of the symbols involved (and the
+    order in which they are defined), the transitions between them and the
+    names of the input context interfaces.  It does not depend on the
+    identity of any of these objects, so it is the same in every process
+    which imports the same definition.
+
+    @see: L{constructFiniteStateMachine} for the meaning of the parameters.
+
+    @param table: The state transition table.
+    @type table: L{TransitionTable}
+
+    @return: A hex-encoded SHA-256 digest.
+    @rtype: L{unicode}
+    """
+    inputs = _symbols(inputs)
+    outputs = _symbols(outputs)
+    states = _symbols(states)
+
+    inputOrder = dict((symbol, index) for (index, symbol) in enumerate(inputs))
+    transitions = []
+    for state in states:
+        handled = table.table.get(state, {})
+        for input in sorted(handled, key=inputOrder.get):
+            transition = handled[input]
+            transitions.append([
+                _symbolKey(state), _symbolKey(input),
+                [_symbolKey(output) for output in transition.output],
+                _symbolKey(transition.nextState)])
+
+    context = sorted(
+        [_symbolKey(output), _interfaceName(interface)]
+        for (output, interface) in inputContext.items())
+
+    def describe(transition):
+        return [
+            [_symbolKey(output) for output in transition.output],
+            _symbolKey(transition.nextState)]
+
+    description = {
+        u"inputs": [_symbolKey(symbol) for symbol in inputs],
+        u"outputs": [_symbolKey(symbol) for symbol in outputs],
+        u"states": [_symbolKey(symbol) for symbol in states],
+        u"initial": _symbolKey(initial),
+        u"transitions": transitions,
+        u"inputContext": context,
+    }
+    # Only describe defaults when there are some so that the fingerprints of
+    # definitions without them stay the same.
+    if table.defaults:
+        description[u"defaults"] = [
+            [_symbolKey(state)] + describe(table.defaults[state])
+            for state in states if state in table.defaults]
+    if table.globalDefault is not None:
+        description[u"globalDefault"] = describe(table.globalDefault)
+    if table.timeouts:
+        description[u"timeouts"] = [
+            [_symbolKey(state), table.timeouts[state][0],
+             _symbolKey(table.timeouts[state][1])]
+            for state in states if state in table.timeouts]
+    encoded = dumps(description, sort_keys=True, separators=(",", ":"))
+    return u"" + sha256(encoded.encode("utf-8")).hexdigest()
+
+
+
+class _DenseTable(object):
+    """
+    A L{_DenseTable} is an integer-indexed representation of a transition
+    table.  Symbols are replaced by their position in the symbol tuples and
+    transitions with identical outputs and next states are shared.
+
+    @ivar inputs: A L{tuple} of all input symbols.
+    @ivar outputs: A L{tuple} of all output symbols.
+    @ivar states: A L{tuple} of all states.
+
+    @ivar cells: An L{array} of C{len(states) * len(inputs)} integers.  The
+        cell at C{state * len(inputs) + input} holds the index of the
+        transition taken on that input in that state (which may be one of the
+        table's defaults) or C{-1} if the input is not handled there.
+
+    @ivar nextStates: An L{array} giving the next state of each transition.
+
+    @ivar outputOffsets: An L{array} of C{len(nextStates) + 1} integers.  The
+        outputs of transition C{n} are given by
+        C{outputIndexes[outputOffsets[n]:outputOffsets[n + 1]]}.
+
+    @ivar outputIndexes: An L{array} of output indexes.
+    """
+    def __init__(self, inputs, outputs, states, cells, nextStates,
+                 outputOffsets, outputIndexes):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.states = states
+        self.cells = cells
+        self.nextStates = nextStates
+        self.outputOffsets = outputOffsets
+        self.outputIndexes = outputIndexes
+
+
+
+def _denseTable(inputs, outputs, states, table):
+    """
+    Build the L{_DenseTable} form of a transition table.
+
+    @see: L{constructFiniteStateMachine} for the meaning of the parameters.
+
+    @type table: L{TransitionTable}
+
+    @rtype: L{_DenseTable}
+    """
+    inputs = _symbols(inputs)
+    outputs = _symbols(outputs)
+    states = _symbols(states)
+
+    outputIndex = dict((symbol, n) for (n, symbol) in enumerate(outputs))
+    stateIndex = dict((symbol, n) for (n, symbol) in enumerate(states))
+
+    cells = array("i", [-1]) * (len(states) * len(inputs))
+    nextStates = array("i")
+    outputOffsets = array("i", [0])
+    outputIndexes = array("i")
+    numbered = {}
+
+    for (s, state) in enumerate(states):
+        handled = table.table.get(state, {})
+        default = table._default(state)
+        for (i, input) in enumerate(inputs):
+            try:
+                transition = handled[input]
+            except KeyError:
+                # Defaults are expanded here so that every handled input has
+                # its own cell.
+                if default is None:
+                    continue
+                transition = default
+            key = (
+                tuple(outputIndex[output] for output in transition.output),
+                stateIndex[transition.nextState])
+            try:
+                number = numbered[key]
+            except KeyError:
+                number = numbered[key] = len(nextStates)
+                nextStates.append(key[1])
+                outputIndexes.extend(key[0])
+                outputOffsets.append(len(outputIndexes))
+            cells[s * len(inputs) + i] = number
+
+    return _DenseTable(
+        inputs, outputs, states, cells, nextStates, outputOffsets,
+        outputIndexes)
+
+
+
+class CompiledDefinition(object):
+    """
+    A L{CompiledDefinition} is a state machine definition which has already
+    been checked for correctness.  Any number of state machines can be
+    constructed from it (see L{constructFromDefinition}) without repeating
+    that work.
+
+    @ivar inputs: See L{constructFiniteStateMachine}
+    @ivar outputs: See L{constructFiniteStateMachine}
+    @ivar states: See L{constructFiniteStateMachine}
+    @ivar table: See L{constructFiniteStateMachine}
+    @ivar initial: See L{constructFiniteStateMachine}
+    @ivar inputContext: See L{constructFiniteStateMachine}
+
+    @ivar richInputs: See L{constructFiniteStateMachine}
+    @type richInputs: L{tuple} of L{type}
+
+    @ivar stateMapping: If the definition was minimized (see
+        L{compileDefinition}), a L{dict} mapping each state of the original
+        definition to the state which replaced it.  Otherwise, C{None}.
+
+    @ivar _engines: A L{dict} in which engines (see
+        L{constructFromDefinition}) may remember whatever they prepare from
+        this definition, keyed by the engine.
+    """
+    def __init__(self, inputs, outputs, states, table, initial, richInputs,
+                 inputContext, fingerprint=None, stateMapping=None):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.states = states
+        self.table = table
+        self.initial = initial
+        self.richInputs = richInputs
+        self.inputContext = inputContext
+        self.stateMapping = stateMapping
+        self._fingerprint = fingerprint
+        self._dense = None
+        self._engines = {}
+
+
+    def __repr__(self):
+        return "<CompiledDefinition %s>" % (self.fingerprint,)
+
+
+    @property
+    def fingerprint(self):
+        """
+        The L{definitionFingerprint} of this definition.  It is computed the
+        first time it is needed and remembered after that.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = definitionFingerprint(
+                self.inputs, self.outputs, self.states, self.table,
+                self.initial, self.inputContext)
+        return self._fingerprint
+
+
+    @property
+    def dense(self):
+        """
+        The L{_DenseTable} form of this definition's transition table.  It is
+        computed the first time it is needed and remembered after that.
+        """
+        if self._dense is None:
+            self._dense = _denseTable(
+                self.inputs, self.outputs, self.states, self.table)
+        return self._dense
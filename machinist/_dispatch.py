@@ -0,0 +1,403 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_dispatch -*-
+
+"""
+A state machine engine which represents each state by an object that knows
+how to handle inputs in that state.
+
+The running state machine refers to the object for its current state, rather
+than to a state symbol which must be looked up in the transition table for
+every input.  Each state object is chosen to suit the transitions of its
+state:
+
+  - L{_SingleInputState} handles the only input handled in its state with an
+    equality test instead of a lookup.
+
+  - L{_SelfLoopState} handles states in which no input changes the state (for
+    example, terminal states) and so never needs to update the current
+    state.
+
+  - L{_TableState} handles all other states with a single L{dict} lookup.
+
+The state objects depend only on the definition, so they are created once for
+each definition and shared by all of the state machines created from it.
+"""
+
+from zope.interface import Attribute, Interface, implementer
+
+from ._interface import IRejectingFiniteStateMachine, IRichInput
+from ._fsm import IllegalInput, UnhandledInput, REJECTED, _singletons
+from ._definition import _symbols
+
+
+
+class _IState(Interface):
+    """
+    The behaviour of a state machine in one state.
+    """
+    state = Attribute("The state symbol.")
+
+    terminal = Attribute(
+        "True if the state is terminal (see "
+        "_FiniteStateMachine._isTerminal), otherwise False.")
+
+    def receive(machine, symbol):
+        """
+        Handle an input symbol received by a state machine in this state.
+
+        @type machine: L{_DispatchingFiniteStateMachine}
+
+        @return: The step (see L{_steps}) to take for the input.  The current
+            state of C{machine} has been updated to the next state already.
+        """
+
+
+    def tryReceive(machine, symbol):
+        """
+        Like L{receive}, but return C{None} without changing the current state
+        of C{machine} if the input is not handled.
+        """
+
+
+    def handles(symbol):
+        """
+        Determine whether an input symbol is handled in this state.
+
+        @rtype: L{bool}
+        """
+
+
+
+class _State(object):
+    """
+    The base of the L{_IState} implementations.
+
+    @ivar state: See L{_IState.state}.
+    @ivar terminal: See L{_IState.terminal}.
+    """
+    def __init__(self, state, terminal):
+        self.state = state
+        self.terminal = terminal
+
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.state)
+
+
+
+@implementer(_IState)
+class _TableState(_State):
+    """
+    A state whose transitions are found by looking up the input in a
+    L{dict}.
+    """
+    def __init__(self, state, terminal, transitions):
+        _State.__init__(self, state, terminal)
+        self._transitions = transitions
+
+
+    def receive(self, machine, symbol):
+        try:
+            step, nextState = self._transitions[symbol]
+        except (KeyError, TypeError):
+            machine._reject(symbol)
+        machine._current = nextState
+        return step
+
+
+    def tryReceive(self, machine, symbol):
+        try:
+            step, machine._current = self._transitions[symbol]
+        except (KeyError, TypeError):
+            return None
+        return step
+
+
+    def handles(self, symbol):
+        try:
+            return symbol in self._transitions
+        except TypeError:
+            return False
+
+
+
+@implementer(_IState)
+class _SingleInputState(_State):
+    """
+    A state which handles only one input.
+    """
+    def __init__(self, state, terminal, input, step, nextState):
+        _State.__init__(self, state, terminal)
+        self._input = input
+        self._step = step
+        self._nextState = nextState
+
+
+    def receive(self, machine, symbol):
+        if symbol is self._input or symbol == self._input:
+            machine._current = self._nextState
+            return self._step
+        machine._reject(symbol)
+
+
+    def tryReceive(self, machine, symbol):
+        if symbol is self._input or symbol == self._input:
+            machine._current = self._nextState
+            return self._step
+        return None
+
+
+    def handles(self, symbol):
+        return symbol is self._input or symbol == self._input
+
+
+
+@implementer(_IState)
+class _SelfLoopState(_State):
+    """
+    A state which no input leads away from.
+    """
+    def __init__(self, state, terminal, steps):
+        _State.__init__(self, state, terminal)
+        self._steps = steps
+
+
+    def receive(self, machine, symbol):
+        try:
+            return self._steps[symbol]
+        except (KeyError, TypeError):
+            machine._reject(symbol)
+
+
+    def tryReceive(self, machine, symbol):
+        try:
+            return self._steps[symbol]
+        except (KeyError, TypeError):
+            return None
+
+
+    def handles(self, symbol):
+        try:
+            return symbol in self._steps
+        except TypeError:
+            return False
+
+
+
+def _steps(definition):
+    """
+    Work out what to do for each transition of a definition.
+
+    @type definition: L{CompiledDefinition}
+
+    @return: A L{dict} mapping the L{id} of each L{Transition} in the
+        definition to a L{tuple} of the transition's output (to return from
+        C{receive}) and a L{tuple} of pairs of each output symbol and the
+        adapter for its context (or C{None} if the input is passed as is).
+    """
+    transitions = [
+        transition
+        for row in definition.table.table.values()
+        for transition in row.values()]
+    transitions.extend(definition.table.defaults.values())
+    if definition.table.globalDefault is not None:
+        transitions.append(definition.table.globalDefault)
+    steps = {}
+    for transition in transitions:
+        if id(transition) not in steps:
+            steps[id(transition)] = (
+                transition.output,
+                tuple((output, definition.inputContext.get(output))
+                      for output in transition.output))
+    return steps
+
+
+
+def _states(definition):
+    """
+    Create the state objects for a definition.
+
+    @type definition: L{CompiledDefinition}
+
+    @return: A L{dict} mapping state symbols to L{_IState} providers.
+    """
+    table = definition.table
+    inputs = _symbols(definition.inputs)
+    steps = _steps(definition)
+    states = {}
+    links = []
+    for state in _symbols(definition.states):
+        # Each state object looks up every input it handles directly, so
+        # defaults are expanded here.
+        row = table._row(state, inputs)
+        terminal = table._isTerminal(state, inputs)
+        if all(transition.nextState == state for transition in row.values()):
+            states[state] = _SelfLoopState(state, terminal, dict(
+                (input, steps[id(transition)])
+                for (input, transition) in row.items()))
+        elif len(row) == 1:
+            [(input, transition)] = row.items()
+            states[state] = _SingleInputState(
+                state, terminal, input, steps[id(transition)], None)
+            links.append((states[state], transition.nextState))
+        else:
+            states[state] = _TableState(state, terminal, dict(
+                (input, (steps[id(transition)], transition.nextState))
+                for (input, transition) in row.items()))
+            links.append((states[state], None))
+
+    # Now that every state object exists, refer to them instead of to the next
+    # state symbols.
+    for (stateObject, nextState) in links:
+        if nextState is not None:
+            stateObject._nextState = states[nextState]
+        else:
+            transitions = stateObject._transitions
+            for (input, (step, nextState)) in transitions.items():
+                transitions[input] = (step, states[nextState])
+    return states
+
+
+
+@implementer(IRejectingFiniteStateMachine)
+class _DispatchingFiniteStateMachine(object):
+    """
+    A state machine which delegates the handling of each input to the object
+    representing its current state.
+
+    @ivar _current: The L{_IState} provider for the current state.
+    @ivar _states: A L{dict} mapping state symbols to L{_IState} providers.
+    @ivar _inputs: A L{frozenset} of the input alphabet.
+
+    @ivar _richInputs: See L{_FiniteStateInterpreter}
+    @ivar _singletons: See L{_FiniteStateInterpreter}
+    @ivar _world: See L{_FiniteStateInterpreter}
+    """
+    def __init__(self, states, initial, inputs, richInputs, world):
+        self._states = states
+        self._current = states[initial]
+        self._inputs = inputs
+        self._richInputs = richInputs
+        self._singletons = _singletons(richInputs)
+        self._world = world
+
+
+    def __repr__(self):
+        return "<FSM / %s>" % (self._world,)
+
+
+    @property
+    def state(self):
+        return self._current.state
+
+
+    def receive(self, input):
+        try:
+            symbol = self._singletons.get(input)
+        except TypeError:
+            symbol = None
+        if symbol is None:
+            if IRichInput.providedBy(input):
+                symbol = input.symbol()
+                if not isinstance(input, self._richInputs):
+                    raise IllegalInput(symbol)
+            else:
+                symbol = input
+
+        outputs, deliveries = self._current.receive(self, symbol)
+        if deliveries:
+            self._deliver(input, deliveries)
+        return outputs
+
+
+    def tryReceive(self, input):
+        try:
+            symbol = self._singletons.get(input)
+        except TypeError:
+            symbol = None
+        if symbol is None:
+            if IRichInput.providedBy(input):
+                if not isinstance(input, self._richInputs):
+                    return REJECTED
+                symbol = input.symbol()
+            else:
+                symbol = input
+
+        step = self._current.tryReceive(self, symbol)
+        if step is None:
+            return REJECTED
+        outputs, deliveries = step
+        if deliveries:
+            self._deliver(input, deliveries)
+        return outputs
+
+
+    def handles(self, input):
+        """
+        @see: L{IRejectingFiniteStateMachine.handles}
+        """
+        if IRichInput.providedBy(input):
+            if not isinstance(input, self._richInputs):
+                return False
+            input = input.symbol()
+        return self._current.handles(input)
+
+
+    def _deliver(self, input, deliveries):
+        """
+        Deliver the outputs of a step to the world.
+
+        @param input: The input (symbolic or rich) which caused them.
+        @param deliveries: See L{_steps}.
+        """
+        output = self._world.output
+        for (symbol, adapter) in deliveries:
+            if adapter is None:
+                output(symbol, input)
+            else:
+                output(symbol, adapter(input))
+
+
+    def _reject(self, symbol):
+        """
+        Raise the appropriate exception for an input symbol which is not
+        handled in the current state.
+        """
+        try:
+            legal = symbol in self._inputs
+        except TypeError:
+            legal = False
+        if not legal:
+            raise IllegalInput(symbol)
+        raise UnhandledInput(self.state, symbol)
+
+
+    def _isTerminal(self, state):
+        return self._states[state].terminal
+
+
+
+def dispatchingFiniteStateMachine(definition, world):
+    """
+    An engine for L{constructFromDefinition} (or
+    L{constructFiniteStateMachine}) which represents each state by an object
+    which handles the inputs received in that state.
+
+    The resulting state machine behaves exactly like one created by
+    L{interpretedFiniteStateMachine}.
+
+    @type definition: L{CompiledDefinition}
+
+    @param world: The L{IOutputExecutor} provider to drive with the outputs
+        of the state machine.
+
+    @return: An L{IFiniteStateMachine} provider
+    """
+    try:
+        states, inputs = definition._engines[dispatchingFiniteStateMachine]
+    except KeyError:
+        states = _states(definition)
+        inputs = frozenset(_symbols(definition.inputs))
+        definition._engines[dispatchingFiniteStateMachine] = states, inputs
+    return _DispatchingFiniteStateMachine(
+        states, definition.initial, inputs, definition.richInputs, world)
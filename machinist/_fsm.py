@@ -5,20 +5,41 @@
 Implementation details for machinist's public interface.
 """
 
+import keyword
+import re
+
 from zope.interface import implementer
 from zope.interface.exceptions import DoesNotImplement
 
+from ._interface import (
+    IRejectingFiniteStateMachine, IOutputExecutor, IRichInput,
+)
+from ._definition import CompiledDefinition, _symbols, _symbolName, _TEXT
+from ._util import FancyStrMixin, FancyEqMixin
+
 
-from twisted.python.util import FancyStrMixin, FancyEqMixin
+# The default value of the logger parameter of the state machine constructors.
+# It stands for the shared eliot logger, if eliot is installed.  Importing eliot
+# is comparatively expensive, so it is only done when this is first used.
+LOGGER = object()
 
-from ._interface import IFiniteStateMachine, IOutputExecutor, IRichInput
+_logging = None
 
-try:
-    from ._logging import Logger, FiniteStateLogger
-except ImportError:
-    LOGGER = None
-else:
-    LOGGER = Logger()
+def _loggingModule():
+    """
+    Import L{machinist._logging} the first time it is needed.
+
+    @return: The L{machinist._logging} module or C{None} if it cannot be used
+        because eliot is not installed.
+    """
+    global _logging
+    if _logging is None:
+        try:
+            from . import _logging as module
+        except ImportError:
+            module = False
+        _logging = module
+    return _logging or None
 
 
 class StateMachineDefinitionError(Exception):
@@ -111,6 +132,23 @@ class ExtraInputContext(StateMachineDefinitionError):
 
 
 
+class UnhandledTimeoutInput(StateMachineDefinitionError):
+    """
+    The input of a timeout is not handled in the state the timeout is defined
+    for, so a state machine would fail when the time is up.
+    """
+
+
+
+class InvalidStatefulState(StateMachineDefinitionError):
+    """
+    A L{stateful} attribute of a class decorated with L{statefulRecord} is
+    allowed in a state which is not explicitly defined by the state L{Names}
+    subclass given to the decorator.
+    """
+
+
+
 class UnhandledInput(Exception):
     """
     The state machine received an input for which no transition was defined in
@@ -127,7 +165,13 @@ class IllegalInput(Exception):
 
 
 
-class Transition(FancyStrMixin, FancyEqMixin, object):
+# Returned by IRejectingFiniteStateMachine.tryReceive in place of the outputs for an
+# input which is not handled.
+REJECTED = object()
+
+
+
+class Transition(FancyStrMixin, FancyEqMixin):
     """
     A L{Transition} represents an output produced and the next state to assume
     by a L{IFiniteStateMachine} on receipt of a particular input in a
@@ -150,14 +194,35 @@ class TransitionTable(object):
         symbols from C{inputs} to L{Transition} instances giving the output and
         next state when the corresponding input is received.
 
+    @ivar defaults: L{dict} mapping symbols from C{states} to the
+        L{Transition} taken when an input which C{table} has no transition for
+        is received in that state.
+
+    @ivar globalDefault: The L{Transition} taken when an input is received in
+        a state for which neither C{table} nor C{defaults} has a transition,
+        or C{None} if there is no such transition.
+
+    @ivar timeouts: L{dict} mapping symbols from C{states} to a L{tuple} of
+        the number of seconds a state machine may stay in that state without
+        a transition and the input it is given when it has stayed that long.
+        See L{addTimeout}.
+
     @note: L{TransitionTable} has no methods which mutate instances of it.
         Instances are meant to be immutable to simplify reasoning about state
         machines and to facilitate sharing of transition definitions.
     """
-    def __init__(self, table=None):
+    def __init__(self, table=None, defaults=None, globalDefault=None,
+                 timeouts=None):
         if table is None:
             table = {}
+        if defaults is None:
+            defaults = {}
+        if timeouts is None:
+            timeouts = {}
         self.table = table
+        self.defaults = defaults
+        self.globalDefault = globalDefault
+        self.timeouts = timeouts
 
 
     def _copy(self):
@@ -172,7 +237,68 @@ class TransitionTable(object):
             table[existingState] = {}
             for (existingInput, existingTransition) in existingOutputs.items():
                 table[existingState][existingInput] = existingTransition
-        return TransitionTable(table)
+        return TransitionTable(
+            table, dict(self.defaults), self.globalDefault,
+            dict(self.timeouts))
+
+
+    def _default(self, state):
+        """
+        Find the transition taken in a state on inputs it has no transition
+        for.
+
+        @return: The L{Transition} or C{None} if there is none.
+        """
+        return self.defaults.get(state, self.globalDefault)
+
+
+    def _transition(self, state, input):
+        """
+        Find the transition taken in a state on an input, including defaults.
+
+        @return: The L{Transition} or C{None} if the input is not handled.
+        """
+        try:
+            return self.table[state][input]
+        except KeyError:
+            return self._default(state)
+
+
+    def _row(self, state, inputs):
+        """
+        Find all of the transitions of a state with defaults expanded.
+
+        @param inputs: The input alphabet as a sequence of symbols.
+
+        @return: A L{dict} mapping each input handled in C{state} to its
+            L{Transition}.
+        """
+        row = self.table.get(state, {})
+        default = self._default(state)
+        if default is None:
+            return row
+        expanded = dict.fromkeys(inputs, default)
+        expanded.update(row)
+        return expanded
+
+
+    def _isTerminal(self, state, inputs):
+        """
+        Determine whether a state has no transitions to other states and no
+        outputs (see L{_FiniteStateMachine._isTerminal}).
+
+        @param inputs: The input alphabet as a L{set} of symbols.
+
+        @rtype: L{bool}
+        """
+        row = self.table.get(state, {})
+        transitions = list(row.values())
+        default = self._default(state)
+        if default is not None and len(row) < len(inputs):
+            transitions.append(default)
+        return all(
+            transition.output == [] and transition.nextState == state
+            for transition in transitions)
 
 
     def addTransition(self, state, input, output, nextState):
@@ -209,6 +335,69 @@ class TransitionTable(object):
         return table
 
 
+    def addDefaultTransition(self, state, output, nextState):
+        """
+        Create a new L{TransitionTable} with all the same transitions as this
+        L{TransitionTable} plus a transition taken in a state on every input
+        that state has no other transition for.
+
+        The default is stored once rather than once for each input, so a
+        state can handle a large input alphabet without a large table.
+
+        @param state: The state for which the default is defined.
+        @param output: The output produced by the default transition.
+        @param nextState: The state that will follow the default transition.
+
+        @return: The newly created L{TransitionTable}.
+        """
+        table = self._copy()
+        table.defaults[state] = Transition(output, nextState)
+        return table
+
+
+    def addGlobalDefaultTransition(self, output, nextState):
+        """
+        Create a new L{TransitionTable} with all the same transitions as this
+        L{TransitionTable} plus a transition taken in every state on every
+        input which has no other transition (including a default defined by
+        L{addDefaultTransition}) in that state.
+
+        @param output: The output produced by the default transition.
+        @param nextState: The state that will follow the default transition.
+
+        @return: The newly created L{TransitionTable}.
+        """
+        table = self._copy()
+        table.globalDefault = Transition(output, nextState)
+        return table
+
+
+    def addTimeout(self, state, seconds, input):
+        """
+        Create a new L{TransitionTable} with all the same transitions as this
+        L{TransitionTable} plus a timeout for a state.
+
+        A state machine which has been given a L{TimerWheel} (see
+        L{scheduleTimeouts}) receives C{input} once it has been in C{state}
+        for C{seconds} without a transition.  Every transition, including one
+        from C{state} back to C{state}, starts the time again.
+
+        @param state: The state for which the timeout is defined.
+        @param seconds: The number of seconds before the timeout.
+        @param input: The input received when the time is up.  It must be
+            handled in C{state}.
+
+        @raise ValueError: If C{seconds} is not positive.
+
+        @return: The newly created L{TransitionTable}.
+        """
+        if not seconds > 0:
+            raise ValueError("Timeouts must be positive: %r" % (seconds,))
+        table = self._copy()
+        table.timeouts[state] = (seconds, input)
+        return table
+
+
     def addTerminalState(self, state):
         """
         Create a new L{TransitionTable} with all of the same transitions as
@@ -249,21 +438,106 @@ def _missingExtraCheck(given, required, extraException, missingException):
 
 
 
+def _checkDefinition(inputs, outputs, states, table, initial, richInputs,
+                     inputContext):
+    """
+    Verify that the pieces of a state machine definition are consistent with
+    each other.
+
+    @see: L{constructFiniteStateMachine} for the meaning of the parameters.
+
+    @param table: The state transition table.
+    @type table: L{TransitionTable}
+
+    @raise StateMachineDefinitionError: If any of the statically detectable
+        problems are found with the definition.
+
+    @raise DoesNotImplement: If any of the rich input types fails to implement
+        the interfaces required by the outputs it can lead to.
+
+    @return: C{None}
+    """
+    inputs = set(_symbols(inputs))
+    outputs = set(_symbols(outputs))
+    states = set(_symbols(states))
+
+    transitions = [
+        transition for s in table.table.values() for transition in s.values()]
+    transitions.extend(table.defaults.values())
+    if table.globalDefault is not None:
+        transitions.append(table.globalDefault)
+
+    # A global default gives every state transitions, so none is missing.
+    givenStates = set(table.table) | set(table.defaults)
+    if table.globalDefault is not None:
+        givenStates |= states
+    _missingExtraCheck(
+        givenStates, states,
+        ExtraTransitionState, MissingTransitionState)
+
+    # Likewise, defaults may be all that handles some inputs.
+    givenInputs = set(i for s in table.table.values() for i in s)
+    if table.defaults or table.globalDefault is not None:
+        givenInputs |= inputs
+    _missingExtraCheck(
+        givenInputs, inputs,
+        ExtraTransitionInput, MissingTransitionInput)
+
+    extraTimeoutStates = set(table.timeouts) - states
+    if extraTimeoutStates:
+        raise ExtraTransitionState(extraTimeoutStates)
+    extraTimeoutInputs = set(
+        input for (seconds, input) in table.timeouts.values()) - inputs
+    if extraTimeoutInputs:
+        raise ExtraTransitionInput(extraTimeoutInputs)
+    unhandledTimeouts = set(
+        (state, input) for (state, (seconds, input)) in table.timeouts.items()
+        if table._transition(state, input) is None)
+    if unhandledTimeouts:
+        raise UnhandledTimeoutInput(unhandledTimeouts)
+
+    _missingExtraCheck(
+        set(output
+            for transition in transitions for output in transition.output),
+        outputs,
+        ExtraTransitionOutput, MissingTransitionOutput)
+
+    try:
+        _missingExtraCheck(
+            set(transition.nextState for transition in transitions),
+            states,
+            ExtraTransitionNextState, MissingTransitionNextState)
+    except MissingTransitionNextState as e:
+        if e.args != ({initial},):
+            raise
+
+    if initial not in states:
+        raise InvalidInitialState(initial)
+
+    extraInputContext = set(inputContext) - outputs
+    if extraInputContext:
+        raise ExtraInputContext(extraInputContext)
+
+    _checkConsistency(richInputs, table, states, inputContext)
+
+
+
 def constructFiniteStateMachine(inputs, outputs, states, table, initial,
                                 richInputs, inputContext, world,
-                                logger=LOGGER):
+                                logger=LOGGER, engine=None):
     """
     Construct a new finite state machine from a definition of its states.
 
     @param inputs: Definitions of all input symbols the resulting machine will
-        need to handle, as a L{twisted.python.constants.Names} subclass.
+        need to handle, as a L{twisted.python.constants.Names} subclass, an
+        L{enum.Enum} subclass or a sequence of hashable values.
 
     @param outputs: Definitions of all output symbols the resulting machine is
-        allowed to emit, as a L{twisted.python.constants.Names} subclass.
+        allowed to emit, in any of the forms allowed for C{inputs}.
 
     @param states: Definitions of all possible states the resulting machine
-        will be capable of inhabiting, as a L{twisted.python.constants.Names}
-        subclass.
+        will be capable of inhabiting, in any of the forms allowed for
+        C{inputs}.
 
     @param table: The state transition table, defining which output and next
         state results from the receipt of any and all inputs in any and all
@@ -285,56 +559,142 @@ def constructFiniteStateMachine(inputs, outputs, states, table, initial,
         side-effects.
     @type world: L{IOutputExecutor} provider
 
-    @param logger: The logger to which to write messages.
+    @param logger: The logger to which to write messages.  By default, this is
+        a shared L{eliot.Logger} if eliot is installed.
     @type logger: L{eliot.ILogger} or L{NoneType} if there is no logger.
 
+    @param engine: A two-argument callable which assembles the running state
+        machine from a L{CompiledDefinition} and the L{IOutputExecutor}
+        provider, or C{None} to use L{interpretedFiniteStateMachine}.
+
     @return: An L{IFiniteStateMachine} provider
     """
-    table = table.table
+    _checkDefinition(
+        inputs, outputs, states, table, initial, richInputs, inputContext)
+    return _construct(
+        CompiledDefinition(
+            inputs, outputs, states, table, initial, tuple(richInputs),
+            inputContext),
+        world, logger, engine)
 
-    _missingExtraCheck(
-        set(table.keys()), set(states.iterconstants()),
-        ExtraTransitionState, MissingTransitionState)
 
-    _missingExtraCheck(
-        set(i for s in table.values() for i in s), set(inputs.iterconstants()),
-        ExtraTransitionInput, MissingTransitionInput)
 
-    _missingExtraCheck(
-        set(output for s in table.values() for transition in s.values() for output in transition.output),
-        set(outputs.iterconstants()),
-        ExtraTransitionOutput, MissingTransitionOutput)
+def compileDefinition(inputs, outputs, states, table, initial, richInputs,
+                      inputContext, minimize=False, prune=False):
+    """
+    Check a state machine definition for correctness once so that any number
+    of state machines can later be constructed from it cheaply.
+
+    @see: L{constructFiniteStateMachine} for the meaning of the parameters and
+        the exceptions raised for incorrect definitions.
+
+    @param minimize: If C{True}, merge equivalent states using
+        L{minimizeTable}.  The states of the resulting definition are the
+        remaining states, in the order given by C{states}, and its
+        C{stateMapping} maps each original state to the one it was merged
+        into.  State machines constructed from it only ever enter the
+        remaining states, which keep their original symbols (so, for example,
+        they are logged with their original names).
+
+    @param prune: If C{True}, leave out the states which cannot be reached
+        from the initial state (see L{pruneTable}).  The states of the
+        resulting definition are the reachable states, in the order given by
+        C{states}.  The whole definition is checked for correctness first,
+        and unreachable states are left out before any are merged.
+
+    @return: The checked definition.
+    @rtype: L{CompiledDefinition}
+    """
+    _checkDefinition(
+        inputs, outputs, states, table, initial, richInputs, inputContext)
+    stateMapping = None
+    if prune:
+        from ._analysis import _reachable, pruneTable
+        reachable = _reachable(table, initial)
+        table = pruneTable(table, initial)
+        states = tuple(
+            state for state in _symbols(states) if state in reachable)
+    if minimize:
+        from ._minimize import minimizeTable
+        table, stateMapping = minimizeTable(table, states, initial)
+        states = tuple(
+            state for state in _symbols(states)
+            if stateMapping[state] == state)
+    return CompiledDefinition(
+        inputs, outputs, states, table, initial, tuple(richInputs),
+        inputContext, stateMapping=stateMapping)
+
+
+
+def constructFromDefinition(definition, world, logger=LOGGER, engine=None):
+    """
+    Construct a new finite state machine from a definition which has already
+    been checked by L{compileDefinition}.
 
-    try:
-        _missingExtraCheck(
-            set(transition.nextState for s in table.values() for transition in s.values()),
-            set(states.iterconstants()),
-            ExtraTransitionNextState, MissingTransitionNextState)
-    except MissingTransitionNextState as e:
-        if e.args != ({initial},):
-            raise
+    @type definition: L{CompiledDefinition}
+
+    @param world: See L{constructFiniteStateMachine}
+    @param logger: See L{constructFiniteStateMachine}
+    @param engine: See L{constructFiniteStateMachine}
+
+    @return: An L{IFiniteStateMachine} provider
+    """
+    return _construct(definition, world, logger, engine)
 
-    if initial not in states.iterconstants():
-        raise InvalidInitialState(initial)
 
-    extraInputContext = set(inputContext) - set(outputs.iterconstants())
-    if extraInputContext:
-        raise ExtraInputContext(extraInputContext)
 
-    _checkConsistency(richInputs, table, inputContext)
+def interpretedFiniteStateMachine(definition, world):
+    """
+    The default engine: a state machine which looks up each input in the
+    definition's L{TransitionTable}.
+
+    @type definition: L{CompiledDefinition}
+
+    @param world: The L{IOutputExecutor} provider to drive with the outputs
+        of the state machine.
+
+    @return: An L{IFiniteStateMachine} provider
+    """
+    fsm = _FiniteStateMachine(
+        definition.inputs, definition.outputs, definition.states,
+        definition.table.table, definition.initial,
+        definition.table.defaults, definition.table.globalDefault,
+        definition.table.timeouts)
+    return _FiniteStateInterpreter(
+        definition.richInputs, definition.inputContext, fsm, world)
+
+
+
+def _construct(definition, world, logger, engine=None):
+    """
+    Assemble the objects which make up a running state machine.
 
-    fsm = _FiniteStateMachine(inputs, outputs, states, table, initial)
+    @type definition: L{CompiledDefinition}
+
+    @param world: See L{constructFiniteStateMachine}
+    @param logger: See L{constructFiniteStateMachine}
+    @param engine: See L{constructFiniteStateMachine}
+
+    @return: An L{IFiniteStateMachine} provider
+    """
+    if engine is None:
+        engine = interpretedFiniteStateMachine
     executor = IOutputExecutor(world)
-    interpreter = _FiniteStateInterpreter(
-        tuple(richInputs), inputContext, fsm, executor)
+    interpreter = engine(definition, executor)
+    logging = None
+    if logger is LOGGER:
+        logging = _loggingModule()
+        logger = None if logging is None else logging.LOGGER
     if logger is not None:
-        interpreter = FiniteStateLogger(
+        if logging is None:
+            from . import _logging as logging
+        interpreter = logging.FiniteStateLogger(
             interpreter, logger, executor.identifier())
     return interpreter
 
 
 
-def _checkConsistency(richInputs, fsm, inputContext):
+def _checkConsistency(richInputs, table, states, inputContext):
     """
     Verify that the outputs that can be generated by fsm have their
     requirements satisfied by the given rich inputs.
@@ -343,8 +703,11 @@ def _checkConsistency(richInputs, fsm, inputContext):
         inputs to an L{IFiniteStateMachine}.
     @type richInputs: L{list} of L{IRichInput} providers
 
-    @param fsm: The L{IFiniteStateMachine} to which these rich inputs are to be
-        delivered.
+    @param table: The transition table of the L{IFiniteStateMachine} to which
+        these rich inputs are to be delivered.
+    @type table: L{TransitionTable}
+
+    @param states: The L{set} of states of the L{IFiniteStateMachine}.
 
     @param inputContext: A L{dict} mapping output symbols to L{Interface}
         subclasses.  Rich inputs which result in these outputs being produced
@@ -355,28 +718,29 @@ def _checkConsistency(richInputs, fsm, inputContext):
         received.
     """
     for richInput in richInputs:
-        for state in fsm:
-            for input in fsm[state]:
-                if richInput.symbol() == input:
-                    # This rich input will be supplied to represent this input
-                    # symbol in this state.  Check to see if it satisfies the
-                    # output requirements.
-                    outputs = fsm[state][input].output
-                    for output in outputs:
-                        try:
-                            required = inputContext[output]
-                        except KeyError:
-                            continue
-                        # Consider supporting non-interface based checking in
-                        # the future: extend this to also allow
-                        # issubclass(richInput, required)
-                        if required.implementedBy(richInput):
-                            continue
-                        raise DoesNotImplement(
-                            "%r not implemented by %r, "
-                            "required by %r in state %r" % (
-                                required, richInput,
-                                input, state))
+        input = richInput.symbol()
+        for state in states:
+            # This rich input will be supplied to represent this input symbol
+            # in this state.  Check to see if it satisfies the output
+            # requirements.
+            transition = table._transition(state, input)
+            if transition is None:
+                continue
+            for output in transition.output:
+                try:
+                    required = inputContext[output]
+                except KeyError:
+                    continue
+                # Consider supporting non-interface based checking in the
+                # future: extend this to also allow
+                # issubclass(richInput, required)
+                if required.implementedBy(richInput):
+                    continue
+                raise DoesNotImplement(
+                    "%r not implemented by %r, "
+                    "required by %r in state %r" % (
+                        required, richInput,
+                        input, state))
 
 
 
@@ -386,29 +750,87 @@ def _symbol(which):
 
 
 
+# The types created by trivialInput, by the type and value of their symbol
+# (equal symbols of different types, such as 0 and False or the members of
+# two IntEnums, are different symbols), and the single instance of each of
+# them.
+_trivialInputs = {}
+_singletonInputs = {}
+
 def trivialInput(symbol):
     """
-    Create a new L{IRichInput} implementation for the given input symbol.
+    Get the L{IRichInput} implementation for the given input symbol.
 
-    This creates a new type object and is intended to be used at module scope
-    to define rich input types.  Generally, only one use per symbol should be
-    required.  For example::
+    The type is created the first time it is asked for and the same type is
+    returned for the same symbol after that, so it may be used at module
+    scope or wherever rich input types are needed.  For example::
 
         Apple = trivialInput(Fruit.apple)
 
+    The type is shared by every caller in the process (and is the type of
+    L{singletonInput}), so it must not be changed.  To declare further
+    interfaces or add behaviour, subclass it instead::
+
+        @implementer(IFruit)
+        class Apple(trivialInput(Fruit.apple)):
+            pass
+
     @param symbol: A symbol from some state machine's input alphabet.
 
-    @return: A new type object usable as a rich input for the given symbol.
+    @return: A type object usable as a rich input for the given symbol.
     @rtype: L{type}
     """
-    return implementer(IRichInput)(type(
-            symbol.name.title(), (FancyStrMixin, object), {
+    key = (type(symbol), symbol)
+    try:
+        return _trivialInputs[key]
+    except KeyError:
+        pass
+    richInput = implementer(IRichInput)(type(
+            str(_symbolName(symbol).title()), (FancyStrMixin,), {
                 "symbol": _symbol(symbol),
                 }))
+    _trivialInputs[key] = richInput
+    _singletonInputs[richInput] = richInput()
+    return richInput
 
 
 
-@implementer(IFiniteStateMachine)
+def singletonInput(symbol):
+    """
+    Get the single, shared instance of the L{trivialInput} type for the given
+    input symbol.
+
+    Inputs which carry no data do not need a new instance for each delivery.
+    State machines which allow the type recognize this instance by identity,
+    which is cheaper than checking interfaces and types as is done for other
+    rich inputs.
+
+    @param symbol: A symbol from some state machine's input alphabet.
+
+    @return: An instance of C{trivialInput(symbol)}.
+    """
+    return _singletonInputs[trivialInput(symbol)]
+
+
+
+def _singletons(richInputs):
+    """
+    Find the singleton instances (see L{singletonInput}) of some rich input
+    types.
+
+    @param richInputs: The rich input types a state machine allows.
+
+    @return: A L{dict} mapping each singleton instance of one of those types
+        to its symbol.
+    """
+    return dict(
+        (_singletonInputs[richInput], richInput.symbol())
+        for richInput in richInputs
+        if richInput in _singletonInputs)
+
+
+
+@implementer(IRejectingFiniteStateMachine)
 class _FiniteStateMachine(object):
     """
     A L{_FiniteStateMachine} tracks the core logic of a finite state machine:
@@ -420,33 +842,90 @@ class _FiniteStateMachine(object):
     @ivar table: See L{constructFiniteStateMachine}
     @ivar initial: See L{constructFiniteStateMachine}
 
+    @ivar defaults: See L{TransitionTable.defaults}
+    @ivar globalDefault: See L{TransitionTable.globalDefault}
+    @ivar timeouts: See L{TransitionTable.timeouts}
+
     @ivar state: The current state of this FSM.
     @type state: L{NamedConstant} from C{states}
     """
-    def __init__(self, inputs, outputs, states, table, initial):
+    def __init__(self, inputs, outputs, states, table, initial,
+                 defaults=None, globalDefault=None, timeouts=None):
+        if defaults is None:
+            defaults = {}
+        if timeouts is None:
+            timeouts = {}
         self.inputs = inputs
         self.outputs = outputs
         self.states = states
         self.table = table
         self.initial = initial
+        self.defaults = defaults
+        self.globalDefault = globalDefault
+        self.timeouts = timeouts
         self.state = initial
+        self._inputs = frozenset(_symbols(inputs))
 
 
     def receive(self, input):
-        current = self.table[self.state]
+        try:
+            transition = self.table[self.state][input]
+        except (KeyError, TypeError):
+            # Every input in the table is part of the input alphabet, so only
+            # check for illegal inputs when the lookup fails.
+            if not self._legal(input):
+                raise IllegalInput(input)
+            transition = self.defaults.get(self.state, self.globalDefault)
+            if transition is None:
+                raise UnhandledInput(self.state, input)
+
+        self.state = transition.nextState
+        return transition.output
 
-        if input not in self.inputs.iterconstants():
-            raise IllegalInput(input)
 
+    def tryReceive(self, input):
         try:
-            transition = current[input]
-        except KeyError:
-            raise UnhandledInput(self.state, input)
-
+            transition = self.table[self.state][input]
+        except (KeyError, TypeError):
+            transition = self._lookup(input)
+            if transition is None:
+                return REJECTED
         self.state = transition.nextState
         return transition.output
 
 
+    def handles(self, input):
+        return self._lookup(input) is not None
+
+
+    def _legal(self, input):
+        """
+        Determine whether an input is part of the input alphabet.
+
+        @rtype: L{bool}
+        """
+        try:
+            return input in self._inputs
+        except TypeError:
+            return False
+
+
+    def _lookup(self, input):
+        """
+        Find the transition for an input in the current state without raising
+        an exception if there is none.
+
+        @return: The L{Transition} or C{None} if the input is not handled.
+        """
+        try:
+            transition = self.table[self.state].get(input)
+        except (KeyError, TypeError):
+            transition = None
+        if transition is None and self._legal(input):
+            transition = self.defaults.get(self.state, self.globalDefault)
+        return transition
+
+
     def _isTerminal(self, state):
         """
         Determine whether or not the given state is a terminal state in this
@@ -462,14 +941,13 @@ class _FiniteStateMachine(object):
         # differently eventually - perhaps by accepting an explicit set of
         # terminal states in constructFiniteStateMachine.
         # https://www.pivotaltracker.com/story/show/59999580
-        return all(
-            transition.output == [] and transition.nextState == state
-            for (input, transition)
-            in self.table[state].iteritems())
+        return TransitionTable(
+            self.table, self.defaults, self.globalDefault,
+        )._isTerminal(state, self._inputs)
 
 
 
-@implementer(IFiniteStateMachine)
+@implementer(IRejectingFiniteStateMachine)
 class _FiniteStateInterpreter(object):
     """
     A L{_FiniteStateInterpreter} translates between the "real world" - which
@@ -491,7 +969,31 @@ class _FiniteStateInterpreter(object):
 
     @ivar _world: The L{IOutputExecutor} provider this interpreter will drive
         with outputs from C{_fsm}.
+
+    @ivar _singletons: See L{_singletons}.
+
+    @ivar _plans: A L{dict} mapping input types to the result of L{_plan} for
+        that type.  The rich input types are planned for up front and any
+        other types the first time an input of that type is received.
+
+    @ivar _clearing: C{None} or, once L{clearStatefulOnExit} has been used,
+        a L{dict} mapping state, next state pairs to a L{tuple} of the
+        L{stateful} attributes of C{_clearOwner} to clear after a transition
+        between those states.
+
+    @ivar _timeouts: C{None} or, once L{scheduleTimeouts} has been used, the
+        L{TransitionTable.timeouts} of the definition.
+    @ivar _wheel: The L{TimerWheel} the timeouts are scheduled with.
+    @ivar _timer: The timer for the timeout of the current state, or C{None}
+        if there is none.
+    @ivar _timeoutTarget: The state machine to deliver timeout inputs to.
     """
+    _clearing = None
+    _clearOwner = None
+    _timeouts = None
+    _wheel = None
+    _timer = None
+    _timeoutTarget = None
 
     def __repr__(self):
         return "<FSM / %s>" % (self._world,)
@@ -503,9 +1005,63 @@ class _FiniteStateInterpreter(object):
 
     def __init__(self, richInputs, inputContext, fsm, world):
         self._richInputs = richInputs
+        self._singletons = _singletons(richInputs)
         self._inputContext = inputContext
         self._fsm = fsm
         self._world = world
+        self._plans = dict(
+            (richInput, self._plan(richInput)) for richInput in richInputs)
+
+
+    def _plan(self, inputType):
+        """
+        Work out which outputs need their context adapted from inputs of a
+        certain type.
+
+        @param inputType: The type of an input.
+
+        @return: A L{dict} mapping each output which needs its context
+            adapted to the adapter to use.  Outputs whose required interface
+            is implemented by C{inputType} are left out: the input is passed
+            to them as is.
+        """
+        return dict(
+            (output, adapter)
+            for (output, adapter) in self._inputContext.items()
+            if not adapter.implementedBy(inputType))
+
+
+    def _deliver(self, input, outputs):
+        """
+        Deliver the outputs of a transition to the world.
+
+        The context for each output is adapted from the input at most once
+        for each adapter, however many of the outputs use it.
+
+        @param input: The input (symbolic or rich) which caused them.
+        @param outputs: The output symbols.
+        """
+        inputType = input.__class__
+        try:
+            plan = self._plans[inputType]
+        except KeyError:
+            plan = self._plans[inputType] = self._plan(inputType)
+        output = self._world.output
+        if not plan:
+            for symbol in outputs:
+                output(symbol, input)
+            return
+        contexts = {}
+        for symbol in outputs:
+            adapter = plan.get(symbol)
+            if adapter is None:
+                output(symbol, input)
+            else:
+                try:
+                    context = contexts[adapter]
+                except KeyError:
+                    context = contexts[adapter] = adapter(input)
+                output(symbol, context)
 
 
     def receive(self, input):
@@ -520,7 +1076,16 @@ class _FiniteStateInterpreter(object):
 
         @return: The output from the wrapped L{IFiniteStateMachine}.
         """
-        if IRichInput.providedBy(input):
+        clearing = self._clearing
+        if clearing is not None:
+            state = self._fsm.state
+        try:
+            symbol = self._singletons.get(input)
+        except TypeError:
+            symbol = None
+        if symbol is not None:
+            outputs = self._fsm.receive(symbol)
+        elif IRichInput.providedBy(input):
             symbol = input.symbol()
             if not isinstance(input, self._richInputs):
                 raise IllegalInput(symbol)
@@ -529,12 +1094,103 @@ class _FiniteStateInterpreter(object):
             # if it's not a symbol, the underlying FSM will raise IllegalInput
             outputs = self._fsm.receive(input)
 
-        for output in outputs:
-            adapter = self._inputContext.get(output, lambda o: o)
-            self._world.output(output, adapter(input))
+        try:
+            if outputs:
+                self._deliver(input, outputs)
+        finally:
+            # The state has changed even if an output failed.
+            if clearing is not None:
+                self._clear(clearing, state)
+            if self._timeouts is not None:
+                self._rearm()
+        return outputs
+
+
+    def tryReceive(self, input):
+        """
+        Like L{receive}, but return L{REJECTED} rather than raising an
+        exception if the input is not handled.
+
+        @see: L{IRejectingFiniteStateMachine.tryReceive}
+        """
+        clearing = self._clearing
+        if clearing is not None:
+            state = self._fsm.state
+        try:
+            symbol = self._singletons.get(input)
+        except TypeError:
+            symbol = None
+        if symbol is not None:
+            outputs = self._fsm.tryReceive(symbol)
+        elif IRichInput.providedBy(input):
+            if not isinstance(input, self._richInputs):
+                return REJECTED
+            outputs = self._fsm.tryReceive(input.symbol())
+        else:
+            outputs = self._fsm.tryReceive(input)
+        if outputs is REJECTED:
+            return outputs
+
+        try:
+            if outputs:
+                self._deliver(input, outputs)
+        finally:
+            # The state has changed even if an output failed.
+            if clearing is not None:
+                self._clear(clearing, state)
+            if self._timeouts is not None:
+                self._rearm()
         return outputs
 
 
+    def handles(self, input):
+        """
+        @see: L{IRejectingFiniteStateMachine.handles}
+        """
+        if IRichInput.providedBy(input):
+            if not isinstance(input, self._richInputs):
+                return False
+            input = input.symbol()
+        return self._fsm.handles(input)
+
+
+    def _clear(self, clearing, state):
+        """
+        Clear the L{stateful} attributes which the transition just made from
+        C{state} has left the allowed states of.
+
+        @param clearing: See C{_clearing}.
+        """
+        attributes = clearing.get((state, self._fsm.state))
+        if attributes is not None:
+            for attribute in attributes:
+                attribute._clear(self._clearOwner)
+
+
+    def _rearm(self):
+        """
+        Cancel the timer for the timeout of the state the last transition
+        was made from, if there is one, and start the timer for the timeout
+        of the current state, if there is one.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        timeout = self._timeouts.get(self._fsm.state)
+        if timeout is not None:
+            seconds, input = timeout
+            self._timer = self._wheel.callLater(
+                seconds, self._timedOut, input)
+
+
+    def _timedOut(self, input):
+        """
+        Deliver the input of a timeout which has expired.
+        """
+        self._timer = None
+        self._timeoutTarget.receive(input)
+
+
     def _isTerminal(self, state):
         return self._fsm._isTerminal(state)
 
@@ -587,9 +1243,13 @@ class MethodSuffixOutputer(object):
 
         @see: L{IOutputExecutor.output}
         """
-        name = self.prefix + output.name.upper()
+        name = self.prefix + _symbolName(output).upper()
         method = getattr(self.original, name)
-        method(context)
+        return method(context)
+
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
 
 
@@ -602,35 +1262,131 @@ class WrongState(Exception):
 
 
 
+def _attributePath(path):
+    """
+    Create a function which follows a dotted path of attributes.
+
+    This is equivalent to L{operator.attrgetter}, but (on Python 2) calling
+    the result is as fast as calling a C{lambda} written out by hand, since
+    that is what it is.  A dotted L{operator.attrgetter} splits its path on
+    every call.
+
+    @param path: The attribute names, separated by C{"."}.
+    @type path: L{bytes} or L{unicode}
+
+    @raise ValueError: If C{path} is not a dotted path of identifiers.
+
+    @return: A one-argument callable.
+    """
+    if isinstance(path, bytes):
+        path = path.decode("ascii", "replace")
+    for name in path.split(u"."):
+        if _IDENTIFIER.match(name) is None or keyword.iskeyword(name):
+            raise ValueError("Invalid attribute path: %r" % (path,))
+    # The path has been checked to be nothing but identifiers and dots.
+    return eval("lambda obj: obj.%s" % (str(path),), {})
+
+
+
 class stateful(object):
     """
     A L{stateful} descriptor can only be used when an associated finite state
     machine is in a certain state (or states).
 
+    For example, this attribute can only be used while the state machine
+    referred to by the C{_fsm} attribute of its owner is in C{State.open}::
+
+        class Connection(object):
+            __slots__ = ("_fsm", "_buffer")
+            buffer = stateful("_fsm.state", State.open, slot="_buffer")
+
     @ivar _allowed: A L{tuple} of the states in which access to this attribute
         is allowed.
 
+    @ivar _allowedStates: A L{frozenset} of the same states, for checking the
+        current state against.
+
     @ivar _getter: A one-argument callable which accepts the object the
         descriptor is used on and returns the state of that object for
         comparison against C{_allowed}.
 
-    @note: The current implementation strategy for this descriptor type is to
-        store the application value in the instance C{__dict__} using the
-        L{stateful} instance as the key.  This means that the instance must
-        have a C{__dict__} (ie, not use C{__slots__}), that non-string keys are
-        put into C{__dict__}, and that sharing a single L{stateful} instance to
+    @ivar _slot: The name of the slot the value of the attribute is stored in
+        or C{None} if it is stored in the instance C{__dict__}.
+
+    @note: Unless a slot is given, the value is stored in the instance
+        C{__dict__} using the L{stateful} instance as the key.  This means that
+        the instance must have a C{__dict__}, that non-string keys are put into
+        C{__dict__}, and that sharing a single L{stateful} instance to
         represent two different attributes will produce confusing (probably
         incorrect) results.
     """
-    def __init__(self, getter, *allowed):
+    def __init__(self, getter, *allowed, **kwargs):
+        """
+        @param getter: A one-argument callable which accepts the object the
+            descriptor is used on and returns its state, or a dotted attribute
+            path (such as C{"_fsm.state"}) to look the state up on the object
+            directly.
+
+        @param allowed: The states in which access to this attribute is
+            allowed.
+
+        @param slot: The name of a slot (which the owning class must declare in
+            its C{__slots__}) to store the value of this attribute in.  If not
+            given, the value is stored in the instance C{__dict__}.
+
+        @param clearOnExit: If C{True}, the value is released when the state
+            machine leaves the allowed states, if the state machine has been
+            set up to do so with L{clearStatefulOnExit}.
+        """
+        slot = kwargs.pop("slot", None)
+        clearOnExit = kwargs.pop("clearOnExit", False)
+        if kwargs:
+            raise TypeError(
+                "Unexpected keyword arguments: %s" % (", ".join(kwargs),))
+        if isinstance(getter, _TEXT):
+            getter = _attributePath(getter)
         self._getter = getter
         self._allowed = allowed
+        self._allowedStates = frozenset(allowed)
+        self._slot = slot
+        self._clearOnExit = clearOnExit
+
+
+    def _value(self, obj):
+        """
+        Get the value of this attribute without checking the state of C{obj}.
+
+        @raise AttributeError: If the attribute has no value.
+        """
+        if self._slot is not None:
+            return getattr(obj, self._slot)
+        try:
+            return obj.__dict__[self]
+        except KeyError:
+            raise AttributeError()
+
+
+    def _clear(self, obj):
+        """
+        Remove the value of this attribute, if it has one, without checking
+        the state of C{obj}.
+        """
+        if self._slot is not None:
+            try:
+                delattr(obj, self._slot)
+            except AttributeError:
+                pass
+        else:
+            obj.__dict__.pop(self, None)
 
 
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self._getter(obj) in self._allowed:
+        # This repeats _value to save a call on every access.
+        if self._getter(obj) in self._allowedStates:
+            if self._slot is not None:
+                return getattr(obj, self._slot)
             try:
                 return obj.__dict__[self]
             except KeyError:
@@ -639,15 +1395,131 @@ class stateful(object):
 
 
     def __set__(self, obj, value):
-        if self._getter(obj) not in self._allowed:
+        if self._getter(obj) not in self._allowedStates:
             raise WrongState(self, obj)
-        obj.__dict__[self] = value
+        if self._slot is not None:
+            setattr(obj, self._slot, value)
+        else:
+            obj.__dict__[self] = value
 
 
     def __delete__(self, obj):
-        if self._getter(obj) not in self._allowed:
+        if self._getter(obj) not in self._allowedStates:
             raise WrongState(self, obj)
+        if self._slot is not None:
+            delattr(obj, self._slot)
+            return
         try:
             del obj.__dict__[self]
         except KeyError:
             raise AttributeError()
+
+
+
+def _statefulAttributes(cls):
+    """
+    Find the L{stateful} attributes of a class, including inherited ones.
+
+    @return: A L{dict} mapping attribute names to L{stateful} instances.
+    """
+    attributes = {}
+    for klass in reversed(cls.__mro__):
+        for (name, value) in vars(klass).items():
+            if isinstance(value, stateful):
+                attributes[name] = value
+            else:
+                attributes.pop(name, None)
+    return attributes
+
+
+
+def _interpreter(fsm, purpose):
+    """
+    Find the L{_FiniteStateInterpreter} of a state machine created with the
+    default engine.
+
+    @param purpose: A description of what it is needed for, for the error.
+
+    @raise TypeError: If C{fsm} was not created with the default engine.
+    """
+    interpreter = fsm
+    if not isinstance(interpreter, _FiniteStateInterpreter):
+        interpreter = getattr(fsm, "_fsm", None)
+    if not isinstance(interpreter, _FiniteStateInterpreter):
+        raise TypeError("%r does not support %s" % (fsm, purpose))
+    return interpreter
+
+
+
+def scheduleTimeouts(fsm, wheel):
+    """
+    Make a state machine receive the inputs of the timeouts of its states
+    (see L{TransitionTable.addTimeout}).
+
+    A timer is started with C{wheel} whenever the state machine enters a
+    state with a timeout, starting with the state it is in now, and
+    cancelled when it leaves that state.  The definition of the state
+    machine guarantees that the input is handled in that state (see
+    L{UnhandledTimeoutInput}).
+
+    @param fsm: A state machine created with the default engine,
+        L{interpretedFiniteStateMachine} (and possibly logging).
+
+    @param wheel: The L{TimerWheel} to schedule timeouts with.  It may be
+        shared by any number of state machines.
+
+    @raise TypeError: If C{fsm} was not created with the default engine.
+    """
+    interpreter = _interpreter(fsm, "timeouts")
+    interpreter._timeouts = interpreter._fsm.timeouts
+    interpreter._wheel = wheel
+    interpreter._timeoutTarget = fsm
+    interpreter._rearm()
+
+
+
+def clearStatefulOnExit(fsm, obj):
+    """
+    Make a state machine release the values of the L{stateful} attributes of
+    an object which were created with C{clearOnExit=True} whenever a
+    transition leaves the states those attributes are allowed in.
+
+    The attributes must be guarded by the state of C{fsm}.  Which attributes
+    each transition releases is worked out here, so transitions only do
+    work when they have attributes to release.  The values are released
+    after the outputs of the transition have been executed, even if one of
+    them raises an exception.
+
+    @param fsm: A state machine created with the default engine,
+        L{interpretedFiniteStateMachine} (and possibly logging).
+
+    @param obj: The object with the L{stateful} attributes.  This replaces
+        any object previously given for C{fsm}.
+
+    @raise TypeError: If C{fsm} was not created with the default engine.
+    """
+    interpreter = _interpreter(fsm, "clearing stateful attributes")
+    core = interpreter._fsm
+    pairs = set()
+    for state in _symbols(core.states):
+        transitions = list(core.table.get(state, {}).values())
+        default = core.defaults.get(state, core.globalDefault)
+        if default is not None:
+            transitions.append(default)
+        for transition in transitions:
+            pairs.add((state, transition.nextState))
+
+    attributes = [
+        attribute for attribute in _statefulAttributes(type(obj)).values()
+        if attribute._clearOnExit]
+    clearing = {}
+    for (state, nextState) in pairs:
+        leaving = tuple(
+            attribute for attribute in attributes
+            if state in attribute._allowedStates
+            and nextState not in attribute._allowedStates)
+        if leaving:
+            clearing[state, nextState] = leaving
+
+    interpreter._clearOwner = obj
+    interpreter._clearing = clearing
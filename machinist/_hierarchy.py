@@ -0,0 +1,114 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_hierarchy -*-
+
+"""
+Hierarchical state machine definitions.
+
+Transitions shared by many states (for example, for errors or shutting down)
+can be defined once for a I{superstate} which those states are nested in.
+L{flattenHierarchy} turns such a definition into an ordinary
+L{TransitionTable} in which each state has all of the transitions it
+inherits, so state machines using it are no slower than any other::
+
+    table = TransitionTable().addTransitions(
+        Group.connected, {
+            Input.shutdown: ([Output.close], State.closed),
+            Input.error: ([Output.reset], State.idle),
+        },
+    ).addTransition(
+        State.handshaking, Input.hello, [Output.welcome], State.established,
+    ).addTransition(
+        State.established, Input.data, [Output.deliver], State.established,
+    ).addTerminalState(State.closed)
+
+    table = flattenHierarchy(table, {
+        State.handshaking: Group.connected,
+        State.established: Group.connected,
+    })
+"""
+
+from ._fsm import Transition, TransitionTable
+
+
+
+def _ancestry(state, parents):
+    """
+    Find a state and all of the superstates it is nested in, innermost first.
+
+    @raise ValueError: If the superstates are nested in themselves.
+
+    @rtype: L{list}
+    """
+    chain = [state]
+    while chain[-1] in parents:
+        parent = parents[chain[-1]]
+        if parent in chain:
+            raise ValueError("Superstate nested in itself: %r" % (parent,))
+        chain.append(parent)
+    return chain
+
+
+
+def flattenHierarchy(table, parents):
+    """
+    Give every state the transitions of the superstates it is nested in.
+
+    Superstates are abstract: they appear in the given table so that their
+    transitions can be defined, but not in the result.  All other states in
+    the table or in C{parents} are in the result.
+
+    The transition for an input in a state is the state's own transition for
+    it if there is one, or else that of the innermost superstate which has
+    one.  If none of them has one, the default (see
+    L{TransitionTable.addDefaultTransition}) of the state or of the innermost
+    superstate which has a default is used.  Defaults remain defaults in the
+    result, so they do not add a transition for every input to every state.
+    Each state has its own timeout (see L{TransitionTable.addTimeout}) or else
+    that of the innermost superstate which has one.
+    A transition (or default) of a superstate whose next state is that
+    superstate itself leaves the state machine in whichever of its states it
+    is in.
+
+    @param table: The transitions of the states and superstates.
+    @type table: L{TransitionTable}
+
+    @param parents: A L{dict} mapping states (or superstates) to the
+        superstate they are nested in.
+
+    @raise ValueError: If superstates are nested in themselves.
+
+    @return: A new L{TransitionTable} defining the transitions of each
+        (non-abstract) state.
+    """
+    superstates = set(parents.values())
+    states = (
+        set(table.table) | set(table.defaults) | set(table.timeouts)
+        | set(parents)) - superstates
+
+    flattened = {}
+    defaults = {}
+    timeouts = {}
+    for state in states:
+        chain = _ancestry(state, parents)
+        row = {}
+        for ancestor in reversed(chain):
+            for (input, transition) in table.table.get(ancestor, {}).items():
+                if ancestor != state and transition.nextState == ancestor:
+                    transition = Transition(transition.output, state)
+                row[input] = transition
+        flattened[state] = row
+
+        for ancestor in chain:
+            if ancestor in table.defaults:
+                default = table.defaults[ancestor]
+                if ancestor != state and default.nextState == ancestor:
+                    default = Transition(default.output, state)
+                defaults[state] = default
+                break
+
+        for ancestor in chain:
+            if ancestor in table.timeouts:
+                timeouts[state] = table.timeouts[ancestor]
+                break
+    return TransitionTable(
+        flattened, defaults, table.globalDefault, timeouts)
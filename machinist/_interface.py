@@ -6,7 +6,8 @@ Interface definitions for machinist.
 """
 
 __all__ = [
-    "IFiniteStateMachine", "IOutputExecutor", "IRichInput",
+    "IFiniteStateMachine", "IRejectingFiniteStateMachine", "IOutputExecutor",
+    "IRichInput",
 ]
 
 from zope.interface import Attribute, Interface
@@ -36,6 +37,34 @@ class IFiniteStateMachine(Interface):
 
 
 
+class IRejectingFiniteStateMachine(IFiniteStateMachine):
+    """
+    A finite state machine which can also reject inputs without raising an
+    exception.  The state machines constructed by machinist provide this.
+    """
+    def tryReceive(input):
+        """
+        Like L{receive}, but without raising an exception for an input which
+        is not handled.  This is much cheaper than catching L{UnhandledInput}
+        or L{IllegalInput} for applications which routinely deliver inputs
+        that may not be handled in the current state.
+
+        @return: The generated output or L{REJECTED} if the input is not
+            acceptable in the current state (or any state), in which case the
+            state is unchanged.
+        """
+
+
+    def handles(input):
+        """
+        Determine, without changing the state, whether L{tryReceive} would
+        accept an input in the current state.
+
+        @rtype: L{bool}
+        """
+
+
+
 class IOutputExecutor(Interface):
     """
     Perform tasks and cause side-effects associated with outputs from a
@@ -61,6 +90,9 @@ class IOutputExecutor(Interface):
 
         @param context: The adapted rich input which triggered the output
             symbol.
+
+        @return: Ignored by the state machine, though some wrappers (for
+            example, L{machinist.AwaitingOutputer}) make use of it.
         """
 
 
@@ -0,0 +1,58 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_import -*-
+
+"""
+Support for module attributes which are computed when first used.
+"""
+
+__all__ = [
+    "installLazyAttributes",
+]
+
+from sys import modules
+from types import ModuleType
+
+
+class _LazyAttributeModule(ModuleType):
+    """
+    A module type which computes the values of some of its attributes the
+    first time they are used.
+
+    @ivar _lazyAttributes: A L{dict} mapping attribute names to no-argument
+        callables which compute the values of those attributes.
+    """
+    def __getattr__(self, name):
+        try:
+            compute = self.__dict__["_lazyAttributes"][name]
+        except KeyError:
+            raise AttributeError(name)
+        value = compute()
+        setattr(self, name, value)
+        return value
+
+
+
+def installLazyAttributes(name, lazyAttributes):
+    """
+    Arrange for some attributes of a module to be computed when they are first
+    used rather than when the module is imported.
+
+    @param name: The name of the module.
+    @type name: L{str}
+
+    @param lazyAttributes: A L{dict} mapping attribute names to no-argument
+        callables which compute the values of those attributes.
+    """
+    module = modules[name]
+    module._lazyAttributes = lazyAttributes
+    try:
+        module.__class__ = _LazyAttributeModule
+    except TypeError:
+        # Python 2 does not allow the type of a module to be changed.  Replace
+        # the module instead.  Keep a reference to the original since Python 2
+        # clears the globals of modules which are garbage collected and the
+        # functions defined in the original module still use those.
+        lazy = _LazyAttributeModule(name)
+        lazy.__dict__.update(module.__dict__)
+        lazy._original = module
+        modules[name] = lazy
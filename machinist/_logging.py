@@ -6,11 +6,13 @@ Eliot-based logging functionality for machinist.
 """
 
 __all__ = [
-    "LOG_FSM_INITIALIZE", "LOG_FSM_TRANSITION",
+    "LOG_FSM_INITIALIZE", "LOG_FSM_TRANSITION", "LOG_FSM_REJECTED",
 
     "FiniteStateLogger",
 
-    "Field", "ActionType", "Logger",
+    "Field", "ActionType", "MessageType", "Logger",
+
+    "LOGGER",
 ]
 
 from twisted.python.components import proxyForInterface
@@ -20,9 +22,19 @@ from eliot import __version__
 if tuple(int(part) for part in __version__.split(".")[:2]) < (0, 4):
     raise ImportError("eliot version %s is too old for machinist")
 
-from eliot import Field, ActionType, Logger
+from eliot import Field, ActionType, MessageType, Logger
+
+try:
+    unicode
+except NameError:
+    # Python 3
+    unicode = str
+
+from ._interface import IRejectingFiniteStateMachine, IRichInput
+from ._fsm import REJECTED
 
-from ._interface import IFiniteStateMachine, IRichInput
+# The logger used by state machines unless they are given another.
+LOGGER = Logger()
 
 def _system(suffix):
     return u":".join((u"fsm", suffix))
@@ -63,12 +75,18 @@ LOG_FSM_TRANSITION = ActionType(
     [FSM_NEXT_STATE, FSM_OUTPUT],
     u"A finite state machine received an input made a transition.")
 
+LOG_FSM_REJECTED = MessageType(
+    _system(u"rejected"),
+    [FSM_IDENTIFIER, FSM_STATE, FSM_INPUT],
+    u"A finite state machine did not handle an input given to tryReceive.")
 
 
-class FiniteStateLogger(proxyForInterface(IFiniteStateMachine, "_fsm")):
+
+class FiniteStateLogger(
+        proxyForInterface(IRejectingFiniteStateMachine, "_fsm")):
     """
-    L{FiniteStateLogger} wraps another L{IFiniteStateMachine} provider and adds
-    to it logging of all state transitions.
+    L{FiniteStateLogger} wraps another L{IRejectingFiniteStateMachine}
+    provider and adds to it logging of all state transitions.
     """
     def __init__(self, fsm, logger, identifier):
         super(FiniteStateLogger, self).__init__(fsm)
@@ -84,6 +102,38 @@ class FiniteStateLogger(proxyForInterface(IFiniteStateMachine, "_fsm")):
 
         @see: L{IFiniteStateMachine.receive}
         """
+        return self._logTransition(self._fsm.receive, input)
+
+
+    def tryReceive(self, input):
+        """
+        Add logging to the wrapped state machine.  Inputs which are handled
+        are logged as by L{receive}.  Those which are not are logged with a
+        single L{LOG_FSM_REJECTED} message.
+
+        @see: L{IRejectingFiniteStateMachine.tryReceive}
+        """
+        if self._fsm.handles(input):
+            return self._logTransition(self._fsm.tryReceive, input)
+        if IRichInput.providedBy(input):
+            input = input.symbol()
+        LOG_FSM_REJECTED(
+            fsm_identifier=self.identifier,
+            fsm_state=unicode(self.state),
+            fsm_input=unicode(input)).write(self.logger)
+        return REJECTED
+
+
+    def _logTransition(self, receive, input):
+        """
+        Deliver an input to the wrapped state machine in a
+        L{LOG_FSM_TRANSITION} action.
+
+        @param receive: The method of the wrapped state machine to deliver
+            the input with.
+
+        @return: Whatever C{receive} returns.
+        """
         if IRichInput.providedBy(input):
             richInput = unicode(input)
             symbolInput = unicode(input.symbol())
@@ -99,7 +149,7 @@ class FiniteStateLogger(proxyForInterface(IFiniteStateMachine, "_fsm")):
             fsm_input=symbolInput)
 
         with action as theAction:
-            output = super(FiniteStateLogger, self).receive(input)
+            output = receive(input)
             theAction.addSuccessFields(
                 fsm_next_state=unicode(self.state), fsm_output=[unicode(o) for o in output])
 
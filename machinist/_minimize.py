@@ -0,0 +1,172 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_minimize -*-
+
+"""
+Minimization of transition tables.
+"""
+
+from ._fsm import Transition, TransitionTable
+from ._definition import _symbols
+
+
+# The input standing for all of those a state handles with its default.
+_DEFAULT = object()
+
+
+
+def _partition(table):
+    """
+    Find the classes of equivalent states of a transition table.
+
+    Two states are equivalent if they handle the same inputs and, for each of
+    those inputs, produce the same outputs and move to equivalent states.  This
+    is Hopcroft's partition refinement algorithm, starting from the partition
+    of the states by the outputs they produce for each input they handle.
+
+    @param table: The transition table.
+    @type table: L{dict} (see L{TransitionTable.table})
+
+    @return: A L{list} of L{set}s of states.
+    """
+    signatures = {}
+    for (state, row) in table.items():
+        signature = frozenset(
+            (input, tuple(transition.output))
+            for (input, transition) in row.items())
+        signatures.setdefault(signature, set()).add(state)
+    blocks = list(signatures.values())
+
+    # For each input, the states leading to each state on that input.
+    predecessors = {}
+    for (state, row) in table.items():
+        for (input, transition) in row.items():
+            predecessors.setdefault(input, {}).setdefault(
+                transition.nextState, set()).add(state)
+
+    blockOf = {}
+    for (index, block) in enumerate(blocks):
+        for state in block:
+            blockOf[state] = index
+
+    pending = set(
+        (index, input)
+        for index in range(len(blocks)) for input in predecessors)
+    while pending:
+        index, input = pending.pop()
+        leadingTo = predecessors[input]
+        splitter = set()
+        for state in blocks[index]:
+            splitter.update(leadingTo.get(state, ()))
+
+        touched = set(blockOf[state] for state in splitter)
+        for affected in touched:
+            block = blocks[affected]
+            inside = block & splitter
+            if len(inside) == len(block):
+                continue
+            outside = block - inside
+            blocks[affected] = inside
+            blocks.append(outside)
+            new = len(blocks) - 1
+            for state in outside:
+                blockOf[state] = new
+            for other in predecessors:
+                if (affected, other) in pending:
+                    pending.add((new, other))
+                elif len(inside) <= len(outside):
+                    pending.add((affected, other))
+                else:
+                    pending.add((new, other))
+    return blocks
+
+
+
+def minimizeTable(table, states=None, initial=None):
+    """
+    Merge the equivalent states of a transition table.
+
+    States are equivalent if no sequence of inputs can tell them apart: they
+    handle the same inputs, produce the same outputs for them and move to
+    equivalent states.  Each group of equivalent states is replaced by one of
+    its members, so the states of the result are all states of the original.
+    Defaults (see L{TransitionTable.addDefaultTransition}) are compared like
+    any other transitions and remain defaults in the result.  States only
+    merge if they have the same timeout (see L{TransitionTable.addTimeout}),
+    or neither has one.
+
+    @param table: The table to minimize.
+    @type table: L{TransitionTable}
+
+    @param states: If not C{None}, the states of the table in any of the forms
+        accepted by L{constructFiniteStateMachine}.  The earliest of each
+        group of equivalent states is the one which remains.
+
+    @param initial: If not C{None}, the initial state.  It always remains,
+        regardless of C{states}.
+
+    @return: A two-tuple of the minimized L{TransitionTable} and a L{dict}
+        mapping every state of C{table} to the state which replaces it in the
+        minimized table (which is the state itself if it remains).
+    """
+    order = {}
+    if states is not None:
+        for (position, state) in enumerate(_symbols(states)):
+            order[state] = position
+
+    def priority(state):
+        return (state != initial, order.get(state, len(order)))
+
+    known = set(_symbols(states)) if states is not None else set()
+    known.update(table.table, table.defaults, table.timeouts)
+    inputs = set()
+    for row in table.table.values():
+        inputs.update(row)
+        known.update(transition.nextState for transition in row.values())
+    known.update(default.nextState for default in table.defaults.values())
+    if table.globalDefault is not None:
+        known.add(table.globalDefault.nextState)
+
+    # Defaults take part in the comparison as the transition on one more
+    # input, which stands for every input not handled explicitly anywhere.
+    rows = {}
+    for state in known:
+        rows[state] = row = table._row(state, inputs)
+        default = table._default(state)
+        if default is not None:
+            row = rows[state] = dict(row)
+            row[_DEFAULT] = default
+        # Likewise a timeout, so only states with the same timeout merge.
+        if state in table.timeouts:
+            row = rows[state] = dict(row)
+            row[_DEFAULT, table.timeouts[state]] = Transition([], state)
+
+    mapping = {}
+    for block in _partition(rows):
+        representative = min(block, key=priority)
+        for state in block:
+            mapping[state] = representative
+
+    def merged(transition):
+        nextState = mapping[transition.nextState]
+        if nextState != transition.nextState:
+            transition = Transition(transition.output, nextState)
+        return transition
+
+    minimized = {}
+    for (state, row) in table.table.items():
+        if mapping[state] != state:
+            continue
+        minimized[state] = dict(
+            (input, merged(transition)) for (input, transition) in row.items())
+    defaults = dict(
+        (state, merged(default))
+        for (state, default) in table.defaults.items()
+        if mapping[state] == state)
+    globalDefault = table.globalDefault
+    if globalDefault is not None:
+        globalDefault = merged(globalDefault)
+    timeouts = dict(
+        (state, timeout) for (state, timeout) in table.timeouts.items()
+        if mapping[state] == state)
+    return TransitionTable(
+        minimized, defaults, globalDefault, timeouts), mapping
@@ -0,0 +1,217 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_offload -*-
+
+"""
+Execution of CPU-heavy outputs in other processes.
+
+Transitions are cheap, but some outputs (parsing, cryptography) are not, and
+executing them inline keeps every state machine in the process on one core.
+An L{OffloadingOutputer} executes chosen outputs in a L{ProcessShards}
+instead and gives the results back to the state machine as rich inputs::
+
+    shards = ProcessShards(4)
+    outputer = OffloadingOutputer(
+        MethodSuffixOutputer(world), shards,
+        {Output.parse: (parseFrame, payloadInput(Input.parsed, "frame"))})
+    fsm = constructFiniteStateMachine(..., outputer, logger)
+    outputer.fsm = fsm
+
+The function for an offloaded output is called with the context of the
+output in a worker process, so both it and the context must be picklable.
+An adapter from the C{inputContext} of the machine can turn a rich input
+into something picklable.
+
+Each state machine is assigned to one worker by the CRC-32 checksum of the
+identifier of its executor and each worker executes outputs one at a time,
+so the results for any one machine arrive in the order its outputs were
+executed.
+
+An offloaded output which fails - because its function raises an exception
+or because its function or context cannot be pickled - is logged and the
+state machine receives nothing for it.
+"""
+
+from pickle import dumps, HIGHEST_PROTOCOL
+from sys import version_info
+from traceback import format_exc, format_exception_only
+from zlib import crc32
+
+from zope.interface import implementer
+
+from ._interface import IOutputExecutor
+
+
+# Pool.apply_async only reports errors in submitting a task, such as one
+# which cannot be pickled, to an error_callback, which Python 2 lacks.
+_ERROR_CALLBACK = version_info >= (3,)
+
+
+
+def _call(function, context):
+    """
+    Call the function of an offloaded output in a worker process.
+
+    @return: A L{tuple} of C{True} and the result of the function or, if it
+        raised an exception, of C{False} and the formatted traceback.
+    """
+    try:
+        return True, function(context)
+    except Exception:
+        return False, format_exc()
+
+
+
+class ProcessShards(object):
+    """
+    A L{ProcessShards} runs offloaded outputs in a fixed number of worker
+    processes, always running those for the same state machine in the same
+    worker.
+
+    @ivar _pools: A L{list} of single-process L{multiprocessing.Pool}s, one
+        for each worker.
+    @ivar _reactor: See L{__init__}.
+    """
+    def __init__(self, workers, reactor=None):
+        """
+        @param workers: The number of worker processes to start.
+
+        @param reactor: The L{IReactorThreads} provider to deliver results
+            with, or C{None} to use the global reactor.  Results are
+            delivered by calls to its C{callFromThread} method.
+        """
+        from multiprocessing import Pool
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+        self._pools = [Pool(1) for worker in range(workers)]
+
+
+    def shard(self, identifier):
+        """
+        @param identifier: The identifier of an L{IOutputExecutor}.
+        @type identifier: L{unicode}
+
+        @return: The index of the worker which runs the offloaded outputs of
+            the executor with the given identifier.
+        @rtype: L{int}
+        """
+        return (crc32(identifier.encode("utf-8")) & 0xffffffff) % len(
+            self._pools)
+
+
+    def _submit(self, shard, function, context, deliver):
+        """
+        Call a function with a context in a worker and, in the reactor
+        thread, call C{deliver} with its result.
+        """
+        def done(outcome):
+            succeeded, result = outcome
+            if succeeded:
+                self._reactor.callFromThread(deliver, result)
+            else:
+                self._reactor.callFromThread(_failed, function, result)
+
+        def error(exception):
+            self._reactor.callFromThread(
+                _failed, function,
+                "".join(format_exception_only(type(exception), exception)))
+
+        pool = self._pools[shard]
+        if _ERROR_CALLBACK:
+            pool.apply_async(
+                _call, (function, context), callback=done,
+                error_callback=error)
+            return
+        try:
+            # Otherwise the pool would drop the task without a word.
+            dumps((function, context), HIGHEST_PROTOCOL)
+        except Exception:
+            self._reactor.callFromThread(_failed, function, format_exc())
+        else:
+            pool.apply_async(_call, (function, context), callback=done)
+
+
+    def close(self):
+        """
+        Wait for the outputs already offloaded to be executed and stop the
+        worker processes.  Their results are still delivered, once the
+        reactor gets to them.
+        """
+        for pool in self._pools:
+            pool.close()
+        for pool in self._pools:
+            pool.join()
+
+
+
+def _failed(function, traceback):
+    """
+    Log the failure of an offloaded output.
+    """
+    from twisted.python import log
+    log.err(
+        RuntimeError(traceback),
+        "Unhandled error in offloaded output %r" % (function,))
+
+
+
+@implementer(IOutputExecutor)
+class OffloadingOutputer(object):
+    """
+    An L{IOutputExecutor} which executes some outputs in a L{ProcessShards}
+    and the rest with the executor it wraps.
+
+    @ivar fsm: The state machine to give the results of offloaded outputs
+        to.  This must be set once the machine has been constructed.
+
+    @ivar _executor: See L{__init__}.
+    @ivar _shards: See L{__init__}.
+    @ivar _offloaded: See L{__init__}.
+    @ivar _shard: The index of the worker for this executor's outputs.
+    """
+    fsm = None
+
+    def __init__(self, executor, shards, offloaded):
+        """
+        @param executor: The L{IOutputExecutor} to execute the outputs which
+            are not offloaded.
+
+        @param shards: The L{ProcessShards} to execute offloaded outputs in.
+
+        @param offloaded: A L{dict} mapping output symbols to C{(function,
+            richInput)} tuples.  Instead of executing the output, C{function}
+            is called with its context in a worker process and the machine
+            receives C{richInput(result)}.  C{richInput} must be one of the
+            rich input types the machine was constructed with.
+        """
+        self._executor = executor
+        self._shards = shards
+        self._offloaded = offloaded
+        self._shard = shards.shard(executor.identifier())
+
+
+    def __repr__(self):
+        return "<OffloadingOutputer / %r>" % (self._executor,)
+
+
+    def identifier(self):
+        """
+        Delegate to the wrapped executor.
+        """
+        return self._executor.identifier()
+
+
+    def output(self, output, context):
+        """
+        Offload C{output} if it is one of the offloaded outputs and otherwise
+        execute it with the wrapped executor.
+
+        @see: L{IOutputExecutor.output}
+        """
+        try:
+            function, richInput = self._offloaded[output]
+        except KeyError:
+            return self._executor.output(output, context)
+        self._shards._submit(
+            self._shard, function, context,
+            lambda result: self.fsm.receive(richInput(result)))
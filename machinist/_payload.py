@@ -0,0 +1,143 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_payload -*-
+
+"""
+Rich inputs which carry data, such as the frames read from a network
+connection.
+
+A type created by L{payloadInput} declares its fields with C{__slots__}, so
+creating one instance per frame does not allocate a L{dict}, and it keeps
+whatever it is given (for example, a L{memoryview} of a receive buffer)
+without copying it::
+
+    Frame = payloadInput(Input.frame, "channel", "payload")
+
+    fsm.receive(Frame(channel, memoryview(buffer)[start:end]))
+
+Buffers are rendered as their length and first few bytes, so rendering an
+input - for example, for the C{fsm_rich_input} field of a logged transition -
+costs the same however large its payload is.
+"""
+
+import keyword
+from binascii import hexlify
+
+from zope.interface import implementer
+
+from ._interface import IRichInput
+from ._definition import _symbolName
+from ._fsm import _IDENTIFIER, _symbol
+
+
+# The number of bytes of a buffer included when it is rendered.
+_RENDERED_BYTES = 16
+
+_BUFFERS = (bytes, bytearray, memoryview)
+
+# The types created by payloadInput, by the type and value of their symbol
+# (see _trivialInputs) and their field names.
+_payloadInputs = {}
+
+
+
+def _render(value):
+    """
+    Render the value of a field of a payload input.
+
+    @return: The L{repr} of C{value} or, for buffers longer than
+        C{_RENDERED_BYTES}, their length and first C{_RENDERED_BYTES} bytes.
+    @rtype: L{str}
+    """
+    if isinstance(value, _BUFFERS):
+        view = memoryview(value)
+        if len(view) > _RENDERED_BYTES:
+            return "<%d bytes %s...>" % (
+                len(view),
+                str(hexlify(view[:_RENDERED_BYTES].tobytes()).decode("ascii")))
+        value = view.tobytes()
+    return repr(value)
+
+
+
+class _PayloadInput(object):
+    """
+    The base of the types created by L{payloadInput}.
+
+    @ivar _fields: The names of the fields of the type, in order.  Unlike
+        C{__slots__}, this is inherited by subclasses.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __repr__(self):
+        parts = ["<", self.__class__.__name__]
+        for name in self._fields:
+            parts.append(" %s=%s" % (name, _render(getattr(self, name))))
+        parts.append(">")
+        return "".join(parts)
+
+    __str__ = __repr__
+
+
+
+def _initializer(fields):
+    """
+    Create an C{__init__} method which sets the given fields from its
+    arguments, in order.
+
+    @param fields: The names of the fields.
+    @type fields: L{tuple} of L{str}
+
+    @return: A function.
+    """
+    lines = ["def __init__(self%s):" % (
+        "".join(", %s" % (name,) for name in fields),)]
+    lines.extend("    self.%s = %s" % (name, name) for name in fields)
+    lines.append("    pass")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["__init__"]
+
+
+
+def payloadInput(symbol, *fields):
+    """
+    Get an L{IRichInput} implementation for the given input symbol whose
+    instances carry the given fields.
+
+    The type is created the first time it is asked for and the same type is
+    returned for the same symbol and fields after that.  Its instances have
+    no C{__dict__}, are initialized with the value of each field in order and
+    keep those values as they are given.
+
+    @param symbol: A symbol from some state machine's input alphabet.
+
+    @param fields: The names of the fields, as L{str}.
+
+    @raise ValueError: If the field names are not distinct identifiers, or
+        one of them is C{"symbol"}.
+
+    @return: A type object usable as a rich input for the given symbol.
+    @rtype: L{type}
+    """
+    key = (type(symbol), symbol, fields)
+    try:
+        return _payloadInputs[key]
+    except KeyError:
+        pass
+    for name in fields:
+        if (_IDENTIFIER.match(name) is None or keyword.iskeyword(name)
+                or name == "symbol"):
+            raise ValueError("Invalid field name: %r" % (name,))
+    if len(set(fields)) != len(fields):
+        raise ValueError("Duplicate field names: %r" % (fields,))
+
+    richInput = implementer(IRichInput)(type(
+            str(_symbolName(symbol).title()), (_PayloadInput,), {
+                "__slots__": fields,
+                "_fields": fields,
+                "__init__": _initializer(fields),
+                "symbol": _symbol(symbol),
+                }))
+    _payloadInputs[key] = richInput
+    return richInput
@@ -0,0 +1,105 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_product -*-
+
+"""
+Combination of several state machine definitions into one.
+"""
+
+from ._fsm import Transition, TransitionTable, _checkConsistency
+from ._definition import CompiledDefinition, _symbols
+
+
+
+def productDefinition(definitions):
+    """
+    Combine definitions which share an input alphabet into one definition
+    which behaves like all of them running in lockstep.
+
+    Each state of the combined definition is a L{tuple} of one state from
+    each definition.  Only the combinations which can be reached from the
+    combination of the initial states are included.  An input is handled in a
+    combined state only if it is handled in every one of the states in the
+    combination; the outputs are those of each definition's transition, in
+    the order in which the definitions are given.  Inputs which are handled
+    by one of a definition's defaults are handled like any others.
+
+    A state machine constructed from the result receives each input with a
+    single lookup, where separate state machines would need one call to
+    C{receive} each.
+
+    @param definitions: The L{CompiledDefinition}s to combine.
+    @type definitions: L{list}
+
+    @raise ValueError: If the definitions do not all have the same input
+        alphabet, if they require different input contexts for the same
+        output or if any of them has timeouts (see
+        L{TransitionTable.addTimeout}).
+
+    @raise DoesNotImplement: If any of the rich input types of the
+        definitions fails to implement the interfaces required by the outputs
+        it can produce in the combined definition.
+
+    @rtype: L{CompiledDefinition}
+    """
+    if not definitions:
+        raise ValueError("At least one definition is required.")
+    for definition in definitions:
+        if definition.table.timeouts:
+            raise ValueError(
+                "Definitions with timeouts cannot be combined: %r" % (
+                    definition,))
+    inputs = _symbols(definitions[0].inputs)
+    for definition in definitions[1:]:
+        if set(_symbols(definition.inputs)) != set(inputs):
+            raise ValueError(
+                "Definitions have different input alphabets: %r, %r" % (
+                    definitions[0], definition))
+
+    outputs = []
+    richInputs = []
+    inputContext = {}
+    for definition in definitions:
+        for output in _symbols(definition.outputs):
+            if output not in outputs:
+                outputs.append(output)
+        for richInput in definition.richInputs:
+            if richInput not in richInputs:
+                richInputs.append(richInput)
+        for (output, interface) in definition.inputContext.items():
+            if inputContext.setdefault(output, interface) is not interface:
+                raise ValueError(
+                    "Definitions have different input contexts for %r" % (
+                        output,))
+
+    tables = [definition.table for definition in definitions]
+    initial = tuple(definition.initial for definition in definitions)
+    # Visit the reachable combinations breadth first.
+    states = [initial]
+    seen = set(states)
+    table = {}
+    for state in states:
+        row = table[state] = {}
+        components = list(zip(tables, state))
+        for input in inputs:
+            transitions = [
+                componentTable._transition(component, input)
+                for (componentTable, component) in components]
+            if any(transition is None for transition in transitions):
+                continue
+            nextState = tuple(
+                transition.nextState for transition in transitions)
+            row[input] = Transition(
+                [output for transition in transitions
+                 for output in transition.output],
+                nextState)
+            if nextState not in seen:
+                seen.add(nextState)
+                states.append(nextState)
+
+    table = TransitionTable(table)
+    # A rich input of one definition may now produce the outputs of another,
+    # whose input context it was never checked against.
+    _checkConsistency(richInputs, table, states, inputContext)
+    return CompiledDefinition(
+        inputs, tuple(outputs), tuple(states), table, initial,
+        tuple(richInputs), inputContext)
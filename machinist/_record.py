@@ -0,0 +1,155 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_record -*-
+
+"""
+Access to several L{stateful} attributes with a single check of the state.
+
+Each L{stateful} attribute looks up the state of its owner every time it is
+used.  Code which uses several of them together can instead decorate the
+owning class with L{statefulRecord} and use a L{statefulView} of an
+instance, which looks up the state once::
+
+    @statefulRecord("_fsm.state", State)
+    class Session(object):
+        buffer = stateful("_fsm.state", State.open)
+        peer = stateful("_fsm.state", State.open, State.closing)
+
+    with statefulView(session) as view:
+        send(view.peer, view.buffer)
+"""
+
+from ._fsm import (
+    InvalidStatefulState, WrongState, _attributePath, _statefulAttributes,
+)
+from ._definition import _symbols, _TEXT
+
+
+
+class _Record(object):
+    """
+    The L{stateful} attributes of a class decorated with L{statefulRecord}.
+
+    @ivar getter: A one-argument callable returning the state of an instance.
+
+    @ivar attributes: A L{dict} mapping the names of all of the L{stateful}
+        attributes to the descriptors.
+
+    @ivar allowed: A L{dict} mapping each state to a L{dict} like
+        C{attributes} of the attributes allowed in that state.
+    """
+    def __init__(self, getter, attributes, allowed):
+        self.getter = getter
+        self.attributes = attributes
+        self.allowed = allowed
+
+
+
+def statefulRecord(getter, states):
+    """
+    Create a class decorator which lets L{statefulView} be used with
+    instances of the class.
+
+    @param getter: A one-argument callable which accepts an instance of the
+        class and returns its state, or a dotted attribute path (see
+        L{stateful}).
+
+    @param states: All of the states of the state machine, in any of the forms
+        accepted by L{constructFiniteStateMachine}.
+
+    @raise InvalidStatefulState: When the class is decorated, if any of its
+        L{stateful} attributes is allowed in a state which is not one of
+        C{states}.
+
+    @return: A class decorator.
+    """
+    if isinstance(getter, _TEXT):
+        getter = _attributePath(getter)
+    states = _symbols(states)
+
+    def decorate(cls):
+        attributes = _statefulAttributes(cls)
+        known = frozenset(states)
+        allowed = dict((state, {}) for state in states)
+        for (name, descriptor) in attributes.items():
+            extra = descriptor._allowedStates - known
+            if extra:
+                raise InvalidStatefulState(name, extra)
+            for state in descriptor._allowed:
+                allowed[state][name] = descriptor
+
+        cls._statefulRecord = _Record(getter, attributes, allowed)
+        return cls
+    return decorate
+
+
+
+class _StatefulView(object):
+    """
+    The L{stateful} attributes of an object which are allowed in the state the
+    object was in when the view was created.
+
+    @ivar _obj: The object.
+    @ivar _record: The L{_Record} of its class.
+    @ivar _allowed: The L{dict} of the attributes allowed in its state (see
+        L{_Record.allowed}).
+    """
+    __slots__ = ("_obj", "_record", "_allowed")
+
+    def __init__(self, obj, record, allowed):
+        self._obj = obj
+        self._record = record
+        self._allowed = allowed
+
+
+    def __getattr__(self, name):
+        try:
+            descriptor = self._allowed[name]
+        except KeyError:
+            try:
+                descriptor = self._record.attributes[name]
+            except KeyError:
+                raise AttributeError(name)
+            raise WrongState(descriptor, self._obj)
+        return descriptor._value(self._obj)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, type, value, traceback):
+        # The state may change once the block is over, so stop allowing
+        # access.
+        self._allowed = {}
+
+
+    def __repr__(self):
+        return "<statefulView of %r>" % (self._obj,)
+
+
+
+def statefulView(obj):
+    """
+    Check the state of an object once and allow the L{stateful} attributes
+    which are allowed in that state to be read without checking it again.
+
+    The view can also be used as a context manager, after which it allows no
+    attributes to be read.
+
+    @param obj: An instance of a class decorated with L{statefulRecord}.
+
+    @raise TypeError: If the class of C{obj} is not decorated with
+        L{statefulRecord}.
+
+    @return: An object with an attribute for each L{stateful} attribute of
+        C{obj}.  Reading one which is allowed in the state C{obj} was in when
+        the view was created returns its value.  Reading one which is not
+        raises L{WrongState}.
+    """
+    try:
+        record = type(obj)._statefulRecord
+    except AttributeError:
+        raise TypeError(
+            "%r is not an instance of a statefulRecord class" % (obj,))
+    return _StatefulView(
+        obj, record, record.allowed.get(record.getter(obj), {}))
@@ -0,0 +1,224 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_timer -*-
+
+"""
+A hierarchical timer wheel for scheduling large numbers of timeouts.
+
+A L{TimerWheel} can be shared by any number of state machines (see
+L{scheduleTimeouts}).  However many timers it has, it only ever has one
+call scheduled with its clock, and scheduling or cancelling a timer takes
+constant time.  Timers fire on the first tick of the wheel after they are
+due, so they are only as precise as the wheel's resolution.
+"""
+
+from math import ceil
+
+
+# Rounding errors in the division of times by the resolution should not make
+# a tick or a deadline one tick later than it is.
+_EPSILON = 1e-9
+
+
+
+class _Timer(object):
+    """
+    A timer scheduled with a L{TimerWheel}.
+
+    @ivar deadline: The tick of the wheel at which the timer is due.
+    @ivar _slot: The L{set} of timers the timer is in, or C{None} if it has
+        fired or been cancelled.
+    """
+    __slots__ = ("deadline", "_function", "_args", "_slot", "_wheel")
+
+    def __init__(self, wheel, deadline, function, args):
+        self._wheel = wheel
+        self.deadline = deadline
+        self._function = function
+        self._args = args
+        self._slot = None
+
+
+    def active(self):
+        """
+        Determine whether the timer has yet to fire or be cancelled.
+
+        @rtype: L{bool}
+        """
+        return self._slot is not None
+
+
+    def cancel(self):
+        """
+        Stop the timer from firing.  Cancelling a timer which has already
+        fired or been cancelled does nothing.
+        """
+        if self._slot is not None:
+            self._slot.discard(self)
+            self._slot = None
+            self._wheel._count -= 1
+
+
+
+class TimerWheel(object):
+    """
+    A L{TimerWheel} runs functions once a certain amount of time has passed.
+
+    Time is divided into ticks of C{resolution} seconds.  Timers due within
+    C{size} ticks are kept in the slot for the tick they are due in.  Timers
+    due later are kept in coarser wheels, whose slots each cover C{size}
+    times as many ticks as the slots of the wheel below, and are moved down
+    a wheel whenever the wheel below has gone all of the way round.
+
+    @ivar _clock: See L{__init__}.
+    @ivar _resolution: See L{__init__}.
+    @ivar _size: See L{__init__}.
+
+    @ivar _wheels: A L{list} with a L{list} of C{size} L{set}s of L{_Timer}s
+        for each level of the wheel, finest first.
+    @ivar _origin: The time of tick zero.
+    @ivar _tick: The last tick whose timers have been fired.
+    @ivar _count: The number of timers which are active.
+    @ivar _call: The call scheduled with C{_clock} to process the next tick,
+        or C{None} if there are no timers.
+    """
+    def __init__(self, clock=None, resolution=0.1, size=64, levels=4):
+        """
+        @param clock: The L{IReactorTime} provider to run the wheel with, or
+            C{None} to use the global reactor.
+
+        @param resolution: The length of a tick, in seconds.
+
+        @param size: The number of slots in each level of the wheel.
+
+        @param levels: The number of levels.  Timers due more than
+            C{size ** levels} ticks away are kept in the coarsest level until
+            they are closer.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+        self._resolution = resolution
+        self._size = size
+        self._wheels = [
+            [set() for slot in range(size)] for level in range(levels)]
+        self._origin = clock.seconds()
+        self._tick = 0
+        self._count = 0
+        self._call = None
+
+
+    def callLater(self, seconds, function, *args):
+        """
+        Call a function once a number of seconds has passed.
+
+        @param seconds: The number of seconds to wait.
+        @param function: The function to call.
+        @param args: The positional arguments to call C{function} with.
+
+        @return: A timer with C{cancel} and C{active} methods.
+        """
+        if not self._count:
+            # Nothing has been waiting for the clock to advance the wheel.
+            self._tick = self._now()
+        elapsed = self._clock.seconds() - self._origin + seconds
+        deadline = max(
+            int(ceil(elapsed / self._resolution - _EPSILON)), self._tick + 1)
+        timer = _Timer(self, deadline, function, args)
+        self._insert(timer)
+        self._count += 1
+        if self._call is None:
+            self._schedule()
+        return timer
+
+
+    def _schedule(self):
+        """
+        Schedule a call with the clock to process the next tick when it
+        starts.
+        """
+        start = self._origin + (self._now() + 1) * self._resolution
+        self._call = self._clock.callLater(
+            max(start - self._clock.seconds(), 0), self._advance)
+
+
+    def _now(self):
+        """
+        @return: The tick the clock's current time is in.
+        """
+        return int(
+            (self._clock.seconds() - self._origin) / self._resolution
+            + _EPSILON)
+
+
+    def _insert(self, timer):
+        """
+        Put a timer in the slot for its deadline.
+        """
+        deadline = timer.deadline
+        delta = deadline - self._tick
+        span = 1
+        for wheel in self._wheels:
+            if delta < span * self._size:
+                break
+            span *= self._size
+        else:
+            # Timers beyond the coarsest level go in its furthest slot and
+            # are put back when that slot is reached.
+            span //= self._size
+            deadline = self._tick + span * (self._size - 1)
+        slot = wheel[(deadline // span) % self._size]
+        slot.add(timer)
+        timer._slot = slot
+
+
+    def _advance(self):
+        """
+        Fire the timers which are due by the current time of the clock and
+        schedule the next call if there are any left.
+        """
+        self._call = None
+        now = self._now()
+        while self._tick < now and self._count:
+            self._tick += 1
+            self._cascade()
+            slot = self._wheels[0][self._tick % self._size]
+            due = [timer for timer in slot if timer.deadline <= self._tick]
+            for timer in due:
+                # An earlier timer's function may have cancelled this one.
+                if timer._slot is slot:
+                    timer.cancel()
+                    self._fire(timer)
+        if self._count:
+            if self._call is None:
+                self._schedule()
+        else:
+            self._tick = now
+
+
+    def _fire(self, timer):
+        """
+        Call the function of a timer, logging any exception it raises rather
+        than letting it stop the other timers from firing.
+        """
+        try:
+            timer._function(*timer._args)
+        except Exception:
+            from twisted.python import log
+            log.err(None, "Unhandled error in timer function")
+
+
+    def _cascade(self):
+        """
+        Move the timers of the coarser slots which the current tick has
+        reached down to finer levels.
+        """
+        span = 1
+        for wheel in self._wheels[1:]:
+            span *= self._size
+            if self._tick % span:
+                break
+            slot = wheel[(self._tick // span) % self._size]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._insert(timer)
@@ -0,0 +1,66 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_fsm -*-
+
+"""
+Small helpers which machinist would otherwise import from Twisted.  Defining
+them here keeps Twisted out of the modules needed to run a state machine.
+"""
+
+__all__ = [
+    "FancyStrMixin", "FancyEqMixin",
+]
+
+
+class FancyStrMixin(object):
+    """
+    Mixin providing a flexible implementation of C{__str__}, compatible with
+    L{twisted.python.util.FancyStrMixin}.
+
+    C{__str__} output will begin with the name of the class, or the contents
+    of the attribute C{fancybasename} if it is set.  It continues with the
+    attributes named by C{showAttributes}.  Each element of C{showAttributes}
+    is an attribute name, an C{(attributeName, callable)} pair or an
+    C{(attributeName, displayName, formatString)} triple.
+    """
+    showAttributes = ()
+
+    def __str__(self):
+        r = ['<', (hasattr(self, 'fancybasename') and self.fancybasename)
+             or self.__class__.__name__]
+        for attr in self.showAttributes:
+            if isinstance(attr, str):
+                r.append(' %s=%r' % (attr, getattr(self, attr)))
+            elif len(attr) == 2:
+                r.append((' %s=' % (attr[0],)) + attr[1](getattr(self, attr[0])))
+            else:
+                r.append((' %s=' + attr[2]) % (attr[1], getattr(self, attr[0])))
+        r.append('>')
+        return ''.join(r)
+
+    __repr__ = __str__
+
+
+
+class FancyEqMixin(object):
+    """
+    Mixin implementing C{__eq__} and C{__ne__} by comparing the attributes
+    named by C{compareAttributes}, compatible with
+    L{twisted.python.util.FancyEqMixin}.
+    """
+    compareAttributes = ()
+
+    def __eq__(self, other):
+        if not self.compareAttributes:
+            return self is other
+        if isinstance(self, other.__class__):
+            return (
+                [getattr(self, name) for name in self.compareAttributes] ==
+                [getattr(other, name) for name in self.compareAttributes])
+        return NotImplemented
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
@@ -0,0 +1,37 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_benchmark -*-
+
+"""
+Benchmarks for the performance-sensitive parts of machinist.
+
+Run the suite with::
+
+    python -m machinist.benchmark
+
+Pass C{--save baseline.json} to record the results and C{--compare
+baseline.json} on a later run to report (and fail on) regressions against
+them.  C{--help} lists the other options.
+
+L{generateWorkload} creates state machine definitions and input streams of any
+size for use in benchmarks::
+
+    workload = generateWorkload(states=1000, inputs=50, density=0.2)
+    fsm = workload.construct()
+    for input in workload.inputStream(10000, u"zipf"):
+        fsm.receive(input)
+"""
+
+__all__ = [
+    "Benchmark", "benchmark", "allBenchmarks",
+
+    "measure", "runBenchmarks", "compareResults", "saveResults",
+    "loadResults", "main",
+
+    "DiscardOutputs", "Workload", "generateWorkload",
+]
+
+from ._suite import Benchmark, benchmark, allBenchmarks
+from ._runner import (
+    measure, runBenchmarks, compareResults, saveResults, loadResults, main,
+)
+from ._workload import DiscardOutputs, Workload, generateWorkload
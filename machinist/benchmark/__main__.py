@@ -0,0 +1,9 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Run the machinist benchmark suite.
+"""
+
+from machinist.benchmark import main
+
+raise SystemExit(main())
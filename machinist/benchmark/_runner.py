@@ -0,0 +1,242 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_benchmark -*-
+
+"""
+Timing, reporting and comparison of benchmark results.
+"""
+
+import sys
+
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+from json import dump, load
+from platform import python_implementation, python_version
+from timeit import default_timer
+
+from ._suite import allBenchmarks
+
+
+def measure(function, minimum=0.2, repeat=5, timer=default_timer):
+    """
+    Determine how long a call to a function takes.
+
+    The function is called in a loop long enough to take at least C{minimum}
+    seconds.  The loop is timed C{repeat} times and the fastest time is used,
+    since slower times are caused by interference from other processes rather
+    than by the function itself.
+
+    @param function: A no-argument callable.
+
+    @param minimum: The minimum number of seconds for one timed loop.
+    @param repeat: The number of timed loops.
+
+    @param timer: A no-argument callable returning the current time in
+        seconds.
+
+    @return: The time taken by one call, in seconds.
+    @rtype: L{float}
+    """
+    loops = 1
+    while True:
+        elapsed = _loop(function, loops, timer)
+        if elapsed >= minimum:
+            break
+        loops *= 10 if elapsed < minimum / 10 else 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, _loop(function, loops, timer))
+    return best / loops
+
+
+
+def _loop(function, loops, timer):
+    iterations = range(loops)
+    start = timer()
+    for _ in iterations:
+        function()
+    return timer() - start
+
+
+
+def runBenchmarks(benchmarks, minimum=0.2, repeat=5, report=None):
+    """
+    Time some benchmarks.
+
+    @param benchmarks: The L{Benchmark}s to run.
+
+    @param minimum: See L{measure}
+    @param repeat: See L{measure}
+
+    @param report: If not C{None}, a one-argument callable which is called
+        with a line of text describing each result as it becomes available.
+
+    @return: A L{dict} mapping the names of the benchmarks which could be run
+        to the time taken by one operation, in seconds.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        prepared = benchmark.setup()
+        if prepared is None:
+            if report is not None:
+                report("%-48s skipped" % (benchmark.name,))
+            continue
+        if isinstance(prepared, tuple):
+            function, cleanup = prepared
+        else:
+            function, cleanup = prepared, None
+        try:
+            results[benchmark.name] = measure(function, minimum, repeat)
+        finally:
+            if cleanup is not None:
+                cleanup()
+        if report is not None:
+            report("%-48s %s" % (
+                benchmark.name, _formatTime(results[benchmark.name])))
+    return results
+
+
+
+def _formatTime(seconds):
+    for (unit, scale) in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1:
+            return "%10.3f %s" % (seconds * scale, unit)
+    return "%10.3f ns" % (seconds * 1e9,)
+
+
+
+class Comparison(object):
+    """
+    The comparison of the result of one benchmark against a baseline.
+
+    @ivar name: The name of the benchmark.
+    @ivar baseline: The baseline time for one operation, in seconds.
+    @ivar current: The current time for one operation, in seconds.
+
+    @ivar ratio: C{current / baseline}.
+    @ivar regressed: C{True} if the current time is slower than the baseline
+        by more than the allowed threshold.
+    """
+    def __init__(self, name, baseline, current, threshold):
+        self.name = name
+        self.baseline = baseline
+        self.current = current
+        self.ratio = current / baseline if baseline else float("inf")
+        self.regressed = self.ratio > 1 + threshold
+
+
+    def __repr__(self):
+        return "<Comparison %s %.3fx%s>" % (
+            self.name, self.ratio, " regressed" if self.regressed else "")
+
+
+
+def compareResults(baseline, results, threshold=0.1):
+    """
+    Compare benchmark results against a baseline.
+
+    @param baseline: A L{dict} like the one returned by L{runBenchmarks}.
+    @param results: A L{dict} like the one returned by L{runBenchmarks}.
+
+    @param threshold: The fraction by which a benchmark may be slower than its
+        baseline before it is considered to have regressed.
+
+    @return: A L{list} of L{Comparison}s for the benchmarks present in both
+        C{baseline} and C{results}, ordered by name.
+    """
+    return [
+        Comparison(name, baseline[name], results[name], threshold)
+        for name in sorted(set(baseline) & set(results))]
+
+
+
+def saveResults(results, path):
+    """
+    Write benchmark results to a file.
+
+    @param results: A L{dict} like the one returned by L{runBenchmarks}.
+    @param path: The name of the file to write.
+    """
+    with open(path, "w") as f:
+        dump({
+            u"python": u"%s %s" % (python_implementation(), python_version()),
+            u"results": results,
+        }, f, indent=4, sort_keys=True)
+
+
+
+def loadResults(path):
+    """
+    Read benchmark results written by L{saveResults}.
+
+    @param path: The name of the file to read.
+
+    @return: A L{dict} like the one returned by L{runBenchmarks}.
+    """
+    with open(path) as f:
+        return load(f)[u"results"]
+
+
+
+def main(argv=None, stdout=None):
+    """
+    Run the benchmark suite from the command line.
+
+    @param argv: The command line arguments, not including the program name.
+        By default, C{sys.argv[1:]}.
+
+    @param stdout: The file to which to write results.  By default,
+        C{sys.stdout}.
+
+    @return: The exit status: C{1} if any benchmark regressed compared to the
+        baseline given with C{--compare}, C{0} otherwise.
+    """
+    if stdout is None:
+        stdout = sys.stdout
+
+    parser = ArgumentParser(
+        prog="python -m machinist.benchmark",
+        description="Run the machinist benchmark suite.")
+    parser.add_argument(
+        "--filter", default="*",
+        help="Only run benchmarks with names matching this glob pattern.")
+    parser.add_argument(
+        "--minimum", type=float, default=0.2,
+        help="The minimum number of seconds for each timed loop.")
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="The number of timed loops for each benchmark.")
+    parser.add_argument(
+        "--save", metavar="PATH", help="Write the results to this file.")
+    parser.add_argument(
+        "--compare", metavar="PATH",
+        help="Compare the results with the baseline in this file.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help=("The fraction by which a benchmark may be slower than its "
+              "baseline before it is considered to have regressed."))
+    options = parser.parse_args(argv)
+
+    def report(line):
+        stdout.write(line + "\n")
+        stdout.flush()
+
+    benchmarks = [
+        benchmark for benchmark in allBenchmarks()
+        if fnmatch(benchmark.name, options.filter)]
+    results = runBenchmarks(
+        benchmarks, options.minimum, options.repeat, report)
+
+    if options.save is not None:
+        saveResults(results, options.save)
+
+    status = 0
+    if options.compare is not None:
+        report("")
+        for comparison in compareResults(
+                loadResults(options.compare), results, options.threshold):
+            report("%-48s %6.2fx%s" % (
+                comparison.name, comparison.ratio,
+                "  REGRESSED" if comparison.regressed else ""))
+            if comparison.regressed:
+                status = 1
+    return status
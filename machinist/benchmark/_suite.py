@@ -0,0 +1,416 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_benchmark -*-
+
+"""
+The machinist benchmarks.
+"""
+
+from itertools import product
+from operator import attrgetter
+from sys import modules
+
+from zope.interface import Interface, implementer
+
+from machinist import (
+    Transition, TransitionTable, MethodSuffixOutputer, trivialInput,
+    singletonInput, constructFiniteStateMachine, compileDefinition,
+    constructFromDefinition, UnhandledInput, interpretedFiniteStateMachine,
+    generatedFiniteStateMachine, dispatchingFiniteStateMachine, minimizeTable,
+    stateful,
+)
+from machinist._fsm import _FiniteStateMachine
+
+from ._workload import DiscardOutputs, generateWorkload
+
+
+_ENGINES = {
+    "interpreted": interpretedFiniteStateMachine,
+    "generated": generatedFiniteStateMachine,
+    "dispatching": dispatchingFiniteStateMachine,
+}
+
+
+_benchmarks = []
+
+
+class Benchmark(object):
+    """
+    A L{Benchmark} is one timed operation.
+
+    @ivar name: A L{str} naming the benchmark and giving the values of its
+        parameters.
+
+    @ivar setup: A no-argument callable which prepares the operation.  It
+        returns either a no-argument callable which performs the operation
+        once or a pair of that callable and another no-argument callable to
+        call after the operation has been timed.  It returns C{None} if the
+        benchmark cannot be run (for example, because an optional dependency
+        is not installed).
+    """
+    def __init__(self, name, setup):
+        self.name = name
+        self.setup = setup
+
+
+    def __repr__(self):
+        return "<Benchmark %s>" % (self.name,)
+
+
+
+def benchmark(name, **parameters):
+    """
+    Register a benchmark, or a family of benchmarks, with the suite.
+
+    For example, this registers three benchmarks, each calling the decorated
+    function with a different value for C{size}::
+
+        @benchmark("thing", size=[1, 10, 100])
+        def thing(size):
+            ...
+
+    @param name: The name of the benchmark.
+
+    @param parameters: Lists of values for the arguments of the decorated
+        function.  A benchmark is registered for every combination of values.
+
+    @return: A decorator for a function which prepares the operation to time,
+        as described by L{Benchmark.setup}.
+    """
+    def register(setup):
+        keys = sorted(parameters)
+        for values in product(*[parameters[key] for key in keys]):
+            arguments = dict(zip(keys, values))
+            label = name
+            if keys:
+                label += "[%s]" % (",".join(
+                    "%s=%s" % (key, arguments[key]) for key in keys),)
+            _benchmarks.append(Benchmark(label, _bind(setup, arguments)))
+        return setup
+    return register
+
+
+
+def _bind(setup, arguments):
+    return lambda: setup(**arguments)
+
+
+
+def allBenchmarks():
+    """
+    @return: A L{list} of all registered L{Benchmark}s.
+    """
+    return list(_benchmarks)
+
+
+
+class _World(object):
+    """
+    An output executor target which does nothing with its outputs.
+    """
+    def identifier(self):
+        return u"<benchmark>"
+
+
+    def output_AARDVARK(self, context):
+        pass
+
+
+
+def _selfLoops(alphabet, output=()):
+    """
+    Create a one-state transition table handling every input.
+
+    @param alphabet: The number of inputs.
+
+    @return: The inputs and the L{TransitionTable}.
+    """
+    inputs = list(range(alphabet))
+    transition = Transition(list(output), u"amber")
+    return inputs, TransitionTable({
+        u"amber": dict((input, transition) for input in inputs)})
+
+
+
+@benchmark("fsm.receive", alphabet=[2, 16, 128, 1024])
+def fsmReceive(alphabet):
+    inputs, table = _selfLoops(alphabet)
+    fsm = _FiniteStateMachine(inputs, [], [u"amber"], table.table, u"amber")
+    receive = fsm.receive
+    input = inputs[-1]
+    return lambda: receive(input)
+
+
+
+_Apple = trivialInput(u"apple")
+
+def _appleMachine(logger=None):
+    return constructFiniteStateMachine(
+        [u"apple"], [u"aardvark"], [u"amber"],
+        TransitionTable().addTransition(
+            u"amber", u"apple", [u"aardvark"], u"amber"),
+        u"amber", [_Apple], {}, MethodSuffixOutputer(_World()), logger)
+
+
+
+@benchmark("interpreter.receive", input=["symbolic", "rich", "singleton"])
+def interpreterReceive(input):
+    receive = _appleMachine().receive
+    if input == "rich":
+        input = _Apple()
+    elif input == "singleton":
+        input = singletonInput(u"apple")
+    else:
+        input = u"apple"
+    return lambda: receive(input)
+
+
+
+class _IFruit(Interface):
+    """
+    The context required by the outputs of L{interpreterContext}.
+    """
+
+
+
+@implementer(_IFruit)
+class _Fruit(_Apple):
+    pass
+
+
+
+@benchmark("interpreter.context", outputs=[1, 4])
+def interpreterContext(outputs):
+    receive = constructFiniteStateMachine(
+        [u"apple"], [u"aardvark"], [u"amber"],
+        TransitionTable().addTransition(
+            u"amber", u"apple", [u"aardvark"] * outputs, u"amber"),
+        u"amber", [_Fruit], {u"aardvark": _IFruit},
+        MethodSuffixOutputer(_World()), None).receive
+    input = _Fruit()
+    return lambda: receive(input)
+
+
+
+@benchmark("logger.receive", destinations=[0, 1])
+def loggerReceive(destinations):
+    try:
+        from eliot import Logger, addDestination, removeDestination
+    except ImportError:
+        return None
+
+    receive = _appleMachine(Logger()).receive
+    input = _Apple()
+    if not destinations:
+        return lambda: receive(input)
+
+    def destination(message):
+        pass
+    addDestination(destination)
+    return (lambda: receive(input)), (lambda: removeDestination(destination))
+
+
+
+@benchmark("outputer.output")
+def outputerOutput():
+    output = MethodSuffixOutputer(_World()).output
+    return lambda: output(u"aardvark", None)
+
+
+
+def _grid(edges, inputCount=8):
+    """
+    Describe a table with C{edges} transitions, each state handling
+    C{inputCount} inputs and moving to the next state.
+    """
+    states = list(range(max(1, edges // inputCount)))
+    inputs = [u"input-%d" % (n,) for n in range(inputCount)]
+    rows = []
+    for state in states:
+        nextState = states[(state + 1) % len(states)]
+        rows.append(
+            (state, dict((input, ([u"aardvark"], nextState))
+                         for input in inputs)))
+    return inputs, states, rows
+
+
+
+@benchmark("table.addTransitions", edges=[64, 512, 4096])
+def tableAddTransitions(edges):
+    inputs, states, rows = _grid(edges)
+
+    def build():
+        table = TransitionTable()
+        for (state, transitions) in rows:
+            table = table.addTransitions(state, transitions)
+        return table
+    return build
+
+
+
+def _gridTable(edges):
+    inputs, states, rows = _grid(edges)
+    table = TransitionTable()
+    for (state, transitions) in rows:
+        table = table.addTransitions(state, transitions)
+    return inputs, states, table
+
+
+
+@benchmark("construct.validate", edges=[64, 512, 4096])
+def constructValidate(edges):
+    inputs, states, table = _gridTable(edges)
+    world = MethodSuffixOutputer(_World())
+    return lambda: constructFiniteStateMachine(
+        inputs, [u"aardvark"], states, table, states[0], [], {}, world, None)
+
+
+
+@benchmark("construct.fromDefinition", edges=[64, 512, 4096])
+def constructFromCompiled(edges):
+    inputs, states, table = _gridTable(edges)
+    definition = compileDefinition(
+        inputs, [u"aardvark"], states, table, states[0], [], {})
+    world = MethodSuffixOutputer(_World())
+    return lambda: constructFromDefinition(definition, world, None)
+
+
+
+@benchmark(
+    "workload.stream", distribution=["uniform", "zipf", "adversarial"])
+def workloadStream(distribution):
+    # One operation delivers all 100 inputs of the stream, then puts the
+    # machine back in its initial state so the stream can be delivered again.
+    try:
+        workload = generateWorkload(
+            states=256, inputs=32, outputs=16, density=0.25, richRatio=0.25)
+    except ImportError:
+        return None
+    machine = workload.construct()
+    stream = workload.inputStream(100, distribution)
+    core = machine._fsm
+    initial = workload.initial
+    receive = machine.receive
+
+    def deliver():
+        for input in stream:
+            try:
+                receive(input)
+            except UnhandledInput:
+                pass
+        core.state = initial
+    return deliver
+
+
+
+@benchmark(
+    "workload.tryStream", distribution=["uniform", "zipf", "adversarial"])
+def workloadTryStream(distribution):
+    # Like workload.stream, but with tryReceive, which does not raise for the
+    # inputs which are not handled.
+    try:
+        workload = generateWorkload(
+            states=256, inputs=32, outputs=16, density=0.25, richRatio=0.25)
+    except ImportError:
+        return None
+    machine = workload.construct()
+    stream = workload.inputStream(100, distribution)
+    core = machine._fsm
+    initial = workload.initial
+    tryReceive = machine.tryReceive
+
+    def deliver():
+        for input in stream:
+            tryReceive(input)
+        core.state = initial
+    return deliver
+
+
+
+@benchmark("table.minimize", states=[64, 1024])
+def tableMinimize(states):
+    try:
+        workload = generateWorkload(
+            states=states, inputs=8, outputs=4, density=0.5)
+    except ImportError:
+        return None
+    return lambda: minimizeTable(
+        workload.table, workload.states, workload.initial)
+
+
+
+@benchmark("engine.receive", engine=sorted(_ENGINES), states=[16, 1024])
+def engineReceive(engine, states):
+    # Every input is handled in every state, so the stream can be delivered
+    # over and over again.  One operation delivers all 100 inputs.
+    try:
+        workload = generateWorkload(
+            states=states, inputs=16, outputs=8, density=1.0, fanOut=2,
+            richRatio=0.25)
+    except ImportError:
+        return None
+    receive = constructFromDefinition(
+        workload.compile(), DiscardOutputs(), None, _ENGINES[engine]).receive
+    stream = workload.inputStream(100)
+
+    def deliver():
+        for input in stream:
+            receive(input)
+    return deliver
+
+
+
+class _Guarded(object):
+    """
+    An object with L{stateful} attributes stored each way they can be.
+    """
+    __slots__ = ("__dict__", "_fsm", "_slotted", "_slottedByPath")
+
+    def __init__(self):
+        self._fsm = _FiniteStateMachine(
+            [u"apple"], [], [u"amber"], {u"amber": {}}, u"amber")
+
+
+    inDict = stateful(lambda guarded: guarded._fsm.state, u"amber")
+    inSlot = stateful(
+        lambda guarded: guarded._fsm.state, u"amber", slot="_slotted")
+    inDictByPath = stateful("_fsm.state", u"amber")
+    inSlotByPath = stateful("_fsm.state", u"amber", slot="_slottedByPath")
+
+
+
+@benchmark(
+    "stateful.get", storage=["dict", "slot"], getter=["callable", "path"])
+def statefulGet(storage, getter):
+    guarded = _Guarded()
+    name = {"dict": "inDict", "slot": "inSlot"}[storage]
+    if getter == "path":
+        name += "ByPath"
+    setattr(guarded, name, object())
+    get = attrgetter(name)
+    return lambda: get(guarded)
+
+
+
+@benchmark("import")
+def importMachinist():
+    """
+    Import L{machinist} afresh, leaving alone the modules it depends on,
+    which are already imported.
+    """
+    original = dict(
+        (name, module) for (name, module) in modules.items()
+        if name == "machinist" or name.startswith("machinist."))
+
+    def forget():
+        for name in list(modules):
+            if name == "machinist" or name.startswith("machinist."):
+                del modules[name]
+
+    def reimport():
+        forget()
+        __import__("machinist")
+
+    def restore():
+        forget()
+        modules.update(original)
+    return reimport, restore
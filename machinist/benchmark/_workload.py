@@ -0,0 +1,329 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+# -*- test-case-name: machinist.test.test_workload -*-
+
+"""
+Synthetic state machine definitions and input streams for scale testing.
+"""
+
+from bisect import bisect
+from random import Random
+
+from zope.interface import implementer
+
+from machinist import (
+    IOutputExecutor, Transition, TransitionTable, trivialInput,
+    compileDefinition, constructFiniteStateMachine,
+)
+from machinist._definition import _symbols
+
+
+_STRUCTURES = (u"random", u"ring")
+_DISTRIBUTIONS = (u"uniform", u"zipf", u"adversarial")
+
+
+
+@implementer(IOutputExecutor)
+class DiscardOutputs(object):
+    """
+    An L{IOutputExecutor} which ignores every output, so that only the cost of
+    the state machine itself is measured.
+    """
+    def identifier(self):
+        return u"<discard>"
+
+
+    def output(self, output, context):
+        pass
+
+
+
+def _symbolCollection(symbols, prefix, count):
+    """
+    Create C{count} symbols named C{prefix} followed by a number.
+
+    @param symbols: C{u"names"} to create a L{Names} subclass or C{u"strings"}
+        to create a L{tuple} of L{unicode} strings.
+    """
+    names = [u"%s%d" % (prefix, n) for n in range(count)]
+    if symbols == u"strings":
+        return tuple(names)
+    if symbols != u"names":
+        raise ValueError("Unknown kind of symbols: %r" % (symbols,))
+    from twisted.python.constants import Names, NamedConstant
+    return type(str(prefix.title()), (Names,), dict(
+        (str(name), NamedConstant()) for name in names))
+
+
+
+class Workload(object):
+    """
+    A generated state machine definition.
+
+    @ivar inputs: See L{constructFiniteStateMachine}
+    @ivar outputs: See L{constructFiniteStateMachine}
+    @ivar states: See L{constructFiniteStateMachine}
+    @ivar table: See L{constructFiniteStateMachine}
+    @ivar initial: See L{constructFiniteStateMachine}
+    @ivar richInputs: See L{constructFiniteStateMachine}
+    @ivar inputContext: See L{constructFiniteStateMachine}
+
+    @ivar _handled: A L{list} giving, for the position of each state, a
+        L{list} of the positions of the inputs handled in that state.
+
+    @ivar _next: A L{dict} mapping pairs of state and input positions to the
+        position of the next state.
+
+    @ivar _rich: A L{dict} mapping input positions to rich input types.
+    """
+    def __init__(self, inputs, outputs, states, table, initial, richInputs,
+                 inputContext, handled, next, rich):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.states = states
+        self.table = table
+        self.initial = initial
+        self.richInputs = richInputs
+        self.inputContext = inputContext
+        self._handled = handled
+        self._next = next
+        self._rich = rich
+
+
+    def compile(self):
+        """
+        @return: The L{CompiledDefinition} of this workload.
+        """
+        return compileDefinition(
+            self.inputs, self.outputs, self.states, self.table, self.initial,
+            self.richInputs, self.inputContext)
+
+
+    def construct(self, world=None, logger=None):
+        """
+        Construct a state machine from this workload.
+
+        @param world: The L{IOutputExecutor} for the machine, or C{None} to
+            use L{DiscardOutputs}.
+
+        @param logger: See L{constructFiniteStateMachine}.  Unlike there,
+            nothing is logged by default.
+
+        @rtype: L{IFiniteStateMachine}
+        """
+        if world is None:
+            world = DiscardOutputs()
+        return constructFiniteStateMachine(
+            self.inputs, self.outputs, self.states, self.table, self.initial,
+            self.richInputs, self.inputContext, world, logger)
+
+
+    def inputStream(self, length, distribution=u"uniform", seed=0):
+        """
+        Generate inputs for a machine constructed from this workload, starting
+        in its initial state.
+
+        Inputs which have a rich input type are given as instances of that
+        type; all others are given as symbols.
+
+        @param length: The number of inputs to generate.
+
+        @param distribution: How to choose each input.  C{u"uniform"} picks
+            any input handled in the current state with equal probability.
+            C{u"zipf"} prefers inputs earlier in the input alphabet, the
+            M{n}th input being M{n} times less likely than the first.
+            C{u"adversarial"} alternates between inputs which are I{not}
+            handled in the current state (and so raise L{UnhandledInput}
+            without changing state) and uniformly chosen handled inputs.
+
+        @param seed: The seed for the choices made.
+
+        @raise ValueError: If C{distribution} is C{u"adversarial"} but every
+            input is handled in every state.
+
+        @return: A L{list} of inputs.
+        """
+        if distribution not in _DISTRIBUTIONS:
+            raise ValueError("Unknown distribution: %r" % (distribution,))
+        random = Random(seed)
+        inputs = _symbols(self.inputs)
+        states = _symbols(self.states)
+
+        if distribution == u"zipf":
+            choose = self._zipf(random)
+        else:
+            choose = lambda state: random.choice(self._handled[state])
+
+        if distribution == u"adversarial":
+            unhandled = []
+            for handled in self._handled:
+                unhandled.append(sorted(set(range(len(inputs))) - set(handled)))
+            if not any(unhandled):
+                raise ValueError("Every input is handled in every state.")
+
+        state = states.index(self.initial)
+        positions = []
+        while len(positions) < length:
+            if distribution == u"adversarial" and unhandled[state]:
+                positions.append(random.choice(unhandled[state]))
+                if len(positions) == length:
+                    break
+            input = choose(state)
+            positions.append(input)
+            state = self._next[state, input]
+
+        stream = []
+        for position in positions:
+            rich = self._rich.get(position)
+            if rich is None:
+                stream.append(inputs[position])
+            else:
+                stream.append(rich())
+        return stream
+
+
+    def _zipf(self, random):
+        """
+        Create a function which chooses an input handled in a given state,
+        weighting each input by the inverse of its (one-based) position in the
+        input alphabet.
+        """
+        cumulative = []
+        for handled in self._handled:
+            total = 0.0
+            weights = []
+            for input in handled:
+                total += 1.0 / (input + 1)
+                weights.append(total)
+            cumulative.append(weights)
+
+        def choose(state):
+            weights = cumulative[state]
+            return self._handled[state][
+                bisect(weights, random.random() * weights[-1])]
+        return choose
+
+
+
+def generateWorkload(states=16, inputs=8, outputs=4, density=0.5, fanOut=1,
+                     richRatio=0.0, structure=u"random", symbols=u"names",
+                     seed=0):
+    """
+    Generate a state machine definition of a given size and shape.
+
+    Every state is reachable from the initial state and handles at least one
+    input, so the machine never stops.  Every input and output symbol is used
+    by at least one transition.
+
+    @param states: The number of states.
+    @param inputs: The number of input symbols.
+    @param outputs: The number of output symbols.
+
+    @param density: The fraction of all (state, input) pairs for which a
+        transition is defined, between C{0} and C{1}.  At least one
+        transition is defined for each state and each input regardless.
+
+    @param fanOut: The number of outputs each transition produces.
+
+    @param richRatio: The fraction of the input symbols which have a rich
+        input type (created with L{trivialInput}).
+
+    @param structure: C{u"random"} to choose the defined transitions, their
+        next states and their outputs randomly.  C{u"ring"} to choose them by
+        position, so the result depends only on the sizes involved: inputs
+        are handled by every state in alphabet order and each moves the
+        machine a fixed number of states further around a ring.
+
+    @param symbols: C{u"names"} to define the symbols as
+        L{twisted.python.constants.Names} subclasses or C{u"strings"} to
+        define them as L{tuple}s of L{unicode} strings.
+
+    @param seed: The seed for the random choices made.
+
+    @raise ValueError: If the parameters describe a machine which cannot be
+        defined (for example, with fewer output symbols emitted than
+        defined).
+
+    @rtype: L{Workload}
+    """
+    if structure not in _STRUCTURES:
+        raise ValueError("Unknown structure: %r" % (structure,))
+    if states < 1 or inputs < 1 or outputs < 0 or fanOut < 0:
+        raise ValueError("Sizes must be positive.")
+    if not 0 <= density <= 1 or not 0 <= richRatio <= 1:
+        raise ValueError("Ratios must be between 0 and 1.")
+
+    random = Random(seed)
+    ring = structure == u"ring"
+    if not outputs:
+        fanOut = 0
+
+    # A ring through every state guarantees reachability and that each state
+    # handles some input.
+    next = {}
+    for state in range(states):
+        next[state, state % inputs] = (state + 1) % states
+
+    # Make sure every input is handled somewhere.
+    for input in range(states, inputs):
+        state = input % states if ring else random.randrange(states)
+        next[state, input] = (state + input + 1) % states
+
+    wanted = int(round(density * states * inputs))
+    candidates = [
+        (state, input)
+        for input in range(inputs) for state in range(states)
+        if (state, input) not in next]
+    if not ring:
+        random.shuffle(candidates)
+    for (state, input) in candidates[:max(0, wanted - len(next))]:
+        if ring:
+            next[state, input] = (state + input + 1) % states
+        else:
+            next[state, input] = random.randrange(states)
+
+    if len(next) * fanOut < outputs:
+        raise ValueError(
+            "%d transitions with %d outputs each cannot emit %d outputs." % (
+                len(next), fanOut, outputs))
+
+    # The first outputs chosen cover the whole output alphabet.
+    order = list(range(outputs))
+    if not ring:
+        random.shuffle(order)
+    chosen = []
+    for n in range(len(next) * fanOut):
+        if n < outputs or ring:
+            chosen.append(order[n % outputs])
+        else:
+            chosen.append(random.randrange(outputs))
+
+    inputCollection = _symbolCollection(symbols, u"input", inputs)
+    outputCollection = _symbolCollection(symbols, u"output", outputs)
+    stateCollection = _symbolCollection(symbols, u"state", states)
+    inputSymbols = _symbols(inputCollection)
+    outputSymbols = _symbols(outputCollection)
+    stateSymbols = _symbols(stateCollection)
+
+    rows = dict((state, {}) for state in stateSymbols)
+    handled = [[] for state in stateSymbols]
+    for (n, (state, input)) in enumerate(sorted(next)):
+        rows[stateSymbols[state]][inputSymbols[input]] = Transition(
+            [outputSymbols[index]
+             for index in chosen[n * fanOut:(n + 1) * fanOut]],
+            stateSymbols[next[state, input]])
+        handled[state].append(input)
+
+    richCount = int(round(richRatio * inputs))
+    if ring:
+        richPositions = list(range(richCount))
+    else:
+        richPositions = sorted(random.sample(range(inputs), richCount))
+    rich = dict(
+        (position, trivialInput(inputSymbols[position]))
+        for position in richPositions)
+
+    return Workload(
+        inputCollection, outputCollection, stateCollection,
+        TransitionTable(rows), stateSymbols[0],
+        [rich[position] for position in richPositions], {},
+        handled, next, rich)
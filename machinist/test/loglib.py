@@ -9,7 +9,7 @@ whether Eliot is installed or not.
 """
 
 __all__ = [
-    "MessageType", "Logger", "LoggedAction", "LoggedMessage",
+    "MessageType", "Logger", "MemoryLogger", "LoggedAction", "LoggedMessage",
 
     "issuperset", "assertContainsFields", "validateLogging",
 
@@ -32,6 +32,7 @@ except ImportError as e:
             pass
 
     Logger = lambda *args, **kwargs: None
+    MemoryLogger = None
 
     LoggedAction = LoggedMessage = issuperset = assertContainsFields = None
 
@@ -44,7 +45,7 @@ except ImportError as e:
 
     logSkipReason = str(e)
 else:
-    from eliot import MessageType, Logger
+    from eliot import MessageType, Logger, MemoryLogger
     from eliot.testing import (
         issuperset, assertContainsFields, LoggedAction, LoggedMessage,
         validateLogging,
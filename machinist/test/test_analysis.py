@@ -0,0 +1,198 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._analysis}.
+"""
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    MethodSuffixOutputer, TransitionTable, TableAnalysis,
+    analyzeTable, pruneTable, compileDefinition, constructFromDefinition,
+)
+
+from .test_fsm import Output, AnimalWorld
+
+
+
+class Fruit(Names):
+    apple = NamedConstant()
+    banana = NamedConstant()
+    cherry = NamedConstant()
+
+
+
+class Step(Names):
+    start = NamedConstant()
+    middle = NamedConstant()
+    end = NamedConstant()
+    loop = NamedConstant()
+    orphan = NamedConstant()
+
+
+
+# end is terminal, loop can never get to end and orphan can never be entered
+# from start.  cherry is only handled by orphan.
+STEPS = TransitionTable().addTransitions(
+    Step.start, {
+        Fruit.apple: ([Output.aardvark], Step.middle),
+        Fruit.banana: ([], Step.loop)},
+).addTransition(
+    Step.middle, Fruit.apple, [], Step.end,
+).addTerminalState(
+    Step.end,
+).addTransition(
+    Step.loop, Fruit.apple, [Output.aardvark], Step.loop,
+).addTransitions(
+    Step.orphan, {
+        Fruit.cherry: ([Output.aardvark], Step.orphan),
+        Fruit.banana: ([], Step.start)},
+)
+
+
+
+class AnalyzeTableTests(TestCase):
+    """
+    Tests for L{analyzeTable}.
+    """
+    def setUp(self):
+        self.analysis = analyzeTable(STEPS, Step.start, Fruit)
+
+
+    def test_type(self):
+        """
+        L{analyzeTable} returns a L{TableAnalysis}.
+        """
+        self.assertIsInstance(self.analysis, TableAnalysis)
+
+
+    def test_reachable(self):
+        """
+        L{TableAnalysis.reachable} contains the states which can be entered
+        from the initial state and L{TableAnalysis.unreachable} the rest.
+        """
+        self.assertEqual(
+            (set([Step.start, Step.middle, Step.end, Step.loop]),
+             set([Step.orphan])),
+            (self.analysis.reachable, self.analysis.unreachable))
+
+
+    def test_terminal(self):
+        """
+        L{TableAnalysis.terminal} contains the reachable terminal states.
+        """
+        self.assertEqual(set([Step.end]), self.analysis.terminal)
+
+
+    def test_dead(self):
+        """
+        L{TableAnalysis.dead} contains the reachable states from which no
+        terminal state can be reached.
+        """
+        self.assertEqual(set([Step.loop]), self.analysis.dead)
+
+
+    def test_noTerminalStates(self):
+        """
+        If there are no terminal states, every reachable state is dead.
+        """
+        table = STEPS.addTransition(
+            Step.end, Fruit.apple, [Output.aardvark], Step.start)
+        self.assertEqual(
+            set([Step.start, Step.middle, Step.end, Step.loop]),
+            analyzeTable(table, Step.start).dead)
+
+
+    def test_unusedInputs(self):
+        """
+        L{TableAnalysis.unusedInputs} contains the inputs which are not
+        handled by any reachable state.
+        """
+        self.assertEqual(set([Fruit.cherry]), self.analysis.unusedInputs)
+
+
+    def test_defaults(self):
+        """
+        Defaults are taken into account like any other transitions.
+        """
+        # loop's default makes end (and so a terminal state) reachable from it
+        # and handles cherry.
+        analysis = analyzeTable(
+            STEPS.addDefaultTransition(Step.loop, [], Step.end),
+            Step.start, Fruit)
+        self.assertEqual(
+            (set(), set()), (analysis.dead, analysis.unusedInputs))
+
+
+    def test_alphabet(self):
+        """
+        If no input alphabet is given, the inputs handled anywhere in the table
+        are considered.
+        """
+        # Without orphan, cherry is not handled anywhere.
+        table = pruneTable(STEPS, Step.start)
+        self.assertEqual(
+            (set([Fruit.cherry]), set()),
+            (analyzeTable(table, Step.start, Fruit).unusedInputs,
+             analyzeTable(table, Step.start).unusedInputs))
+
+
+
+class PruneTableTests(TestCase):
+    """
+    Tests for L{pruneTable} and L{compileDefinition} with C{prune=True}.
+    """
+    def test_pruned(self):
+        """
+        L{pruneTable} returns a table without the unreachable states.
+        """
+        expected = dict(STEPS.table)
+        del expected[Step.orphan]
+        self.assertEqual(expected, pruneTable(STEPS, Step.start).table)
+
+
+    def test_timeouts(self):
+        """
+        L{pruneTable} keeps the timeouts of the reachable states only.
+        """
+        table = STEPS.addTimeout(Step.middle, 1, Fruit.apple).addTimeout(
+            Step.orphan, 1, Fruit.banana)
+        self.assertEqual(
+            {Step.middle: (1, Fruit.apple)},
+            pruneTable(table, Step.start).timeouts)
+
+
+    def test_unchanged(self):
+        """
+        L{pruneTable} does not change the table it is given.
+        """
+        pruneTable(STEPS, Step.start)
+        self.assertIn(Step.orphan, STEPS.table)
+
+
+    def test_compile(self):
+        """
+        L{compileDefinition} leaves out unreachable states if C{prune} is
+        C{True}, but state machines constructed from the definition still
+        accept all of the inputs of the original definition.
+        """
+        definition = compileDefinition(
+            Fruit, Output, Step, STEPS, Step.start, [], {}, prune=True)
+        self.assertEqual(
+            (Step.start, Step.middle, Step.end, Step.loop), definition.states)
+
+        fsm = constructFromDefinition(
+            definition, MethodSuffixOutputer(AnimalWorld([])), None)
+        fsm.receive(Fruit.apple)
+        self.assertEqual(Step.middle, fsm.state)
+
+
+    def test_pruneAndMinimize(self):
+        """
+        L{compileDefinition} can both prune and minimize a definition.
+        """
+        definition = compileDefinition(
+            Fruit, Output, Step, STEPS, Step.start, [], {},
+            minimize=True, prune=True)
+        self.assertNotIn(Step.orphan, definition.stateMapping)
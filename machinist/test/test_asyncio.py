@@ -0,0 +1,376 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._asyncio}.
+"""
+
+from zope.interface.verify import verifyObject
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    IOutputExecutor, TransitionTable, MethodSuffixOutputer, trivialInput,
+    constructFiniteStateMachine, AsyncioDriver, AwaitingOutputer,
+)
+
+from .loglib import MemoryLogger, logSkipReason
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+# A machine which counts apples and stops at the first banana.  Symbols are
+# plain strings, which keeps these tests independent of
+# twisted.python.constants.
+TABLE = TransitionTable().addTransitions(
+    "counting", {
+        "apple": (["count", "report"], "counting"),
+        "banana": (["report"], "stopped"),
+    },
+).addTerminalState("stopped")
+
+
+
+class Step(object):
+    """
+    An awaitable which, like a coroutine, does nothing until it is awaited.
+    """
+    def __init__(self, world, output):
+        self.world = world
+        self.output = output
+
+
+    def __await__(self):
+        world = self.world
+        world.events.append((world.name, self.output))
+        future = world.loop.create_future()
+        future.add_done_callback(
+            lambda future: world.events.append(
+                (world.name, self.output + " done")))
+        if world.pause:
+            world.futures.append(future)
+        else:
+            world.loop.call_soon(future.set_result, None)
+        return future.__await__()
+
+
+
+class World(object):
+    """
+    Record outputs, returning a L{Step} for each one.
+
+    @ivar events: A L{list} of C{(name, output)} tuples recording when each
+        output was awaited and when it was done.
+    @ivar pause: If C{True}, outputs are left for the test to resolve.
+    @ivar futures: The futures of the outputs left for the test to resolve.
+    """
+    def __init__(self, loop, name="world", pause=False):
+        self.loop = loop
+        self.name = name
+        self.pause = pause
+        self.events = []
+        self.futures = []
+
+
+    def identifier(self):
+        return u"World(%s)" % (self.name,)
+
+
+    def output_COUNT(self, context):
+        return Step(self, "count")
+
+
+    def output_REPORT(self, context):
+        return Step(self, "report")
+
+
+
+class AsyncIterable(object):
+    """
+    An asynchronous iterable over some inputs.
+    """
+    def __init__(self, loop, inputs):
+        self.loop = loop
+        self.inputs = iter(inputs)
+
+
+    def __aiter__(self):
+        return self
+
+
+    def __anext__(self):
+        future = self.loop.create_future()
+        try:
+            future.set_result(next(self.inputs))
+        except StopIteration:
+            future.set_exception(StopAsyncIteration())
+        return future
+
+
+
+class AsyncioDriverTests(TestCase):
+    """
+    Tests for L{AsyncioDriver} and L{AwaitingOutputer}.
+    """
+    if asyncio is None:
+        skip = "asyncio is not available"
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.driver = AsyncioDriver(self.loop)
+        self.addCleanup(self.cancel)
+
+
+    def cancel(self):
+        """
+        Cancel whatever the driver is still doing and let it finish.
+        """
+        self.driver.cancel()
+        self.wait(asyncio.sleep(0))
+
+
+    def machine(self, world, logger=None):
+        """
+        Construct a state machine executing its outputs with C{world} through
+        an L{AwaitingOutputer}.
+
+        @param logger: The logger to give the machine.
+
+        @return: A L{tuple} of the machine and the L{AwaitingOutputer}.
+        """
+        outputer = AwaitingOutputer(MethodSuffixOutputer(world))
+        fsm = constructFiniteStateMachine(
+            ["apple", "banana"], ["count", "report"], ["counting", "stopped"],
+            TABLE, "counting",
+            [trivialInput("apple"), trivialInput("banana")], {},
+            outputer, logger)
+        return fsm, outputer
+
+
+    def wait(self, future):
+        return self.loop.run_until_complete(future)
+
+
+    def test_interface(self):
+        """
+        L{AwaitingOutputer} provides L{IOutputExecutor} and has the identifier
+        of the executor it wraps.
+        """
+        executor = MethodSuffixOutputer(World(self.loop))
+        outputer = AwaitingOutputer(executor)
+        self.assertEqual(
+            (True, executor.identifier()),
+            (verifyObject(IOutputExecutor, outputer), outputer.identifier()))
+
+
+    def test_iterator(self):
+        """
+        L{AsyncioDriver.drive} gives the inputs of an asynchronous iterable to
+        the machine and awaits each output before executing the next.  The
+        future it returns is resolved once the iterable is exhausted.
+        """
+        world = World(self.loop)
+        fsm, outputer = self.machine(world)
+        self.wait(self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["apple", "banana"]), outputer))
+        self.assertEqual(
+            ([("world", "count"), ("world", "count done"),
+              ("world", "report"), ("world", "report done"),
+              ("world", "report"), ("world", "report done")],
+             "stopped"),
+            (world.events, fsm.state))
+
+
+    def test_logged(self):
+        """
+        A state machine which logs its transitions can be driven.
+        """
+        logger = MemoryLogger()
+        fsm, outputer = self.machine(World(self.loop), logger)
+        self.wait(self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["apple", "banana"]), outputer))
+        logger.validate()
+        self.assertEqual(
+            [u"fsm:transition"] * 2,
+            [message[u"action_type"] for message in logger.messages
+             if message.get(u"action_status") == u"succeeded"
+             and message[u"action_type"] == u"fsm:transition"])
+
+    if logSkipReason is not None:
+        test_logged.skip = logSkipReason
+
+
+    def test_queue(self):
+        """
+        L{AsyncioDriver.drive} takes inputs from an L{asyncio.Queue} as they
+        are put on it.
+        """
+        world = World(self.loop)
+        fsm, outputer = self.machine(world)
+        queue = asyncio.Queue()
+        self.driver.drive(fsm, queue, outputer)
+        self.loop.call_later(0.01, queue.put_nowait, "apple")
+        self.wait(asyncio.sleep(0.05))
+        self.assertEqual(
+            [("world", "count"), ("world", "count done"),
+             ("world", "report"), ("world", "report done")],
+            world.events)
+
+
+    def test_fair(self):
+        """
+        Machines driven on the same loop take turns, one input each, even
+        when all of their inputs are ready.
+        """
+        events = []
+        done = []
+        for name in ("a", "b"):
+            world = World(self.loop, name)
+            world.events = events
+            fsm, outputer = self.machine(world)
+            done.append(self.driver.drive(
+                fsm, AsyncIterable(self.loop, ["apple", "banana"]),
+                outputer))
+        self.wait(asyncio.gather(*done))
+        self.assertEqual(
+            [("a", "count"), ("b", "count"), ("a", "report"), ("b", "report"),
+             ("a", "report"), ("b", "report")],
+            [event for event in events if not event[1].endswith("done")])
+
+
+    def test_interleaved(self):
+        """
+        While one machine is waiting for an output, the others carry on.
+        """
+        slow = World(self.loop, "slow", pause=True)
+        fast = World(self.loop, "fast")
+        slowFSM, slowOutputer = self.machine(slow)
+        fastFSM, fastOutputer = self.machine(fast)
+        slowDone = self.driver.drive(
+            slowFSM, AsyncIterable(self.loop, ["banana"]), slowOutputer)
+        self.wait(self.driver.drive(
+            fastFSM, AsyncIterable(self.loop, ["apple", "banana"]),
+            fastOutputer))
+        self.assertEqual(
+            ([("slow", "report")], False, "stopped"),
+            (slow.events, slowDone.done(), fastFSM.state))
+        slow.futures[0].set_result(None)
+        self.wait(slowDone)
+
+
+    def test_noOutputer(self):
+        """
+        A machine whose outputs have nothing to be awaited can be driven
+        without an L{AwaitingOutputer}.
+        """
+        world = World(self.loop)
+        fsm = constructFiniteStateMachine(
+            ["apple", "banana"], ["count", "report"], ["counting", "stopped"],
+            TABLE, "counting",
+            [trivialInput("apple"), trivialInput("banana")], {},
+            MethodSuffixOutputer(world), None)
+        self.wait(self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["apple", "banana"])))
+        self.assertEqual("stopped", fsm.state)
+
+
+    def test_illegalInput(self):
+        """
+        The future returned by L{AsyncioDriver.drive} fails with the exception
+        raised by the machine for an input it cannot receive.
+        """
+        fsm, outputer = self.machine(World(self.loop))
+        done = self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["banana", "apple"]), outputer)
+        self.assertRaises(Exception, self.wait, done)
+        self.assertEqual("stopped", fsm.state)
+
+
+    def test_failedOutput(self):
+        """
+        The future returned by L{AsyncioDriver.drive} fails with the exception
+        of a failed output, and the outputs after it are not awaited.
+        """
+        world = World(self.loop, pause=True)
+        fsm, outputer = self.machine(world)
+        done = self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["apple"]), outputer)
+        self.wait(asyncio.sleep(0))
+        world.futures[0].set_exception(ZeroDivisionError())
+        self.assertRaises(ZeroDivisionError, self.wait, done)
+        self.assertEqual(1, len(world.futures))
+
+
+    def test_stop(self):
+        """
+        L{AsyncioDriver.stop} stops the machines once the outputs they are
+        waiting for are done, and leaves inputs which have not been taken on
+        their queues.
+        """
+        world = World(self.loop, pause=True)
+        fsm, outputer = self.machine(world)
+        busy = asyncio.Queue()
+        busy.put_nowait("apple")
+        busy.put_nowait("apple")
+        idle = asyncio.Queue()
+        busyDone = self.driver.drive(fsm, busy, outputer)
+        idleDone = self.driver.drive(
+            self.machine(World(self.loop))[0], idle)
+        self.wait(asyncio.sleep(0))
+
+        stopped = self.driver.stop()
+        self.wait(asyncio.sleep(0))
+        self.assertEqual(
+            (False, True), (busyDone.done(), idleDone.done()))
+        world.futures[0].set_result(None)
+        self.wait(asyncio.sleep(0))
+        world.futures[1].set_result(None)
+        self.wait(stopped)
+        self.assertEqual(
+            (None, None, 1, 2),
+            (busyDone.result(), idleDone.result(), busy.qsize(),
+             len(world.futures)))
+
+
+    def test_stopNothing(self):
+        """
+        L{AsyncioDriver.stop} returns a resolved future if no machines are
+        being driven.
+        """
+        self.assertIs(None, self.wait(self.driver.stop()))
+
+
+    def test_cancel(self):
+        """
+        L{AsyncioDriver.cancel} cancels the outputs being awaited and the
+        futures returned by L{AsyncioDriver.drive}.
+        """
+        world = World(self.loop, pause=True)
+        fsm, outputer = self.machine(world)
+        done = self.driver.drive(
+            fsm, AsyncIterable(self.loop, ["apple"]), outputer)
+        self.wait(asyncio.sleep(0))
+        self.driver.cancel()
+        self.assertEqual(
+            (True, True), (done.cancelled(), world.futures[0].cancelled()))
+
+
+    def test_cancelOne(self):
+        """
+        Cancelling the future returned by L{AsyncioDriver.drive} stops that
+        machine alone.
+        """
+        queue = asyncio.Queue()
+        fsm, outputer = self.machine(World(self.loop))
+        other, otherOutputer = self.machine(World(self.loop))
+        done = self.driver.drive(fsm, queue, outputer)
+        self.driver.drive(other, queue, otherOutputer)
+        self.wait(asyncio.sleep(0))
+        done.cancel()
+        queue.put_nowait("banana")
+        self.wait(asyncio.sleep(0.01))
+        self.assertEqual(
+            ("counting", "stopped"), (fsm.state, other.state))
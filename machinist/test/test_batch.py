@@ -0,0 +1,148 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._batch}.
+"""
+
+from zope.interface.verify import verifyObject
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    IOutputExecutor, TransitionTable, trivialInput,
+    constructFiniteStateMachine, OutputBatch, BatchingOutputer,
+)
+
+
+# Apples are written and then acknowledged, bananas only acknowledged.
+TABLE = TransitionTable().addTransitions(
+    "open", {
+        "apple": (["write", "ack"], "open"),
+        "banana": (["ack"], "open"),
+    },
+)
+
+
+
+class OutputBatchTests(TestCase):
+    """
+    Tests for L{OutputBatch} and L{BatchingOutputer}.
+    """
+    def setUp(self):
+        self.clock = Clock()
+        self.calls = []
+        self.batch = OutputBatch(
+            lambda output, entries: self.calls.append((output, entries)),
+            self.clock)
+
+
+    def machine(self, identifier):
+        return constructFiniteStateMachine(
+            ["apple", "banana"], ["write", "ack"], ["open"], TABLE, "open",
+            [trivialInput("apple"), trivialInput("banana")], {},
+            BatchingOutputer(identifier, self.batch), None)
+
+
+    def test_interface(self):
+        """
+        L{BatchingOutputer} provides L{IOutputExecutor} and has the identifier
+        it was given.
+        """
+        outputer = BatchingOutputer(u"a", self.batch)
+        self.assertEqual(
+            (True, u"a"),
+            (verifyObject(IOutputExecutor, outputer), outputer.identifier()))
+
+
+    def test_tick(self):
+        """
+        Outputs are collected until the end of the tick and then handed to
+        the callback grouped by output symbol.
+        """
+        a, b = self.machine(u"a"), self.machine(u"b")
+        a.receive("banana")
+        b.receive("banana")
+        self.assertEqual(([], 2), (self.calls, len(self.batch)))
+        self.clock.advance(0)
+        self.assertEqual(
+            ([("ack", [(u"a", "banana"), (u"b", "banana")])], 0),
+            (self.calls, len(self.batch)))
+
+
+    def test_ordered(self):
+        """
+        Each machine's outputs are handed to the callback in the order it
+        produced them, even when another machine produced the same outputs
+        in a different order.
+        """
+        a, b = self.machine(u"a"), self.machine(u"b")
+        b.receive("banana")
+        a.receive("apple")
+        b.receive("apple")
+        self.batch.flush()
+        self.assertEqual(
+            [("ack", [(u"b", "banana")]),
+             ("write", [(u"a", "apple")]),
+             ("ack", [(u"a", "apple")]),
+             ("write", [(u"b", "apple")]),
+             ("ack", [(u"b", "apple")])],
+            self.calls)
+
+
+    def test_flush(self):
+        """
+        L{OutputBatch.flush} flushes the batch at once and cancels the flush
+        scheduled for the end of the tick.
+        """
+        self.machine(u"a").receive("banana")
+        self.batch.flush()
+        self.assertEqual(
+            ([("ack", [(u"a", "banana")])], []),
+            (self.calls, self.clock.getDelayedCalls()))
+
+
+    def test_notAutomatic(self):
+        """
+        If C{automatic} is C{False}, nothing is scheduled and the batch is
+        only flushed by L{OutputBatch.flush}.
+        """
+        batch = OutputBatch(
+            lambda output, entries: self.calls.append(output),
+            self.clock, automatic=False)
+        batch.add(u"a", "ack", None)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        batch.flush()
+        self.assertEqual(["ack"], self.calls)
+
+
+    def test_reentrant(self):
+        """
+        Outputs added by the callback go in the next batch.
+        """
+        fsm = self.machine(u"a")
+
+        def callback(output, entries):
+            self.calls.append(output)
+            if len(self.calls) == 1:
+                fsm.receive("banana")
+        self.batch._callback = callback
+        fsm.receive("banana")
+        self.batch.flush()
+        self.assertEqual((["ack"], 1), (self.calls, len(self.batch)))
+
+
+    def test_error(self):
+        """
+        An exception raised by the callback is logged and the rest of the
+        batch is still flushed.
+        """
+        def callback(output, entries):
+            self.calls.append(output)
+            1 // 0
+        self.batch._callback = callback
+        self.machine(u"a").receive("apple")
+        self.batch.flush()
+        self.assertEqual(
+            (["write", "ack"], 2),
+            (self.calls, len(self.flushLoggedErrors(ZeroDivisionError))))
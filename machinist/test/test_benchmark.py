@@ -0,0 +1,232 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist.benchmark}.
+"""
+
+from io import BytesIO
+
+from twisted.trial.unittest import TestCase
+
+from machinist.benchmark import (
+    Benchmark, allBenchmarks,
+    measure, runBenchmarks, compareResults, saveResults, loadResults, main,
+)
+
+
+class FakeTimer(object):
+    """
+    A timer which advances by a fixed amount each time the timed function is
+    called.
+    """
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+        self.calls = 0
+
+
+    def __call__(self):
+        return self.now
+
+
+    def function(self):
+        self.calls += 1
+        self.now += self.step
+
+
+
+class MeasureTests(TestCase):
+    """
+    Tests for L{measure}.
+    """
+    def test_perCall(self):
+        """
+        L{measure} returns the time taken by one call to the function.
+        """
+        timer = FakeTimer(0.001)
+        self.assertAlmostEqual(
+            0.001, measure(timer.function, 0.1, 1, timer))
+
+
+    def test_minimum(self):
+        """
+        L{measure} calls the function enough times for each timed loop to take
+        at least the minimum time.
+        """
+        # Powers of two keep the fake clock exact.
+        timer = FakeTimer(2 ** -10)
+        measure(timer.function, 2 ** -3, 3, timer)
+        # Loops of 1, 10 and 100 calls are too short; 200 calls is long
+        # enough, and is timed twice more.
+        self.assertEqual(1 + 10 + 100 + 200 * 3, timer.calls)
+
+
+    def test_fastest(self):
+        """
+        L{measure} uses the fastest of the timed loops.
+        """
+        steps = iter([0.5, 0.25, 0.375])
+        timer = FakeTimer(None)
+
+        def function():
+            timer.now += next(steps)
+
+        self.assertEqual(0.25, measure(function, 0.1, 3, timer))
+
+
+
+class RunBenchmarksTests(TestCase):
+    """
+    Tests for L{runBenchmarks}.
+    """
+    def test_results(self):
+        """
+        L{runBenchmarks} returns a L{dict} mapping benchmark names to the time
+        taken by one operation and reports each result.
+        """
+        lines = []
+        results = runBenchmarks(
+            [Benchmark("nothing", lambda: lambda: None)], 0.001, 1,
+            lines.append)
+        self.assertEqual((["nothing"], 1), (list(results), len(lines)))
+
+
+    def test_skipped(self):
+        """
+        Benchmarks which cannot be run are reported as skipped and left out
+        of the results.
+        """
+        lines = []
+        results = runBenchmarks(
+            [Benchmark("unavailable", lambda: None)], 0.001, 1, lines.append)
+        self.assertEqual({}, results)
+        self.assertIn("skipped", lines[0])
+
+
+    def test_cleanup(self):
+        """
+        If a benchmark's setup returns a cleanup function along with the
+        function to time, the cleanup function is called after timing.
+        """
+        events = []
+
+        def setup():
+            return (lambda: None), (lambda: events.append("cleanup"))
+
+        runBenchmarks([Benchmark("cleanup", setup)], 0.001, 1)
+        self.assertEqual(["cleanup"], events)
+
+
+    def test_suite(self):
+        """
+        Every benchmark in the suite can be prepared and run.
+        """
+        for benchmark in allBenchmarks():
+            prepared = benchmark.setup()
+            if prepared is None:
+                continue
+            if isinstance(prepared, tuple):
+                function, cleanup = prepared
+                function()
+                cleanup()
+            else:
+                prepared()
+
+
+
+class CompareResultsTests(TestCase):
+    """
+    Tests for L{compareResults}.
+    """
+    def test_regressed(self):
+        """
+        A benchmark is considered to have regressed if it is slower than its
+        baseline by more than the threshold.
+        """
+        (comparison,) = compareResults({"a": 1.0}, {"a": 1.2}, 0.1)
+        self.assertEqual(
+            ("a", 1.0, 1.2, True),
+            (comparison.name, comparison.baseline, comparison.current,
+             comparison.regressed))
+        self.assertAlmostEqual(1.2, comparison.ratio)
+
+
+    def test_notRegressed(self):
+        """
+        A benchmark is not considered to have regressed if it is slower than
+        its baseline by less than the threshold.
+        """
+        (comparison,) = compareResults({"a": 1.0}, {"a": 1.05}, 0.1)
+        self.assertFalse(comparison.regressed)
+
+
+    def test_common(self):
+        """
+        Only benchmarks present in both the baseline and the results are
+        compared.
+        """
+        comparisons = compareResults(
+            {"a": 1.0, "b": 1.0}, {"b": 1.0, "c": 1.0})
+        self.assertEqual(["b"], [c.name for c in comparisons])
+
+
+
+class SaveLoadResultsTests(TestCase):
+    """
+    Tests for L{saveResults} and L{loadResults}.
+    """
+    def test_roundTrip(self):
+        """
+        L{loadResults} returns the results given to L{saveResults}.
+        """
+        path = self.mktemp()
+        saveResults({u"a": 0.5}, path)
+        self.assertEqual({u"a": 0.5}, loadResults(path))
+
+
+
+class MainTests(TestCase):
+    """
+    Tests for L{main}.
+    """
+    def runMain(self, *argv):
+        output = BytesIO()
+        status = main(
+            ["--minimum", "0.001", "--repeat", "1",
+             "--filter", "outputer.*"] + list(argv), output)
+        return status, output.getvalue()
+
+
+    def test_save(self):
+        """
+        L{main} runs the selected benchmarks and writes their results to the
+        file given with C{--save}.
+        """
+        path = self.mktemp()
+        status, output = self.runMain("--save", path)
+        self.assertEqual(
+            (0, [u"outputer.output"]), (status, list(loadResults(path))))
+        self.assertIn(b"outputer.output", output)
+
+
+    def test_compareRegressed(self):
+        """
+        L{main} exits with status 1 if a benchmark has regressed compared to
+        the baseline given with C{--compare}.
+        """
+        path = self.mktemp()
+        saveResults({u"outputer.output": 1e-12}, path)
+        status, output = self.runMain("--compare", path)
+        self.assertEqual(1, status)
+        self.assertIn(b"REGRESSED", output)
+
+
+    def test_compareImproved(self):
+        """
+        L{main} exits with status 0 if no benchmark has regressed compared to
+        the baseline given with C{--compare}.
+        """
+        path = self.mktemp()
+        saveResults({u"outputer.output": 1e3}, path)
+        status, output = self.runMain("--compare", path)
+        self.assertEqual(0, status)
@@ -0,0 +1,237 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._cache}.
+"""
+
+from json import dumps
+from struct import Struct
+
+from zope.interface.exceptions import DoesNotImplement
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    MethodSuffixOutputer, TransitionTable, trivialInput,
+    compileDefinition, constructFromDefinition, definitionFingerprint,
+    DefinitionMismatch, saveDefinition, loadDefinition,
+)
+
+from .test_fsm import (
+    Input, MoreInput, Output, MoreState, AnimalWorld, Gravenstein, IFood,
+    TRANSITIONS,
+)
+
+
+
+class SaveLoadTests(TestCase):
+    """
+    Tests for L{saveDefinition} and L{loadDefinition}.
+    """
+    def setUp(self):
+        self.path = self.mktemp()
+        self.definition = compileDefinition(
+            Input, Output, MoreState,
+            TRANSITIONS.addTransition(
+                MoreState.blue, Input.apple, [], MoreState.blue),
+            MoreState.amber, [Gravenstein], {Output.aardvark: IFood})
+        saveDefinition(self.definition, self.path)
+
+
+    def load(self, **kwargs):
+        return loadDefinition(
+            self.path, Input, Output, MoreState, [Gravenstein],
+            {Output.aardvark: IFood}, **kwargs)
+
+
+    def test_roundTrip(self):
+        """
+        L{loadDefinition} returns a definition with the same transitions,
+        initial state and fingerprint as the one given to L{saveDefinition}.
+        """
+        loaded = self.load()
+        self.assertEqual(
+            (self.definition.table.table, self.definition.initial,
+             self.definition.fingerprint),
+            (loaded.table.table, loaded.initial, loaded.fingerprint))
+
+
+    def test_timeouts(self):
+        """
+        L{loadDefinition} returns a definition with the same timeouts as the
+        one given to L{saveDefinition}.
+        """
+        definition = compileDefinition(
+            Input, Output, MoreState,
+            self.definition.table.addTimeout(MoreState.blue, 2.5, Input.apple),
+            MoreState.amber, [Gravenstein], {Output.aardvark: IFood})
+        saveDefinition(definition, self.path)
+        self.assertEqual(
+            {MoreState.blue: (2.5, Input.apple)},
+            self.load(fingerprint=definition.fingerprint).table.timeouts)
+
+
+    def test_defaults(self):
+        """
+        L{loadDefinition} returns a definition with the same defaults, global
+        default and explicit transitions as the one given to
+        L{saveDefinition}, so its fingerprint matches its table.
+        """
+        definition = compileDefinition(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransitions(
+                MoreState.amber, {
+                    MoreInput.apple: ([Output.aardvark], MoreState.blue),
+                    # The same as the default.
+                    MoreInput.banana: ([], MoreState.amber),
+                },
+            ).addTransition(
+                MoreState.blue, MoreInput.apple, [], MoreState.blue,
+            ).addDefaultTransition(
+                MoreState.amber, [], MoreState.amber,
+            ).addGlobalDefaultTransition([Output.aardvark], MoreState.blue),
+            MoreState.amber, [], {})
+        saveDefinition(definition, self.path)
+        loaded = loadDefinition(self.path, MoreInput, Output, MoreState, [], {})
+        self.assertEqual(
+            (definition.table.table, definition.table.defaults,
+             definition.table.globalDefault, definition.fingerprint),
+            (loaded.table.table, loaded.table.defaults,
+             loaded.table.globalDefault,
+             definitionFingerprint(
+                 MoreInput, Output, MoreState, loaded.table, loaded.initial,
+                 {})))
+
+
+    def test_dense(self):
+        """
+        The definition returned by L{loadDefinition} has the same dense table
+        as the one given to L{saveDefinition}.
+        """
+        loaded = self.load()
+        for name in ("cells", "nextStates", "outputOffsets", "outputIndexes"):
+            self.assertEqual(
+                list(getattr(self.definition.dense, name)),
+                list(getattr(loaded.dense, name)))
+
+
+    def test_construct(self):
+        """
+        A state machine can be constructed from the definition returned by
+        L{loadDefinition}.
+        """
+        animals = []
+        fsm = constructFromDefinition(
+            self.load(), MethodSuffixOutputer(AnimalWorld(animals)), None)
+        apple = Gravenstein()
+        fsm.receive(apple)
+        self.assertEqual(
+            (MoreState.blue, [(Output.aardvark, apple)]),
+            (fsm.state, animals))
+
+
+    def test_expectedFingerprint(self):
+        """
+        If the fingerprint passed to L{loadDefinition} matches that of the
+        saved definition, the definition is loaded.
+        """
+        loaded = self.load(fingerprint=self.definition.fingerprint)
+        self.assertEqual(self.definition.fingerprint, loaded.fingerprint)
+
+
+    def test_unexpectedFingerprint(self):
+        """
+        If the fingerprint passed to L{loadDefinition} differs from that of the
+        saved definition, L{DefinitionMismatch} is raised.
+        """
+        self.assertRaises(
+            DefinitionMismatch, self.load, fingerprint=u"0" * 64)
+
+
+    def test_differentSymbols(self):
+        """
+        If the symbols passed to L{loadDefinition} do not have the same names
+        as those in the saved definition, L{DefinitionMismatch} is raised.
+        """
+        self.assertRaises(
+            DefinitionMismatch,
+            loadDefinition, self.path, MoreInput, Output, MoreState,
+            [Gravenstein], {Output.aardvark: IFood})
+
+
+    def test_differentInputContext(self):
+        """
+        If the input context passed to L{loadDefinition} differs from that of
+        the saved definition, L{DefinitionMismatch} is raised.
+        """
+        self.assertRaises(
+            DefinitionMismatch,
+            loadDefinition, self.path, Input, Output, MoreState,
+            [Gravenstein], {})
+
+
+    def test_richInputs(self):
+        """
+        If a rich input type passed to L{loadDefinition} does not provide the
+        interface required by an output it can produce, L{DoesNotImplement}
+        is raised.
+        """
+        self.assertRaises(
+            DoesNotImplement,
+            loadDefinition, self.path, Input, Output, MoreState,
+            [trivialInput(Input.apple)], {Output.aardvark: IFood})
+
+
+    def test_incompleteHeader(self):
+        """
+        If the header of the file passed to L{loadDefinition} is JSON but is
+        missing some of the fields of a saved definition,
+        L{DefinitionMismatch} is raised.
+        """
+        header = dumps({u"lengths": []}).encode("utf-8")
+        with open(self.path, "wb") as f:
+            f.write(Struct("<16sII").pack(
+                b"machinist-table\n", 1, len(header)))
+            f.write(header)
+        self.assertRaises(DefinitionMismatch, self.load)
+
+
+    def test_notDefinition(self):
+        """
+        If the file passed to L{loadDefinition} was not written by
+        L{saveDefinition}, L{DefinitionMismatch} is raised.
+        """
+        with open(self.path, "wb") as f:
+            f.write(b"hello, world\n" * 10)
+        self.assertRaises(DefinitionMismatch, self.load)
+
+
+    def test_truncated(self):
+        """
+        If the file passed to L{loadDefinition} is incomplete,
+        L{DefinitionMismatch} is raised.
+        """
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:-4])
+        self.assertRaises(DefinitionMismatch, self.load)
+
+
+    def test_empty(self):
+        """
+        If the file passed to L{loadDefinition} is empty,
+        L{DefinitionMismatch} is raised.
+        """
+        open(self.path, "wb").close()
+        self.assertRaises(DefinitionMismatch, self.load)
+
+
+    def test_missing(self):
+        """
+        If the file passed to L{loadDefinition} does not exist, L{IOError} is
+        raised.
+        """
+        self.assertRaises(
+            IOError, loadDefinition, self.mktemp(), Input, Output, MoreState,
+            [Gravenstein], {Output.aardvark: IFood})
@@ -0,0 +1,115 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._codegen}.
+"""
+
+import linecache
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    MethodSuffixOutputer, TransitionTable,
+    compileDefinition, constructFromDefinition,
+    generatedFiniteStateMachine, generatedSource,
+)
+
+from . import test_fsm
+from .test_fsm import (
+    Input, Output, MoreState, AnimalWorld, Gravenstein, IFood, TRANSITIONS,
+)
+from .test_definition import OtherMoreState
+
+
+
+class GeneratedFiniteStateMachineTests(test_fsm.FiniteStateMachineTests):
+    """
+    Tests for the L{IFiniteStateMachine} provider created by
+    L{generatedFiniteStateMachine}.
+    """
+    engine = staticmethod(generatedFiniteStateMachine)
+
+
+    def test_isTerminal(self):
+        """
+        The generated state machine knows which states are terminal.
+        """
+        self.assertEqual(
+            (False, True),
+            (self.fsm._isTerminal(MoreState.amber),
+             self.fsm._isTerminal(MoreState.blue)))
+
+
+    def test_independent(self):
+        """
+        Each state machine created from a single definition has its own state.
+        """
+        definition = compileDefinition(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood})
+        first = constructFromDefinition(
+            definition, MethodSuffixOutputer(AnimalWorld([])), None,
+            generatedFiniteStateMachine)
+        second = constructFromDefinition(
+            definition, MethodSuffixOutputer(AnimalWorld([])), None,
+            generatedFiniteStateMachine)
+        first.receive(Gravenstein())
+        self.assertEqual(
+            (MoreState.blue, MoreState.amber), (first.state, second.state))
+
+
+
+class GeneratedSourceTests(TestCase):
+    """
+    Tests for L{generatedSource}.
+    """
+    def setUp(self):
+        self.definition = compileDefinition(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood})
+
+
+    def test_source(self):
+        """
+        L{generatedSource} returns Python source naming the definition and the
+        symbols it involves.
+        """
+        source = generatedSource(self.definition)
+        compile(source, "<test>", "exec")
+        for text in [self.definition.fingerprint, "apple", "aardvark",
+                     "blue"]:
+            self.assertIn(text, source)
+
+
+    def test_sameFingerprint(self):
+        """
+        Definitions with the same fingerprint share their generated source,
+        but each state machine uses the symbols of its own definition.
+        """
+        other = compileDefinition(
+            Input, Output, OtherMoreState,
+            TransitionTable().addTransition(
+                OtherMoreState.amber, Input.apple, [Output.aardvark],
+                OtherMoreState.blue).addTerminalState(OtherMoreState.blue),
+            OtherMoreState.amber, [Gravenstein], {Output.aardvark: IFood})
+        self.assertIs(generatedSource(self.definition), generatedSource(other))
+
+        fsm = constructFromDefinition(
+            other, MethodSuffixOutputer(AnimalWorld([])), None,
+            generatedFiniteStateMachine)
+        fsm.receive(Gravenstein())
+        self.assertIs(OtherMoreState.blue, fsm.state)
+
+
+    def test_linecache(self):
+        """
+        The generated source is available from L{linecache} so that tracebacks
+        can show it.
+        """
+        fsm = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld([])), None,
+            generatedFiniteStateMachine)
+        filename = type(fsm).receive.__code__.co_filename
+        self.assertEqual(
+            generatedSource(self.definition).splitlines(),
+            [line.rstrip("\n") for line in linecache.getlines(filename)])
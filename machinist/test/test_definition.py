@@ -0,0 +1,313 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._definition}.
+"""
+
+from zope.interface import Interface
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    MissingTransitionState,
+    MethodSuffixOutputer, TransitionTable,
+    CompiledDefinition, compileDefinition, constructFromDefinition,
+    definitionFingerprint,
+)
+from machinist._definition import _symbols
+
+from .test_fsm import (
+    Input, MoreInput, Output, MoreState, AnimalWorld, Gravenstein, IFood,
+    TRANSITIONS,
+)
+
+
+
+class OtherMoreState(Names):
+    """
+    Symbols with the same names as L{MoreState} but which are distinct
+    objects.
+    """
+    amber = NamedConstant()
+    blue = NamedConstant()
+
+
+
+class IOtherFood(Interface):
+    pass
+
+
+
+def fingerprint(table=TRANSITIONS, states=MoreState, initial=MoreState.amber,
+                inputContext={Output.aardvark: IFood}):
+    return definitionFingerprint(
+        Input, Output, states, table, initial, inputContext)
+
+
+
+class DefinitionFingerprintTests(TestCase):
+    """
+    Tests for L{definitionFingerprint}.
+    """
+    def test_type(self):
+        """
+        L{definitionFingerprint} returns a L{unicode} string.
+        """
+        self.assertIsInstance(fingerprint(), unicode)
+
+
+    def test_deterministic(self):
+        """
+        L{definitionFingerprint} returns the same value when called with the
+        same definition.
+        """
+        self.assertEqual(fingerprint(), fingerprint())
+
+
+    def test_symbolIdentity(self):
+        """
+        L{definitionFingerprint} depends on the names of the symbols in a
+        definition, not on their identity.
+        """
+        table = TransitionTable().addTransition(
+            OtherMoreState.amber, Input.apple, [Output.aardvark],
+            OtherMoreState.blue).addTerminalState(OtherMoreState.blue)
+        self.assertEqual(
+            fingerprint(),
+            fingerprint(table, OtherMoreState, OtherMoreState.amber))
+
+
+    def test_transitions(self):
+        """
+        L{definitionFingerprint} returns a different value if the transitions
+        in the definition are different.
+        """
+        table = TRANSITIONS.addTransition(
+            MoreState.blue, Input.apple, [], MoreState.blue)
+        self.assertNotEqual(fingerprint(), fingerprint(table))
+
+
+    def test_outputs(self):
+        """
+        L{definitionFingerprint} returns a different value if the outputs of a
+        transition in the definition are different.
+        """
+        table = TRANSITIONS.addTransition(
+            MoreState.amber, Input.apple, [Output.aardvark, Output.aardvark],
+            MoreState.blue)
+        self.assertNotEqual(fingerprint(), fingerprint(table))
+
+
+    def test_defaults(self):
+        """
+        L{definitionFingerprint} returns a different value if the defaults of
+        the definition are different.
+        """
+        table = TRANSITIONS.addDefaultTransition(
+            MoreState.blue, [], MoreState.blue)
+        self.assertEqual(
+            3,
+            len(set([
+                fingerprint(), fingerprint(table),
+                fingerprint(table.addGlobalDefaultTransition(
+                    [], MoreState.amber))])))
+
+
+    def test_timeouts(self):
+        """
+        L{definitionFingerprint} returns a different value if the timeouts of
+        the definition are different.
+        """
+        self.assertEqual(
+            3,
+            len(set([
+                fingerprint(),
+                fingerprint(TRANSITIONS.addTimeout(
+                    MoreState.blue, 5, Input.apple)),
+                fingerprint(TRANSITIONS.addTimeout(
+                    MoreState.blue, 6, Input.apple))])))
+
+
+    def test_initial(self):
+        """
+        L{definitionFingerprint} returns a different value if the initial state
+        of the definition is different.
+        """
+        self.assertNotEqual(
+            fingerprint(), fingerprint(initial=MoreState.blue))
+
+
+    def test_inputContext(self):
+        """
+        L{definitionFingerprint} returns a different value if the input context
+        of the definition is different.
+        """
+        self.assertNotEqual(
+            fingerprint(), fingerprint(inputContext={}))
+        self.assertNotEqual(
+            fingerprint(),
+            fingerprint(inputContext={Output.aardvark: IOtherFood}))
+
+
+    def test_alphabet(self):
+        """
+        L{definitionFingerprint} returns a different value if the input
+        alphabet of the definition is different.
+        """
+        self.assertNotEqual(
+            fingerprint(),
+            definitionFingerprint(
+                MoreInput, Output, MoreState, TRANSITIONS, MoreState.amber,
+                {Output.aardvark: IFood}))
+
+
+    def test_symbolTypes(self):
+        """
+        L{definitionFingerprint} returns a different value for definitions
+        whose symbols differ only in type.
+        """
+        def fingerprintOf(symbol):
+            return definitionFingerprint(
+                [symbol], [], [u"amber"],
+                TransitionTable().addTransition(
+                    u"amber", symbol, [], u"amber"),
+                u"amber", {})
+        self.assertEqual(
+            3, len(set([fingerprintOf(1), fingerprintOf(u"1"),
+                        fingerprintOf(u"int:1")])))
+
+
+
+class SymbolsTests(TestCase):
+    """
+    Tests for L{_symbols}.
+    """
+    def test_declaredOrder(self):
+        """
+        L{_symbols} keeps sequences of integers in the order they are given
+        in, even if they are numbered from zero.
+        """
+        self.assertEqual((2, 0, 1), _symbols([2, 0, 1]))
+
+
+
+class CompileDefinitionTests(TestCase):
+    """
+    Tests for L{compileDefinition} and L{constructFromDefinition}.
+    """
+    def setUp(self):
+        self.definition = compileDefinition(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood})
+
+
+    def test_compiled(self):
+        """
+        L{compileDefinition} returns a L{CompiledDefinition} which remembers all
+        of the parts of the definition.
+        """
+        self.assertIsInstance(self.definition, CompiledDefinition)
+        self.assertEqual(
+            (Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+             (Gravenstein,), {Output.aardvark: IFood}),
+            (self.definition.inputs, self.definition.outputs,
+             self.definition.states, self.definition.table,
+             self.definition.initial, self.definition.richInputs,
+             self.definition.inputContext))
+
+
+    def test_checked(self):
+        """
+        L{compileDefinition} raises the same exceptions as
+        L{constructFiniteStateMachine} when given an incorrect definition.
+        """
+        self.assertRaises(
+            MissingTransitionState,
+            compileDefinition,
+            Input, Output, MoreState, TransitionTable(), MoreState.amber,
+            [], {})
+
+
+    def test_fingerprint(self):
+        """
+        L{CompiledDefinition.fingerprint} is the L{definitionFingerprint} of
+        the definition.
+        """
+        self.assertEqual(fingerprint(), self.definition.fingerprint)
+
+
+    def test_construct(self):
+        """
+        L{constructFromDefinition} returns a state machine which behaves
+        according to the definition.
+        """
+        animals = []
+        fsm = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld(animals)), None)
+        apple = Gravenstein()
+        fsm.receive(apple)
+        self.assertEqual(
+            (MoreState.blue, [(Output.aardvark, apple)]),
+            (fsm.state, animals))
+
+
+    def test_independent(self):
+        """
+        Each state machine constructed by L{constructFromDefinition} from a
+        single definition has its own state.
+        """
+        first = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld([])), None)
+        second = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld([])), None)
+        first.receive(Gravenstein())
+        self.assertEqual(MoreState.amber, second.state)
+
+
+
+class DenseTableTests(TestCase):
+    """
+    Tests for L{CompiledDefinition.dense}.
+    """
+    def test_dense(self):
+        """
+        L{CompiledDefinition.dense} describes the transition table of the
+        definition using the positions of the symbols involved.
+        """
+        definition = compileDefinition(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransitions(
+                MoreState.amber, {
+                    MoreInput.apple: ([Output.aardvark], MoreState.blue),
+                    MoreInput.banana: ([Output.aardvark], MoreState.blue)},
+            ).addTransition(
+                MoreState.blue, MoreInput.banana, [], MoreState.blue),
+            MoreState.amber, [], {})
+        dense = definition.dense
+        self.assertEqual(
+            ((MoreInput.apple, MoreInput.banana), (Output.aardvark,),
+             (MoreState.amber, MoreState.blue),
+             [0, 0, -1, 1], [1, 1], [0, 1, 1], [0]),
+            (dense.inputs, dense.outputs, dense.states,
+             list(dense.cells), list(dense.nextStates),
+             list(dense.outputOffsets), list(dense.outputIndexes)))
+
+
+    def test_defaults(self):
+        """
+        Defaults are expanded into a cell for each input they handle.
+        """
+        definition = compileDefinition(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, MoreInput.apple, [Output.aardvark],
+                MoreState.blue,
+            ).addDefaultTransition(
+                MoreState.amber, [], MoreState.amber,
+            ).addGlobalDefaultTransition([], MoreState.blue),
+            MoreState.amber, [], {})
+        dense = definition.dense
+        self.assertEqual(
+            ([0, 1, 2, 2], [1, 0, 1]),
+            (list(dense.cells), list(dense.nextStates)))
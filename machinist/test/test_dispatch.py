@@ -0,0 +1,145 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._dispatch}.
+"""
+
+from zope.interface.verify import verifyObject
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    UnhandledInput, IllegalInput, MethodSuffixOutputer, TransitionTable,
+    compileDefinition, constructFromDefinition, dispatchingFiniteStateMachine,
+)
+from machinist._dispatch import (
+    _IState, _TableState, _SingleInputState, _SelfLoopState,
+)
+
+from . import test_fsm
+from .test_fsm import MoreInput, Output, AnimalWorld
+
+
+
+class ThreeState(Names):
+    amber = NamedConstant()
+    blue = NamedConstant()
+    red = NamedConstant()
+
+
+
+class DispatchingFiniteStateMachineTests(test_fsm.FiniteStateMachineTests):
+    """
+    Tests for the L{IFiniteStateMachine} provider created by
+    L{dispatchingFiniteStateMachine}.
+    """
+    engine = staticmethod(dispatchingFiniteStateMachine)
+
+
+
+class StateTests(TestCase):
+    """
+    Tests for the kinds of state object used by
+    L{dispatchingFiniteStateMachine}.
+    """
+    def setUp(self):
+        self.animals = []
+        table = TransitionTable().addTransitions(
+            ThreeState.amber, {
+                MoreInput.apple: ([Output.aardvark], ThreeState.blue),
+                MoreInput.banana: ([], ThreeState.amber),
+            }).addTransition(
+                ThreeState.blue, MoreInput.apple, [], ThreeState.red,
+            ).addTransitions(
+                ThreeState.red, {
+                    MoreInput.apple: ([Output.aardvark], ThreeState.red),
+                    MoreInput.banana: ([], ThreeState.red),
+                })
+        self.definition = compileDefinition(
+            MoreInput, Output, ThreeState, table, ThreeState.amber, [], {})
+        self.fsm = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld(self.animals)),
+            None, dispatchingFiniteStateMachine)
+
+
+    def test_kinds(self):
+        """
+        A state with several transitions to different states is handled with
+        a table, one with a single transition without one and one which only
+        has self-loops without changing the current state.
+        """
+        states = self.fsm._states
+        self.assertEqual(
+            [_TableState, _SingleInputState, _SelfLoopState],
+            [type(states[state])
+             for state in (ThreeState.amber, ThreeState.blue, ThreeState.red)])
+
+
+    def test_interface(self):
+        """
+        Every kind of state object provides L{_IState}.
+        """
+        for state in self.fsm._states.values():
+            self.assertTrue(verifyObject(_IState, state))
+
+
+    def test_shared(self):
+        """
+        State machines created from the same definition share state objects.
+        """
+        other = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld([])), None,
+            dispatchingFiniteStateMachine)
+        self.assertIs(self.fsm._states, other._states)
+
+
+    def test_walk(self):
+        """
+        The state machine moves through each kind of state, delivering the
+        outputs of each transition.
+        """
+        results = []
+        for input in [MoreInput.banana, MoreInput.apple, MoreInput.apple,
+                      MoreInput.apple, MoreInput.banana]:
+            results.append((self.fsm.receive(input), self.fsm.state))
+        self.assertEqual(
+            [([], ThreeState.amber),
+             ([Output.aardvark], ThreeState.blue),
+             ([], ThreeState.red),
+             ([Output.aardvark], ThreeState.red),
+             ([], ThreeState.red)],
+            results)
+        self.assertEqual(
+            [(Output.aardvark, MoreInput.apple)] * 2, self.animals)
+
+
+    def test_singleInputUnhandled(self):
+        """
+        A state with a single transition raises L{UnhandledInput} for any
+        other input.
+        """
+        self.fsm.receive(MoreInput.apple)
+        exc = self.assertRaises(
+            UnhandledInput, self.fsm.receive, MoreInput.banana)
+        self.assertEqual((ThreeState.blue, MoreInput.banana), exc.args)
+
+
+    def test_singleInputIllegal(self):
+        """
+        A state with a single transition raises L{IllegalInput} for inputs
+        which are not part of the input alphabet, even unhashable ones.
+        """
+        self.fsm.receive(MoreInput.apple)
+        self.assertRaises(IllegalInput, self.fsm.receive, [])
+
+
+    def test_selfLoopIllegal(self):
+        """
+        A state with only self-loops raises L{IllegalInput} for inputs which
+        are not part of the input alphabet.
+        """
+        self.fsm.receive(MoreInput.apple)
+        self.fsm.receive(MoreInput.apple)
+        self.assertRaises(IllegalInput, self.fsm.receive, u"cherry")
+        self.assertEqual(ThreeState.red, self.fsm.state)
@@ -6,10 +6,12 @@ Tests for L{machinist}.
 
 from zope.interface import Attribute, Interface, implementer
 from zope.interface.exceptions import DoesNotImplement
+from zope.interface.interface import adapter_hooks
 from zope.interface.verify import verifyObject, verifyClass
 
 from twisted.python.util import FancyStrMixin
 from twisted.python.constants import Names, NamedConstant
+from twisted.internet.task import Clock
 from twisted.trial.unittest import TestCase
 
 from machinist import (
@@ -17,19 +19,28 @@ from machinist import (
     ExtraTransitionInput, MissingTransitionInput,
     ExtraTransitionOutput, MissingTransitionOutput,
     ExtraTransitionNextState, MissingTransitionNextState,
-    InvalidInitialState, UnhandledInput, IllegalInput,
-    ExtraInputContext,
+    InvalidInitialState, UnhandledInput, IllegalInput, REJECTED,
+    ExtraInputContext, UnhandledTimeoutInput,
 
-    IRichInput, IFiniteStateMachine,
-    MethodSuffixOutputer, trivialInput,
+    IRichInput, IFiniteStateMachine, IRejectingFiniteStateMachine,
+    MethodSuffixOutputer, trivialInput, singletonInput,
     Transition, TransitionTable, constructFiniteStateMachine,
+    compileDefinition,
 
-    WrongState, stateful,
+    WrongState, stateful, clearStatefulOnExit,
+
+    TimerWheel, scheduleTimeouts,
 
     LOG_FSM_INITIALIZE,
     LOG_FSM_TRANSITION,
+    LOG_FSM_REJECTED,
     )
 
+try:
+    from enum import Enum, IntEnum
+except ImportError:
+    Enum = IntEnum = None
+
 from .loglib import (
     MessageType, Logger,
     issuperset, assertContainsFields, LoggedAction, LoggedMessage,
@@ -186,6 +197,77 @@ class TransitionTableTests(TestCase):
         self.assertEqual({"foo": {}}, more.table)
 
 
+    def test_addDefaultTransition(self):
+        """
+        L{TransitionTable.addDefaultTransition} accepts a state, an output and
+        a next state and returns a new L{TransitionTable} which uses the
+        transition defined by those values for every input that state does
+        not otherwise handle, without adding a transition for each input.
+        """
+        table = TransitionTable().addTransition("foo", "bar", "baz", "quux")
+        more = table.addDefaultTransition("foo", "clementine", "date")
+        self.assertEqual(
+            ({"foo": {"bar": Transition("baz", "quux")}},
+             {"foo": Transition("clementine", "date")},
+             Transition("baz", "quux"),
+             Transition("clementine", "date")),
+            (more.table, more.defaults,
+             more._transition("foo", "bar"), more._transition("foo", "fig")))
+
+
+    def test_addGlobalDefaultTransition(self):
+        """
+        L{TransitionTable.addGlobalDefaultTransition} accepts an output and a
+        next state and returns a new L{TransitionTable} which uses the
+        transition defined by those values in every state without a default
+        of its own.
+        """
+        table = TransitionTable().addDefaultTransition(
+            "foo", "clementine", "date")
+        more = table.addGlobalDefaultTransition("eggplant", "fig")
+        self.assertEqual(
+            (None, Transition("eggplant", "fig"),
+             Transition("clementine", "date"), Transition("eggplant", "fig")),
+            (table.globalDefault, more.globalDefault,
+             more._transition("foo", "bar"), more._transition("grape", "bar")))
+
+
+    def test_defaultsPreserved(self):
+        """
+        Defaults are kept by the L{TransitionTable}s created from one which has
+        them.
+        """
+        table = TransitionTable().addDefaultTransition(
+            "foo", "clementine", "date").addGlobalDefaultTransition(
+                "eggplant", "fig")
+        more = table.addTransition("foo", "bar", "baz", "quux")
+        self.assertEqual(
+            (table.defaults, table.globalDefault),
+            (more.defaults, more.globalDefault))
+
+
+    def test_addTimeout(self):
+        """
+        L{TransitionTable.addTimeout} accepts a state, a number of seconds and
+        an input and returns a new L{TransitionTable} with that timeout for
+        the state, which is kept by the L{TransitionTable}s created from it.
+        """
+        table = TransitionTable().addTimeout("foo", 5, "bar")
+        more = table.addTransition("foo", "bar", "baz", "quux")
+        self.assertEqual(
+            ({}, {"foo": (5, "bar")}, {"foo": (5, "bar")}),
+            (TransitionTable().timeouts, table.timeouts, more.timeouts))
+
+
+    def test_addTimeoutNotPositive(self):
+        """
+        L{TransitionTable.addTimeout} raises L{ValueError} if the number of
+        seconds is not positive.
+        """
+        self.assertRaises(
+            ValueError, TransitionTable().addTimeout, "foo", 0, "bar")
+
+
 
 class ConstructExceptionTests(TestCase):
     """
@@ -388,6 +470,134 @@ class ConstructExceptionTests(TestCase):
             NULL_WORLD)
 
 
+    def test_extraTimeoutState(self):
+        """
+        L{ExtraTransitionState} is raised if there is a timeout for a state
+        which is not in the state alphabet.
+        """
+        exc = self.assertRaises(
+            ExtraTransitionState, constructFiniteStateMachine,
+            Input, Output, State,
+            TransitionTable().addTransition(
+                State.amber, Input.apple, [Output.aardvark], State.amber,
+            ).addTimeout(MoreState.blue, 1, Input.apple),
+            State.amber, [], {}, NULL_WORLD)
+        self.assertEqual(({MoreState.blue},), exc.args)
+
+
+    def test_extraTimeoutInput(self):
+        """
+        L{ExtraTransitionInput} is raised if the input of a timeout is not in
+        the input alphabet.
+        """
+        exc = self.assertRaises(
+            ExtraTransitionInput, constructFiniteStateMachine,
+            Input, Output, State,
+            TransitionTable().addTransition(
+                State.amber, Input.apple, [Output.aardvark], State.amber,
+            ).addTimeout(State.amber, 1, MoreInput.banana),
+            State.amber, [], {}, NULL_WORLD)
+        self.assertEqual(({MoreInput.banana},), exc.args)
+
+
+    def test_unhandledTimeoutInput(self):
+        """
+        L{UnhandledTimeoutInput} is raised if the input of a timeout is not
+        handled in the state the timeout is defined for.
+        """
+        exc = self.assertRaises(
+            UnhandledTimeoutInput, constructFiniteStateMachine,
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, MoreInput.apple, [Output.aardvark],
+                MoreState.blue,
+            ).addTransition(
+                MoreState.blue, MoreInput.banana, [], MoreState.amber,
+            ).addTimeout(MoreState.amber, 1, MoreInput.banana),
+            MoreState.amber, [], {}, NULL_WORLD)
+        self.assertEqual(
+            ({(MoreState.amber, MoreInput.banana)},), exc.args)
+
+
+    def test_defaultHandlesInputs(self):
+        """
+        L{MissingTransitionInput} is not raised if inputs not handled by any
+        transition are handled by a default.
+        """
+        constructFiniteStateMachine(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, MoreInput.apple, [Output.aardvark],
+                MoreState.blue,
+            ).addTerminalState(MoreState.blue).addDefaultTransition(
+                MoreState.blue, [], MoreState.blue),
+            MoreState.amber, [], {}, NULL_WORLD)
+
+
+    def test_globalDefaultHandlesStates(self):
+        """
+        L{MissingTransitionState} is not raised if states without any
+        transitions are handled by the global default.
+        """
+        constructFiniteStateMachine(
+            Input, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, Input.apple, [Output.aardvark],
+                MoreState.blue,
+            ).addGlobalDefaultTransition([], MoreState.amber),
+            MoreState.amber, [], {}, NULL_WORLD)
+
+
+    def test_extraDefaultOutput(self):
+        """
+        L{ExtraTransitionOutput} is raised if a default has an output which is
+        not defined by C{outputs}.
+        """
+        extra = object()
+        exc = self.assertRaises(
+            ExtraTransitionOutput,
+            constructFiniteStateMachine,
+            Input, Output, MoreState,
+            TRANSITIONS.addDefaultTransition(
+                MoreState.blue, [extra], MoreState.blue),
+            MoreState.amber, [], {}, NULL_WORLD)
+        self.assertEqual(({extra},), exc.args)
+
+
+    def test_extraDefaultNextState(self):
+        """
+        L{ExtraTransitionNextState} is raised if the global default has a
+        next state which is not defined by C{states}.
+        """
+        extra = object()
+        exc = self.assertRaises(
+            ExtraTransitionNextState,
+            constructFiniteStateMachine,
+            Input, Output, MoreState,
+            TRANSITIONS.addGlobalDefaultTransition([], extra),
+            MoreState.amber, [], {}, NULL_WORLD)
+        self.assertEqual(({extra},), exc.args)
+
+
+    def test_defaultRichInputInterface(self):
+        """
+        L{DoesNotImplement} is raised if a rich input type does not implement
+        the interface required by one of the outputs of a default which
+        handles it.
+        """
+        apple = trivialInput(Input.apple)
+        transitions = TransitionTable().addTerminalState(
+            State.amber).addDefaultTransition(
+                State.amber, [Output.aardvark], State.amber)
+
+        self.assertRaises(
+            DoesNotImplement,
+            constructFiniteStateMachine,
+            Input, Output, State, transitions,
+            State.amber, [apple], {Output.aardvark: IRequiredByAardvark},
+            NULL_WORLD)
+
+
 
 class TrivialInputTests(TestCase):
     """
@@ -425,6 +635,67 @@ class TrivialInputTests(TestCase):
         self.assertEqual("<Apple>", repr(trivialInput(Input.apple)()))
 
 
+    def test_memoized(self):
+        """
+        L{trivialInput} returns the same type each time it is called with the
+        same symbol.
+        """
+        self.assertIs(trivialInput(Input.apple), trivialInput(Input.apple))
+
+
+    def test_equalSymbols(self):
+        """
+        L{trivialInput} returns different types for symbols which are equal
+        but of different types.
+        """
+        types = [trivialInput(0), trivialInput(False), trivialInput(0.0)]
+        self.assertEqual(
+            ([0, False, 0.0], [int, bool, float], 3),
+            ([t.symbol() for t in types],
+             [type(t.symbol()) for t in types], len(set(types))))
+
+
+    def test_shared(self):
+        """
+        Since the type returned by L{trivialInput} is shared, interfaces
+        declared on it are seen by every caller, while those declared on a
+        subclass of it are not.
+        """
+        # A symbol of this test's own, since the type is changed.
+        symbol = u"test_shared"
+
+        @implementer(IFood)
+        class Subclass(trivialInput(symbol)):
+            pass
+
+        provided = [IFood.implementedBy(trivialInput(symbol))]
+        implementer(IFood)(trivialInput(symbol))
+        provided.append(IFood.implementedBy(trivialInput(symbol)))
+        self.assertEqual([False, True], provided)
+
+
+
+class SingletonInputTests(TestCase):
+    """
+    Tests for L{singletonInput}.
+    """
+    def test_type(self):
+        """
+        L{singletonInput} returns an instance of the type returned by
+        L{trivialInput} for the same symbol.
+        """
+        self.assertIsInstance(
+            singletonInput(Input.apple), trivialInput(Input.apple))
+
+
+    def test_same(self):
+        """
+        L{singletonInput} returns the same instance each time it is called
+        with the same symbol.
+        """
+        self.assertIs(singletonInput(Input.apple), singletonInput(Input.apple))
+
+
 LOG_ANIMAL = MessageType(
     u"testing:fsm:animalworld:aardvark", [],
     u"An animal!  Not really.  A log event actually.  Just a distinct message "
@@ -535,6 +806,21 @@ class MethodSuffixOutputerTests(TestCase):
         self.assertEqual([context], animals)
 
 
+    def test_result(self):
+        """
+        L{MethodSuffixOutputer.output} returns the result of the method it
+        calls.
+        """
+        result = object()
+
+        class ResultWorld(object):
+            def output_AARDVARK(self, context):
+                return result
+
+        outputer = MethodSuffixOutputer(ResultWorld())
+        self.assertIs(result, outputer.output(Output.aardvark, None))
+
+
     def test_repr(self):
         """
         The result of L{MethodSuffixOutputer.__repr__} is a string that
@@ -565,11 +851,36 @@ TRANSITIONS = TRANSITIONS.addTransition(
 TRANSITIONS = TRANSITIONS.addTerminalState(MoreState.blue)
 
 
+class IFiniteStateMachineTests(TestCase):
+    """
+    Tests for L{IFiniteStateMachine}.
+    """
+    def test_withoutTryReceive(self):
+        """
+        An object with only C{state} and C{receive} provides
+        L{IFiniteStateMachine}, which does not require C{tryReceive}.
+        """
+        @implementer(IFiniteStateMachine)
+        class Machine(object):
+            state = None
+
+            def receive(self, input):
+                return []
+
+        self.assertTrue(verifyObject(IFiniteStateMachine, Machine()))
+
+
+
 class FiniteStateMachineTests(TestCase):
     """
     Tests for the L{IFiniteStateMachine} provider returned by
     L{constructFiniteStateMachine}.
+
+    @ivar engine: The engine to pass to L{constructFiniteStateMachine}.
+        Subclasses override this to run these tests against other engines.
     """
+    engine = None
+
     def setUp(self):
         self.animals = []
         self.initial = MoreState.amber
@@ -578,14 +889,15 @@ class FiniteStateMachineTests(TestCase):
         self.fsm = constructFiniteStateMachine(
             Input, Output, MoreState, TRANSITIONS, self.initial,
             [Gravenstein], {Output.aardvark: IFood},
-            MethodSuffixOutputer(self.world))
+            MethodSuffixOutputer(self.world), engine=self.engine)
 
 
     def test_interface(self):
         """
-        L{constructFiniteStateMachine} returns an L{IFiniteStateMachine} provider.
+        L{constructFiniteStateMachine} returns an
+        L{IRejectingFiniteStateMachine} provider.
         """
-        self.assertTrue(verifyObject(IFiniteStateMachine, self.fsm))
+        self.assertTrue(verifyObject(IRejectingFiniteStateMachine, self.fsm))
 
 
     def test_initial(self):
@@ -627,7 +939,8 @@ class FiniteStateMachineTests(TestCase):
         """
         self.fsm = constructFiniteStateMachine(
             Input, Output, MoreState, TRANSITIONS, self.initial,
-            [Gravenstein], {}, MethodSuffixOutputer(self.world))
+            [Gravenstein], {}, MethodSuffixOutputer(self.world),
+            engine=self.engine)
 
         self.fsm.logger = logger
         self.world.logger = logger
@@ -663,7 +976,8 @@ class FiniteStateMachineTests(TestCase):
         """
         self.fsm = constructFiniteStateMachine(
             Input, Output, MoreState, TRANSITIONS, MoreState.amber,
-            [Gravenstein], {}, MethodSuffixOutputer(AnimalWorld([])), logger)
+            [Gravenstein], {}, MethodSuffixOutputer(AnimalWorld([])), logger,
+            self.engine)
         self.fsm.logger = logger
         self.fsm.receive(Input.apple)
         self.assertEqual(MoreState.blue, self.fsm.state)
@@ -729,12 +1043,319 @@ class FiniteStateMachineTests(TestCase):
         fsm = constructFiniteStateMachine(
             Input, Output, MoreState, TRANSITIONS, self.initial,
             [Gravenstein], {Output.aardvark: IFood},
-            MethodSuffixOutputer(self.world), None)
+            MethodSuffixOutputer(self.world), None, self.engine)
         self.assertEqual(
             repr(fsm),
             "<FSM / %s>" % (MethodSuffixOutputer(self.world),))
 
 
+    def test_defaultTransition(self):
+        """
+        L{IFiniteStateMachine.receive} uses the default of the current state
+        for inputs it has no other transition for.
+        """
+        fsm = constructFiniteStateMachine(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, MoreInput.apple, [], MoreState.blue,
+            ).addTransition(
+                MoreState.blue, MoreInput.apple, [], MoreState.blue,
+            ).addDefaultTransition(
+                MoreState.blue, [Output.aardvark], MoreState.amber),
+            self.initial, [], {}, MethodSuffixOutputer(self.world), None,
+            self.engine)
+        fsm.receive(MoreInput.apple)
+        self.assertEqual(
+            ([], MoreState.blue, [Output.aardvark], MoreState.amber),
+            (fsm.receive(MoreInput.apple), fsm.state,
+             fsm.receive(MoreInput.banana), fsm.state))
+
+
+    def test_globalDefaultTransition(self):
+        """
+        L{IFiniteStateMachine.receive} uses the global default for inputs the
+        current state has no other transition or default for.
+        """
+        fsm = constructFiniteStateMachine(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.blue, MoreInput.apple, [], MoreState.blue,
+            ).addDefaultTransition(
+                MoreState.amber, [], MoreState.blue,
+            ).addGlobalDefaultTransition([Output.aardvark], MoreState.amber),
+            self.initial, [], {}, MethodSuffixOutputer(self.world), None,
+            self.engine)
+        self.assertEqual(
+            ([], [], [Output.aardvark], MoreState.amber),
+            (fsm.receive(MoreInput.banana), fsm.receive(MoreInput.apple),
+             fsm.receive(MoreInput.banana), fsm.state))
+
+
+    def test_defaultIllegalInput(self):
+        """
+        L{IFiniteStateMachine.receive} raises L{IllegalInput} rather than
+        using a default if called with an input that isn't in the input
+        alphabet.
+        """
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState,
+            TRANSITIONS.addGlobalDefaultTransition([], MoreState.amber),
+            self.initial, [], {}, MethodSuffixOutputer(self.world), None,
+            self.engine)
+        exc = self.assertRaises(IllegalInput, fsm.receive, "not symbol")
+        self.assertEqual(("not symbol",), exc.args)
+
+
+    def test_tryReceive(self):
+        """
+        L{IFiniteStateMachine.tryReceive} handles an input like
+        L{IFiniteStateMachine.receive} if it is handled in the current state.
+        """
+        apple = Gravenstein()
+        self.assertEqual(
+            ([Output.aardvark], MoreState.blue, [(Output.aardvark, apple)]),
+            (self.fsm.tryReceive(apple), self.fsm.state, self.animals))
+
+
+    def test_tryReceiveUnhandled(self):
+        """
+        L{IFiniteStateMachine.tryReceive} returns L{REJECTED} and leaves the
+        state unchanged if the input is not handled in the current state.
+        """
+        self.fsm.receive(Gravenstein())
+        del self.animals[:]
+        self.assertEqual(
+            (REJECTED, REJECTED, MoreState.blue, []),
+            (self.fsm.tryReceive(Input.apple),
+             self.fsm.tryReceive(Gravenstein()), self.fsm.state,
+             self.animals))
+
+
+    def test_tryReceiveIllegal(self):
+        """
+        L{IFiniteStateMachine.tryReceive} returns L{REJECTED} if the input is
+        not part of the input alphabet, including unhashable inputs and rich
+        inputs of types the state machine was not given.
+        """
+        banana = trivialInput(MoreInput.banana)
+        self.assertEqual(
+            (REJECTED, REJECTED, REJECTED, self.initial),
+            (self.fsm.tryReceive("not symbol"), self.fsm.tryReceive([]),
+             self.fsm.tryReceive(banana()), self.fsm.state))
+
+
+    def test_handles(self):
+        """
+        L{IRejectingFiniteStateMachine.handles} tells whether an input would
+        be accepted by C{tryReceive} in the current state, without changing
+        the state.
+        """
+        banana = trivialInput(MoreInput.banana)
+        self.assertEqual(
+            (True, True, False, False, False, False, self.initial),
+            (self.fsm.handles(Input.apple), self.fsm.handles(Gravenstein()),
+             self.fsm.handles("not symbol"), self.fsm.handles([]),
+             self.fsm.handles(banana()),
+             self.fsm.handles(trivialInput(Input.apple)()),
+             self.fsm.state))
+
+
+    def test_singletonInput(self):
+        """
+        The instance returned by L{singletonInput} is handled like any other
+        rich input of its type.
+        """
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, TRANSITIONS, self.initial,
+            [trivialInput(Input.apple)], {}, MethodSuffixOutputer(self.world),
+            None, self.engine)
+        apple = singletonInput(Input.apple)
+        self.assertEqual(
+            ([Output.aardvark], MoreState.blue, [(Output.aardvark, apple)],
+             REJECTED),
+            (fsm.receive(apple), fsm.state, self.animals,
+             fsm.tryReceive(apple)))
+
+
+    def test_illegalSingletonInput(self):
+        """
+        The instance returned by L{singletonInput} is illegal if its type is
+        not one of the rich input types the state machine was given.
+        """
+        apple = singletonInput(Input.apple)
+        exc = self.assertRaises(IllegalInput, self.fsm.receive, apple)
+        self.assertEqual(
+            ((Input.apple,), REJECTED),
+            (exc.args, self.fsm.tryReceive(apple)))
+
+
+    def test_tryReceiveDefault(self):
+        """
+        L{IFiniteStateMachine.tryReceive} uses defaults for inputs which are
+        part of the input alphabet.
+        """
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState,
+            TRANSITIONS.addGlobalDefaultTransition([], MoreState.amber),
+            self.initial, [], {}, MethodSuffixOutputer(self.world), None,
+            self.engine)
+        fsm.receive(Input.apple)
+        self.assertEqual(
+            ([], MoreState.amber, REJECTED),
+            (fsm.tryReceive(Input.apple), fsm.state,
+             fsm.tryReceive("not symbol")))
+
+
+
+class InputContextTests(TestCase):
+    """
+    Tests for the adaptation of rich inputs to the context required by
+    outputs.
+    """
+    def test_adaptedOncePerTransition(self):
+        """
+        When several outputs of a transition require the same interface, the
+        input is adapted to it once for all of them, and again for the next
+        transition.
+        """
+        adapted = []
+        def hook(interface, input):
+            if interface is IFood and input is Input.apple:
+                adapted.append(Gravenstein())
+                return adapted[-1]
+            return None
+        adapter_hooks.append(hook)
+        self.addCleanup(adapter_hooks.remove, hook)
+
+        animals = []
+        fsm = constructFiniteStateMachine(
+            Input, Output, State,
+            TransitionTable().addTransition(
+                State.amber, Input.apple, [Output.aardvark, Output.aardvark],
+                State.amber),
+            State.amber, [], {Output.aardvark: IFood},
+            MethodSuffixOutputer(AnimalWorld(animals)))
+        fsm.receive(Input.apple)
+        fsm.receive(Input.apple)
+        self.assertEqual(
+            [(Output.aardvark, adapted[0]), (Output.aardvark, adapted[0]),
+             (Output.aardvark, adapted[1]), (Output.aardvark, adapted[1])],
+            animals)
+
+
+
+class AlternativeSymbolsTests(TestCase):
+    """
+    Tests for state machines defined using symbols other than
+    L{twisted.python.constants}.
+    """
+    def test_sequences(self):
+        """
+        L{constructFiniteStateMachine} accepts sequences of hashable values as
+        definitions of symbols.
+        """
+        animals = []
+        transitions = TransitionTable().addTransition(
+            "amber", "apple", ["aardvark"], "blue").addTerminalState("blue")
+        fsm = constructFiniteStateMachine(
+            ["apple"], ["aardvark"], ["amber", "blue"], transitions, "amber",
+            [], {}, MethodSuffixOutputer(AnimalWorld(animals)), None)
+        fsm.receive("apple")
+        self.assertEqual(
+            ("blue", [(Output.aardvark, "apple")]), (fsm.state, animals))
+
+
+    def test_sequenceValidation(self):
+        """
+        L{constructFiniteStateMachine} checks definitions which use sequences
+        of symbols for errors.
+        """
+        exc = self.assertRaises(
+            MissingTransitionState,
+            constructFiniteStateMachine,
+            ["apple"], ["aardvark"], ["amber", "blue"],
+            TransitionTable().addTransition(
+                "amber", "apple", ["aardvark"], "amber"),
+            "amber", [], {}, NULL_WORLD, None)
+        self.assertEqual(({"blue"},), exc.args)
+
+
+    def test_sequenceIllegalInput(self):
+        """
+        The L{IFiniteStateMachine} returned by L{constructFiniteStateMachine}
+        given a sequence of inputs raises L{IllegalInput} if it receives an
+        input which is not in that sequence, including unhashable values.
+        """
+        fsm = constructFiniteStateMachine(
+            ["apple"], [], ["amber"],
+            TransitionTable().addTransition("amber", "apple", [], "amber"),
+            "amber", [], {}, NULL_WORLD, None)
+        self.assertRaises(IllegalInput, fsm.receive, "banana")
+        self.assertRaises(IllegalInput, fsm.receive, ["apple"])
+
+
+    def test_enum(self):
+        """
+        L{constructFiniteStateMachine} accepts L{enum.Enum} subclasses as
+        definitions of symbols.
+        """
+        class Fruit(Enum):
+            apple = "apple"
+
+        class Animal(Enum):
+            aardvark = "aardvark"
+
+        class Colour(Enum):
+            amber = "amber"
+            blue = "blue"
+
+        animals = []
+        transitions = TransitionTable().addTransition(
+            Colour.amber, Fruit.apple, [Animal.aardvark], Colour.blue,
+        ).addTerminalState(Colour.blue)
+        fsm = constructFiniteStateMachine(
+            Fruit, Animal, Colour, transitions, Colour.amber,
+            [trivialInput(Fruit.apple)], {},
+            MethodSuffixOutputer(AnimalWorld(animals)), None)
+        fsm.receive(Fruit.apple)
+        self.assertEqual(
+            (Colour.blue, [(Output.aardvark, Fruit.apple)]),
+            (fsm.state, animals))
+
+
+    def test_intEnumIndexes(self):
+        """
+        The positions of the members of L{enum.IntEnum} subclasses in the
+        dense form of a definition are their values.
+        """
+        class Fruit(IntEnum):
+            banana = 1
+            apple = 0
+
+        class Colour(IntEnum):
+            blue = 1
+            amber = 0
+
+        definition = compileDefinition(
+            Fruit, [], Colour,
+            TransitionTable().addTransition(
+                Colour.amber, Fruit.banana, [], Colour.blue,
+            ).addTransition(
+                Colour.blue, Fruit.apple, [], Colour.amber),
+            Colour.amber, [], {})
+        dense = definition.dense
+        width = len(dense.inputs)
+        self.assertEqual(
+            (Colour.blue, Colour.amber),
+            (dense.nextStates[
+                dense.cells[Colour.amber * width + Fruit.banana]],
+             dense.nextStates[
+                 dense.cells[Colour.blue * width + Fruit.apple]]))
+
+    if Enum is None:
+        test_enum.skip = test_intEnumIndexes.skip = "enum is not installed"
+
+
 
 class IsTerminalTests(TestCase):
     """
@@ -795,6 +1416,35 @@ class IsTerminalTests(TestCase):
         self.assertFalse(fsm._isTerminal(MoreState.blue))
 
 
+    def test_default(self):
+        """
+        L{_FiniteStateMachine._isTerminal} returns C{False} if a state has a
+        default which causes a state change.
+        """
+        transitions = TRANSITIONS.addDefaultTransition(
+            MoreState.blue, [], MoreState.amber)
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, transitions, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood},
+            MethodSuffixOutputer(AnimalWorld([])))
+        self.assertFalse(fsm._isTerminal(MoreState.blue))
+
+
+    def test_unusedDefault(self):
+        """
+        L{_FiniteStateMachine._isTerminal} ignores the default of a state which
+        handles every input itself.
+        """
+        transitions = TRANSITIONS.addTransition(
+            MoreState.blue, Input.apple, [], MoreState.blue,
+        ).addDefaultTransition(MoreState.blue, [], MoreState.amber)
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, transitions, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood},
+            MethodSuffixOutputer(AnimalWorld([])))
+        self.assertTrue(fsm._isTerminal(MoreState.blue))
+
+
 
 class FiniteStateMachineLoggingTests(TestCase):
     """
@@ -902,6 +1552,35 @@ class FiniteStateMachineLoggingTests(TestCase):
                 if msg[u"action_type"] == u"fsm:initialize"])
 
 
+    @validateLogging(None)
+    def test_rejectedLogging(self, logger):
+        """
+        An input not handled by L{IRejectingFiniteStateMachine.tryReceive}
+        is logged with a single L{LOG_FSM_REJECTED} message, while handled
+        ones are logged as transitions.
+        """
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {Output.aardvark: IFood},
+            MethodSuffixOutputer(AnimalWorld([])), logger)
+        fsm.tryReceive(Gravenstein())
+        howMany = len(logger.messages)
+
+        self.assertIs(REJECTED, fsm.tryReceive(Gravenstein()))
+        self.assertEqual(
+            (1, 1),
+            (len(LoggedAction.of_type(logger.messages, LOG_FSM_TRANSITION)),
+             len(logger.messages) - howMany))
+        (rejected,) = LoggedMessage.of_type(
+            logger.messages, LOG_FSM_REJECTED)
+        assertContainsFields(
+            self, rejected.message, {
+                u"fsm_identifier": u"<AnimalWorld>",
+                u"fsm_state": u"<MoreState=blue>",
+                u"fsm_input": u"<Input=apple>",
+            })
+
+
 
 class Restricted(object):
     foo = "a"
@@ -909,6 +1588,20 @@ class Restricted(object):
 
 
 
+class _Machine(object):
+    state = "a"
+
+
+
+class SlottedRestricted(object):
+    __slots__ = ("_fsm", "_attribute")
+    attribute = stateful("_fsm.state", "a", "c", slot="_attribute")
+
+    def __init__(self):
+        self._fsm = _Machine()
+
+
+
 class StatefulTests(TestCase):
     """
     Tests for L{stateful}.
@@ -981,3 +1674,340 @@ class StatefulTests(TestCase):
         the L{stateful} instance itself.
         """
         self.assertIs(Restricted.__dict__["attribute"], Restricted.attribute)
+
+
+
+    def test_allowedStates(self):
+        """
+        The states in which access is allowed are kept in a L{frozenset} as
+        well as in the L{tuple} used to describe them.
+        """
+        descriptor = SlottedRestricted.attribute
+        self.assertEqual(
+            (("a", "c"), frozenset(["a", "c"])),
+            (descriptor._allowed, descriptor._allowedStates))
+
+
+    def test_unexpectedKeyword(self):
+        """
+        L{stateful} raises L{TypeError} if it is given an unexpected keyword
+        argument.
+        """
+        self.assertRaises(TypeError, stateful, "state", "a", slott="_a")
+
+
+    def test_invalidPath(self):
+        """
+        L{stateful} raises L{ValueError} if it is given an attribute path which
+        is not a dotted path of identifiers.
+        """
+        for path in ["", "_fsm.", "_fsm.state()", "_fsm.class", "1"]:
+            self.assertRaises(ValueError, stateful, path, "a")
+
+
+    def test_textPath(self):
+        """
+        L{stateful} accepts an attribute path given as either L{bytes} or
+        L{unicode}.
+        """
+        for path in [b"_fsm.state", u"_fsm.state"]:
+            descriptor = stateful(path, "a")
+            self.assertEqual("a", descriptor._getter(SlottedRestricted()))
+
+
+
+class SlottedStatefulTests(TestCase):
+    """
+    Tests for L{stateful} with a slot and an attribute path.
+    """
+    def setUp(self):
+        self.obj = SlottedRestricted()
+
+
+    def test_allowedSet(self):
+        """
+        In an allowed state, the value of the descriptor is stored in its slot.
+        """
+        value = object()
+        self.obj.attribute = value
+        self.assertEqual(
+            (value, value), (self.obj.attribute, self.obj._attribute))
+
+
+    def test_allowedGetMissing(self):
+        """
+        In an allowed state, if the descriptor has no value, an attempt to get
+        it raises L{AttributeError}.
+        """
+        self.assertRaises(AttributeError, getattr, self.obj, "attribute")
+
+
+    def test_allowedDelete(self):
+        """
+        In an allowed state, the value of the descriptor can be deleted from
+        its slot.
+        """
+        self.obj.attribute = object()
+        del self.obj.attribute
+        self.assertRaises(AttributeError, getattr, self.obj, "_attribute")
+
+
+    def test_disallowed(self):
+        """
+        Out of the allowed states, as found by following the attribute path,
+        L{WrongState} is raised by attempts to use the descriptor.
+        """
+        self.obj.attribute = object()
+        self.obj._fsm.state = "b"
+        self.assertRaises(WrongState, getattr, self.obj, "attribute")
+        self.assertRaises(WrongState, setattr, self.obj, "attribute", 1)
+        self.assertRaises(WrongState, delattr, self.obj, "attribute")
+
+
+
+class Holder(object):
+    """
+    An output executor with L{stateful} attributes guarded by the state of its
+    own state machine.
+    """
+    buffer = stateful(
+        lambda holder: holder.fsm.state, MoreState.amber, clearOnExit=True)
+    kept = stateful(lambda holder: holder.fsm.state, MoreState.amber)
+    everywhere = stateful(
+        lambda holder: holder.fsm.state, MoreState.amber, MoreState.blue,
+        clearOnExit=True)
+
+    def identifier(self):
+        return u"<Holder>"
+
+
+    def output_AARDVARK(self, context):
+        # The state has already changed, so look at the stored value directly.
+        self.seen = self.__dict__.get(Holder.buffer)
+
+
+
+class ClearStatefulOnExitTests(TestCase):
+    """
+    Tests for L{stateful} with C{clearOnExit} and L{clearStatefulOnExit}.
+    """
+    def setUp(self):
+        self.holder = Holder()
+        self.holder.fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {}, MethodSuffixOutputer(self.holder))
+        self.buffer = object()
+        self.holder.buffer = self.buffer
+        self.holder.kept = object()
+        self.holder.everywhere = object()
+
+
+    def test_cleared(self):
+        """
+        After a transition out of the states an attribute created with
+        C{clearOnExit=True} is allowed in, its value is released.  It is
+        released after the outputs of the transition are executed.
+        """
+        clearStatefulOnExit(self.holder.fsm, self.holder)
+        self.holder.fsm.receive(Input.apple)
+        stored = self.holder.__dict__
+        self.assertEqual(
+            (False, True, True, self.buffer),
+            (Holder.buffer in stored, Holder.kept in stored,
+             Holder.everywhere in stored, self.holder.seen))
+
+
+    def test_tryReceive(self):
+        """
+        Values are also released after transitions made by
+        L{IFiniteStateMachine.tryReceive}.
+        """
+        clearStatefulOnExit(self.holder.fsm, self.holder)
+        self.holder.fsm.tryReceive(Input.apple)
+        self.assertNotIn(Holder.buffer, self.holder.__dict__)
+
+
+    def test_failedOutput(self):
+        """
+        Values are released even if an output of the transition raises an
+        exception.
+        """
+        def fail(context):
+            1 // 0
+        self.holder.output_AARDVARK = fail
+        clearStatefulOnExit(self.holder.fsm, self.holder)
+        self.assertRaises(
+            ZeroDivisionError, self.holder.fsm.receive, Input.apple)
+        self.assertNotIn(Holder.buffer, self.holder.__dict__)
+
+
+    def test_notConfigured(self):
+        """
+        Without L{clearStatefulOnExit}, values are not released.
+        """
+        self.holder.fsm.receive(Input.apple)
+        self.assertIn(Holder.buffer, self.holder.__dict__)
+
+
+    def test_otherEngine(self):
+        """
+        L{clearStatefulOnExit} raises L{TypeError} for a state machine created
+        with an engine which does not support it.
+        """
+        from machinist import generatedFiniteStateMachine
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber,
+            [Gravenstein], {}, MethodSuffixOutputer(self.holder), None,
+            generatedFiniteStateMachine)
+        self.assertRaises(TypeError, clearStatefulOnExit, fsm, self.holder)
+
+
+
+# blue goes back to amber on banana, which it is given after five seconds.
+TIMEOUTS = TransitionTable().addTransitions(
+    MoreState.amber, {
+        MoreInput.apple: ([Output.aardvark], MoreState.blue),
+        MoreInput.banana: ([], MoreState.amber)},
+).addTransitions(
+    MoreState.blue, {
+        MoreInput.apple: ([], MoreState.blue),
+        MoreInput.banana: ([], MoreState.amber)},
+).addTimeout(MoreState.blue, 5, MoreInput.banana)
+
+
+
+class ScheduleTimeoutsTests(TestCase):
+    """
+    Tests for L{TransitionTable.addTimeout} and L{scheduleTimeouts}.
+    """
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = TimerWheel(self.clock)
+
+
+    def machine(self, table=TIMEOUTS, initial=MoreState.amber, logger=None):
+        """
+        Create a state machine with timeouts scheduled with C{self.wheel}.
+        """
+        fsm = constructFiniteStateMachine(
+            MoreInput, Output, MoreState, table, initial, [], {},
+            MethodSuffixOutputer(AnimalWorld([])), logger)
+        scheduleTimeouts(fsm, self.wheel)
+        return fsm
+
+
+    def test_timeout(self):
+        """
+        A state machine receives the input of the timeout of a state once it
+        has been in that state for the timeout's number of seconds.
+        """
+        fsm = self.machine()
+        fsm.receive(MoreInput.apple)
+        self.clock.advance(4.9)
+        before = fsm.state
+        self.clock.advance(0.2)
+        self.assertEqual(
+            (MoreState.blue, MoreState.amber), (before, fsm.state))
+
+
+    def test_initial(self):
+        """
+        The timeout of the state the state machine is in when
+        L{scheduleTimeouts} is called is started.
+        """
+        fsm = self.machine(initial=MoreState.blue)
+        self.clock.advance(5)
+        self.assertEqual(MoreState.amber, fsm.state)
+
+
+    def test_restarted(self):
+        """
+        Every transition starts the time again, even if it stays in the same
+        state.
+        """
+        fsm = self.machine()
+        fsm.receive(MoreInput.apple)
+        self.clock.advance(4)
+        fsm.receive(MoreInput.apple)
+        self.clock.advance(4)
+        before = fsm.state
+        self.clock.advance(1.1)
+        self.assertEqual(
+            (MoreState.blue, MoreState.amber), (before, fsm.state))
+
+
+    def test_cancelled(self):
+        """
+        Leaving a state cancels its timeout.
+        """
+        fsm = self.machine()
+        fsm.receive(MoreInput.apple)
+        fsm.receive(MoreInput.banana)
+        self.clock.advance(1)
+        fsm.receive(MoreInput.banana)
+        self.clock.advance(10)
+        self.assertEqual(
+            (MoreState.amber, []), (fsm.state, self.clock.getDelayedCalls()))
+
+
+    def test_failedOutput(self):
+        """
+        The timeout of the new state is started, and that of the old state
+        cancelled, even if an output of the transition raises an exception.
+        """
+        class FailingWorld(object):
+            def identifier(self):
+                return u"<FailingWorld>"
+
+            def output_AARDVARK(self, context):
+                1 // 0
+
+        fsm = constructFiniteStateMachine(
+            MoreInput, Output, MoreState,
+            TransitionTable().addTransitions(
+                MoreState.blue, {
+                    MoreInput.apple: ([Output.aardvark], MoreState.amber),
+                    MoreInput.banana: ([], MoreState.blue)},
+            ).addTransitions(
+                MoreState.amber, {
+                    MoreInput.apple: ([], MoreState.amber),
+                    MoreInput.banana: ([], MoreState.blue)},
+            ).addTimeout(MoreState.blue, 1, MoreInput.banana,
+            ).addTimeout(MoreState.amber, 10, MoreInput.banana),
+            MoreState.blue, [], {}, MethodSuffixOutputer(FailingWorld()),
+            None)
+        scheduleTimeouts(fsm, self.wheel)
+        self.assertRaises(ZeroDivisionError, fsm.receive, MoreInput.apple)
+        self.clock.advance(1.2)
+        before = fsm.state
+        self.clock.advance(9)
+        self.assertEqual(
+            (MoreState.amber, MoreState.blue), (before, fsm.state))
+
+
+    @validateLogging(None)
+    def test_logged(self, logger):
+        """
+        Transitions caused by timeouts are logged like any others.
+        """
+        fsm = self.machine(logger=logger)
+        fsm.receive(MoreInput.apple)
+        self.clock.advance(5)
+        transition = LoggedAction.ofType(
+            logger.messages, LOG_FSM_TRANSITION)[-1]
+        assertContainsFields(
+            self, transition.startMessage,
+            {u"fsm_input": u"<MoreInput=banana>"})
+
+
+    def test_otherEngine(self):
+        """
+        L{scheduleTimeouts} raises L{TypeError} for a state machine created
+        with an engine which does not support it.
+        """
+        from machinist import generatedFiniteStateMachine
+        fsm = constructFiniteStateMachine(
+            MoreInput, Output, MoreState, TIMEOUTS, MoreState.amber, [], {},
+            MethodSuffixOutputer(AnimalWorld([])), None,
+            generatedFiniteStateMachine)
+        self.assertRaises(TypeError, scheduleTimeouts, fsm, self.wheel)
@@ -0,0 +1,219 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._hierarchy}.
+"""
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    Transition, TransitionTable, flattenHierarchy, compileDefinition,
+)
+
+
+
+class Event(Names):
+    hello = NamedConstant()
+    data = NamedConstant()
+    error = NamedConstant()
+    shutdown = NamedConstant()
+    noise = NamedConstant()
+
+
+
+class Action(Names):
+    welcome = NamedConstant()
+    deliver = NamedConstant()
+    reset = NamedConstant()
+    close = NamedConstant()
+    complain = NamedConstant()
+
+
+
+class Connection(Names):
+    idle = NamedConstant()
+    handshaking = NamedConstant()
+    established = NamedConstant()
+    closed = NamedConstant()
+
+
+
+class Group(Names):
+    """
+    Superstates of L{Connection}.
+    """
+    alive = NamedConstant()
+    talking = NamedConstant()
+
+
+
+# idle, handshaking and established are alive; handshaking and established
+# are also talking.
+PARENTS = {
+    Connection.idle: Group.alive,
+    Connection.handshaking: Group.talking,
+    Connection.established: Group.talking,
+    Group.talking: Group.alive,
+}
+
+TABLE = TransitionTable().addTransitions(
+    Group.alive, {
+        Event.shutdown: ([Action.close], Connection.closed),
+        Event.error: ([Action.reset], Connection.idle),
+    },
+).addTransitions(
+    Group.talking, {
+        Event.error: ([Action.reset, Action.close], Connection.closed),
+        Event.data: ([], Group.talking),
+    },
+).addTransition(
+    Connection.idle, Event.hello, [], Connection.handshaking,
+).addTransition(
+    Connection.handshaking, Event.hello, [Action.welcome],
+    Connection.established,
+).addTransition(
+    Connection.established, Event.data, [Action.deliver],
+    Connection.established,
+).addTerminalState(Connection.closed)
+
+
+
+class FlattenHierarchyTests(TestCase):
+    """
+    Tests for L{flattenHierarchy}.
+    """
+    def setUp(self):
+        self.table = flattenHierarchy(TABLE, PARENTS).table
+
+
+    def test_states(self):
+        """
+        The flattened table has a row for each state but none for superstates.
+        """
+        self.assertEqual(
+            set(Connection.iterconstants()), set(self.table))
+
+
+    def test_inherited(self):
+        """
+        States have the transitions of all the superstates they are nested in.
+        """
+        self.assertEqual(
+            Transition([Action.close], Connection.closed),
+            self.table[Connection.handshaking][Event.shutdown])
+
+
+    def test_innermost(self):
+        """
+        A transition of a superstate overrides that of a superstate it is
+        nested in.
+        """
+        self.assertEqual(
+            (Transition([Action.reset], Connection.idle),
+             Transition([Action.reset, Action.close], Connection.closed)),
+            (self.table[Connection.idle][Event.error],
+             self.table[Connection.handshaking][Event.error]))
+
+
+    def test_own(self):
+        """
+        A state's own transition overrides those of its superstates.
+        """
+        self.assertEqual(
+            Transition([Action.deliver], Connection.established),
+            self.table[Connection.established][Event.data])
+
+
+    def test_stay(self):
+        """
+        A superstate transition to the superstate itself leaves the machine in
+        the state it was in.
+        """
+        self.assertEqual(
+            Transition([], Connection.handshaking),
+            self.table[Connection.handshaking][Event.data])
+
+
+    def test_notNested(self):
+        """
+        States which are not nested in any superstate keep their transitions.
+        """
+        self.assertEqual({}, self.table[Connection.closed])
+
+
+    def test_defaults(self):
+        """
+        Inputs not otherwise handled use the default of the innermost
+        superstate which has one.
+        """
+        table = flattenHierarchy(
+            TABLE.addDefaultTransition(
+                Group.alive, [Action.complain], Connection.closed,
+            ).addDefaultTransition(
+                Group.talking, [Action.complain], Group.talking,
+            ), PARENTS)
+        self.assertEqual(
+            (Transition([Action.complain], Connection.closed),
+             Transition([Action.complain], Connection.established),
+             Transition([Action.deliver], Connection.established),
+             None),
+            (table._transition(Connection.idle, Event.noise),
+             table._transition(Connection.established, Event.noise),
+             table._transition(Connection.established, Event.data),
+             table._transition(Connection.closed, Event.noise)))
+
+
+    def test_compactDefaults(self):
+        """
+        Defaults remain defaults in the flattened table rather than becoming
+        a transition for every input.
+        """
+        table = flattenHierarchy(
+            TABLE.addDefaultTransition(
+                Group.alive, [Action.complain], Connection.closed),
+            PARENTS)
+        self.assertEqual(
+            ({}, Transition([Action.complain], Connection.closed)),
+            (table.table[Connection.closed],
+             table.defaults[Connection.handshaking]))
+
+
+    def test_timeouts(self):
+        """
+        States have their own timeout or else that of the innermost
+        superstate which has one.
+        """
+        table = flattenHierarchy(
+            TABLE.addTimeout(Group.alive, 30, Event.shutdown).addTimeout(
+                Group.talking, 5, Event.error).addTimeout(
+                    Connection.established, 60, Event.shutdown),
+            PARENTS)
+        self.assertEqual(
+            {Connection.idle: (30, Event.shutdown),
+             Connection.handshaking: (5, Event.error),
+             Connection.established: (60, Event.shutdown)},
+            table.timeouts)
+
+
+    def test_cycle(self):
+        """
+        L{flattenHierarchy} raises L{ValueError} if a superstate is nested in
+        itself.
+        """
+        parents = dict(PARENTS)
+        parents[Group.alive] = Group.talking
+        self.assertRaises(ValueError, flattenHierarchy, TABLE, parents)
+
+
+    def test_compile(self):
+        """
+        The flattened table is an ordinary, correct definition.
+        """
+        compileDefinition(
+            Event, Action, Connection,
+            flattenHierarchy(
+                TABLE.addDefaultTransition(
+                    Group.alive, [Action.complain], Group.alive),
+                PARENTS),
+            Connection.idle, [], {})
@@ -0,0 +1,201 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for the side-effects of importing L{machinist}.
+"""
+
+from os import environ, pathsep
+from os.path import abspath, dirname
+from subprocess import check_output
+from sys import executable
+
+from twisted.trial.unittest import TestCase
+
+import machinist
+from machinist._version import get_versions
+
+from .loglib import logSkipReason
+
+# Trial changes the working directory before running tests, so find the
+# directory containing machinist while relative paths still work.
+_ROOT = dirname(dirname(abspath(machinist.__file__)))
+
+
+def runPython(source):
+    """
+    Run some Python source in a new interpreter which can import the
+    L{machinist} being tested.
+
+    @param source: The source to run.
+    @type source: L{str}
+
+    @return: The standard output of the interpreter.
+    @rtype: L{bytes}
+    """
+    return check_output([executable, "-c", source], env=_environment())
+
+
+
+def _environment():
+    """
+    Create an environment in which a new interpreter can import the
+    L{machinist} being tested.
+    """
+    env = environ.copy()
+    env["PYTHONPATH"] = pathsep.join(
+        [_ROOT] + environ.get("PYTHONPATH", "").split(pathsep))
+    return env
+
+
+
+class VersionTests(TestCase):
+    """
+    Tests for C{machinist.__version__}.
+    """
+    def test_version(self):
+        """
+        C{machinist.__version__} is the version computed by
+        L{machinist._version}.
+        """
+        self.assertEqual(get_versions()["version"], machinist.__version__)
+
+
+    def test_noProcessOnImport(self):
+        """
+        Importing L{machinist} does not start any child processes.
+        """
+        output = runPython(
+            "import subprocess\n"
+            "def fail(*args, **kwargs):\n"
+            "    raise SystemExit('process started')\n"
+            "subprocess.Popen = fail\n"
+            "import machinist\n"
+            "import sys\n"
+            "sys.stdout.write(repr('machinist._version' in sys.modules))\n")
+        self.assertEqual(b"False", output)
+
+
+
+# Modules which are only needed for logging and so should not be imported by
+# machinist unless a logger is used.
+_LOGGING_MODULES = (
+    "'eliot'", "'twisted.python.components'", "'machinist._logging'")
+
+_REPORT_LOGGING_MODULES = (
+    "import sys\n"
+    "sys.stdout.write(repr(sorted(\n"
+    "    name for name in (" + ", ".join(_LOGGING_MODULES) + ",)\n"
+    "    if sys.modules.get(name) is not None)))\n")
+
+
+
+class LoggingImportTests(TestCase):
+    """
+    Tests for the deferred import of L{machinist._logging}.
+    """
+    def test_noLoggingOnImport(self):
+        """
+        Importing L{machinist} does not import eliot or any of the other
+        modules needed only for logging.
+        """
+        output = runPython("import machinist\n" + _REPORT_LOGGING_MODULES)
+        self.assertEqual(b"[]", output)
+
+
+    def test_noLoggingWithoutLogger(self):
+        """
+        Constructing and using a state machine without a logger does not import
+        eliot or any of the other modules needed only for logging.
+        """
+        output = runPython(
+            "from twisted.python.constants import Names, NamedConstant\n"
+            "from machinist import (\n"
+            "    TransitionTable, MethodSuffixOutputer, trivialInput,\n"
+            "    constructFiniteStateMachine)\n"
+            "class Input(Names):\n"
+            "    apple = NamedConstant()\n"
+            "class Output(Names):\n"
+            "    aardvark = NamedConstant()\n"
+            "class State(Names):\n"
+            "    amber = NamedConstant()\n"
+            "class World(object):\n"
+            "    def output_AARDVARK(self, context):\n"
+            "        pass\n"
+            "fsm = constructFiniteStateMachine(\n"
+            "    Input, Output, State,\n"
+            "    TransitionTable().addTransition(\n"
+            "        State.amber, Input.apple, [Output.aardvark], State.amber),\n"
+            "    State.amber, [trivialInput(Input.apple)], {},\n"
+            "    MethodSuffixOutputer(World()), None)\n"
+            "fsm.receive(Input.apple)\n" + _REPORT_LOGGING_MODULES)
+        self.assertEqual(b"[]", output)
+
+
+    def test_logTypes(self):
+        """
+        The log types exposed by L{machinist} are those defined by
+        L{machinist._logging}.
+        """
+        from machinist import _logging
+        self.assertEqual(
+            (_logging.LOG_FSM_INITIALIZE, _logging.LOG_FSM_TRANSITION),
+            (machinist.LOG_FSM_INITIALIZE, machinist.LOG_FSM_TRANSITION))
+
+    if logSkipReason is not None:
+        test_logTypes.skip = logSkipReason
+
+
+
+class TwistedImportTests(TestCase):
+    """
+    Tests for the independence of L{machinist} from Twisted.
+    """
+    def test_noTwisted(self):
+        """
+        Constructing and using a state machine with symbols which are not
+        defined using L{twisted.python.constants} and without a logger does not
+        import Twisted.
+        """
+        output = runPython(
+            "from machinist import (\n"
+            "    TransitionTable, MethodSuffixOutputer, trivialInput,\n"
+            "    constructFiniteStateMachine)\n"
+            "class World(object):\n"
+            "    def output_AARDVARK(self, context):\n"
+            "        pass\n"
+            "fsm = constructFiniteStateMachine(\n"
+            "    ['apple'], ['aardvark'], ['amber'],\n"
+            "    TransitionTable().addTransition(\n"
+            "        'amber', 'apple', ['aardvark'], 'amber'),\n"
+            "    'amber', [trivialInput('apple')], {},\n"
+            "    MethodSuffixOutputer(World()), None)\n"
+            "fsm.receive('apple')\n"
+            "import sys\n"
+            "sys.stdout.write(repr(sorted(\n"
+            "    name for name in sys.modules\n"
+            "    if name.split('.')[0] == 'twisted'\n"
+            "    and sys.modules[name] is not None)))\n")
+        self.assertEqual(b"[]", output)
+
+
+
+class LazyImportTests(TestCase):
+    """
+    Tests for the deferred import of the modules only some users of
+    L{machinist} need.
+    """
+    def test_lazyModules(self):
+        """
+        Importing L{machinist} imports none of the modules which are only
+        needed for optional features, and starts no reactor.  (The time the
+        import takes is measured by the C{import} benchmark.)
+        """
+        output = runPython(
+            "import sys\n"
+            "import machinist\n"
+            "sys.stdout.write(repr(sorted(\n"
+            "    name for name in (\n"
+            "        'machinist._asyncio', 'machinist._version', 'asyncio',\n"
+            "        'multiprocessing', 'twisted.internet.reactor')\n"
+            "    if sys.modules.get(name) is not None)))\n")
+        self.assertEqual(b"[]", output)
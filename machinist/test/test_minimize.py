@@ -0,0 +1,230 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._minimize}.
+"""
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    MethodSuffixOutputer, Transition, TransitionTable, minimizeTable,
+    compileDefinition, constructFromDefinition,
+)
+
+from .test_fsm import MoreInput, Output, AnimalWorld
+
+
+
+class Light(Names):
+    """
+    States of a machine in which C{green} and C{yellow} behave the same, as do
+    C{red} and C{blinking}.
+    """
+    green = NamedConstant()
+    yellow = NamedConstant()
+    red = NamedConstant()
+    blinking = NamedConstant()
+
+
+
+# apple moves green/yellow to red/blinking with an output and back without;
+# banana is a self-loop everywhere.
+LIGHTS = TransitionTable().addTransitions(
+    Light.green, {
+        MoreInput.apple: ([Output.aardvark], Light.red),
+        MoreInput.banana: ([], Light.green)},
+).addTransitions(
+    Light.yellow, {
+        MoreInput.apple: ([Output.aardvark], Light.blinking),
+        MoreInput.banana: ([], Light.yellow)},
+).addTransitions(
+    Light.red, {
+        MoreInput.apple: ([], Light.yellow),
+        MoreInput.banana: ([], Light.red)},
+).addTransitions(
+    Light.blinking, {
+        MoreInput.apple: ([], Light.green),
+        MoreInput.banana: ([], Light.blinking)},
+)
+
+
+
+class MinimizeTableTests(TestCase):
+    """
+    Tests for L{minimizeTable}.
+    """
+    def test_merged(self):
+        """
+        L{minimizeTable} merges equivalent states into the earliest of them and
+        returns a mapping from every original state to its replacement.
+        """
+        table, mapping = minimizeTable(LIGHTS, Light)
+        self.assertEqual(
+            (TransitionTable().addTransitions(
+                Light.green, {
+                    MoreInput.apple: ([Output.aardvark], Light.red),
+                    MoreInput.banana: ([], Light.green)},
+            ).addTransitions(
+                Light.red, {
+                    MoreInput.apple: ([], Light.green),
+                    MoreInput.banana: ([], Light.red)},
+            ).table,
+             {Light.green: Light.green, Light.yellow: Light.green,
+              Light.red: Light.red, Light.blinking: Light.red}),
+            (table.table, mapping))
+
+
+    def test_initial(self):
+        """
+        The initial state is never merged into another state.
+        """
+        table, mapping = minimizeTable(LIGHTS, Light, Light.blinking)
+        self.assertEqual(
+            (Light.green, Light.blinking),
+            (mapping[Light.yellow], mapping[Light.red]))
+
+
+    def test_outputs(self):
+        """
+        States which produce different outputs for the same input are not
+        merged.
+        """
+        table = LIGHTS.addTransition(
+            Light.yellow, MoreInput.banana, [Output.aardvark], Light.yellow)
+        table, mapping = minimizeTable(table, Light)
+        self.assertEqual(
+            (Light.green, Light.yellow, Light.red, Light.blinking),
+            tuple(mapping[state] for state in Light.iterconstants()))
+
+
+    def test_handledInputs(self):
+        """
+        States which handle different inputs are not merged.
+        """
+        table = LIGHTS.addTransitions(
+            Light.blinking, {MoreInput.apple: ([], Light.green)})
+        del table.table[Light.blinking][MoreInput.banana]
+        table, mapping = minimizeTable(table, Light)
+        self.assertEqual(
+            (Light.green, Light.yellow, Light.red, Light.blinking),
+            tuple(mapping[state] for state in Light.iterconstants()))
+
+
+    def test_nextStates(self):
+        """
+        States which lead to inequivalent states are not merged, even if they
+        produce the same outputs.
+        """
+        # Only yellow (through blinking) can reach a state in which banana
+        # produces an output.
+        table = LIGHTS.addTransition(
+            Light.blinking, MoreInput.banana, [Output.aardvark],
+            Light.blinking)
+        table, mapping = minimizeTable(table, Light)
+        self.assertEqual(
+            (Light.green, Light.yellow, Light.red, Light.blinking),
+            tuple(mapping[state] for state in Light.iterconstants()))
+
+
+    def test_minimal(self):
+        """
+        A table with no equivalent states is returned unchanged.
+        """
+        table = LIGHTS.addTransition(
+            Light.blinking, MoreInput.banana, [Output.aardvark],
+            Light.blinking)
+        self.assertEqual(table.table, minimizeTable(table)[0].table)
+
+
+    def test_defaults(self):
+        """
+        A state which handles inputs with a default is merged with one which
+        handles them with equivalent transitions, and defaults remain
+        defaults.
+        """
+        # green and yellow loop on any other input, but yellow handles banana
+        # that way too.  red and blinking handle everything with defaults.
+        table = LIGHTS.addDefaultTransition(
+            Light.green, [], Light.green,
+        ).addDefaultTransition(
+            Light.yellow, [], Light.yellow,
+        ).addDefaultTransition(
+            Light.red, [], Light.green,
+        ).addDefaultTransition(Light.blinking, [], Light.yellow)
+        for state in [Light.red, Light.blinking]:
+            table.table[state] = {}
+        del table.table[Light.yellow][MoreInput.banana]
+        table, mapping = minimizeTable(table, Light)
+        self.assertEqual(
+            ((Light.green, Light.green, Light.red, Light.red),
+             {Light.green: Transition([], Light.green),
+              Light.red: Transition([], Light.green)}),
+            (tuple(mapping[state] for state in Light.iterconstants()),
+             table.defaults))
+
+
+    def test_timeouts(self):
+        """
+        States with the same timeout can be merged but states with different
+        timeouts are not, and the timeouts of the remaining states are kept.
+        """
+        same = LIGHTS.addTimeout(Light.red, 5, MoreInput.apple).addTimeout(
+            Light.blinking, 5, MoreInput.apple)
+        different = same.addTimeout(Light.blinking, 6, MoreInput.apple)
+        table, mapping = minimizeTable(same, Light)
+        self.assertEqual(
+            ((Light.green, Light.green, Light.red, Light.red),
+             {Light.red: (5, MoreInput.apple)},
+             Light.blinking),
+            (tuple(mapping[state] for state in Light.iterconstants()),
+             table.timeouts,
+             minimizeTable(different, Light)[1][Light.blinking]))
+
+
+
+class CompileMinimizedTests(TestCase):
+    """
+    Tests for L{compileDefinition} with C{minimize=True}.
+    """
+    def setUp(self):
+        self.definition = compileDefinition(
+            MoreInput, Output, Light, LIGHTS, Light.green, [], {},
+            minimize=True)
+
+
+    def test_definition(self):
+        """
+        The definition has only the remaining states and remembers which
+        state replaced each original one.
+        """
+        self.assertEqual(
+            ((Light.green, Light.red), Light.green),
+            (self.definition.states,
+             self.definition.stateMapping[Light.yellow]))
+
+
+    def test_notMinimized(self):
+        """
+        By default, L{compileDefinition} does not merge states.
+        """
+        definition = compileDefinition(
+            MoreInput, Output, Light, LIGHTS, Light.green, [], {})
+        self.assertEqual(
+            (Light, None), (definition.states, definition.stateMapping))
+
+
+    def test_behaviour(self):
+        """
+        A state machine constructed from a minimized definition produces the
+        same outputs as the original definition.
+        """
+        animals = []
+        fsm = constructFromDefinition(
+            self.definition, MethodSuffixOutputer(AnimalWorld(animals)), None)
+        for input in [MoreInput.apple, MoreInput.banana, MoreInput.apple,
+                      MoreInput.apple]:
+            fsm.receive(input)
+        self.assertEqual(
+            (Light.red, [(Output.aardvark, MoreInput.apple)] * 2),
+            (fsm.state, animals))
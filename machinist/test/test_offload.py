@@ -0,0 +1,194 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._offload}.
+"""
+
+from os import getpid
+from threading import Lock
+from zlib import crc32
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from zope.interface.verify import verifyObject
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    IOutputExecutor, TransitionTable, MethodSuffixOutputer, trivialInput,
+    payloadInput, constructFiniteStateMachine,
+    ProcessShards, OffloadingOutputer,
+)
+
+
+# Symbols are plain strings so that contexts can be pickled.
+TABLE = TransitionTable().addTransitions(
+    "waiting", {
+        "apple": (["note", "measure"], "waiting"),
+        "measured": (["record"], "waiting"),
+    },
+)
+
+Measured = payloadInput("measured", "result")
+
+
+
+def measure(context):
+    """
+    An offloaded output function which reports the process it ran in.
+    """
+    return context, getpid()
+
+
+
+def explode(context):
+    """
+    An offloaded output function which fails.
+    """
+    1 // 0
+
+
+
+class ThreadCalls(object):
+    """
+    A fake L{IReactorThreads} which keeps the calls made from other threads
+    until the test runs them.
+    """
+    def __init__(self):
+        self.calls = Queue()
+
+
+    def callFromThread(self, function, *args):
+        self.calls.put((function, args))
+
+
+    def runCalls(self, count):
+        """
+        Wait for and run some calls.
+        """
+        for i in range(count):
+            function, args = self.calls.get(timeout=30)
+            function(*args)
+
+
+
+class World(object):
+    def __init__(self, name):
+        self.name = name
+        self.notes = 0
+        self.results = []
+
+
+    def identifier(self):
+        return u"World(%s)" % (self.name,)
+
+
+    def output_NOTE(self, context):
+        self.notes += 1
+
+
+    def output_RECORD(self, context):
+        self.results.append(context.result)
+
+
+
+class OffloadingOutputerTests(TestCase):
+    """
+    Tests for L{OffloadingOutputer} and L{ProcessShards}.
+    """
+    def setUp(self):
+        self.reactor = ThreadCalls()
+        self.shards = ProcessShards(2, self.reactor)
+        self.addCleanup(self.shards.close)
+
+
+    def machine(self, world, function=measure):
+        """
+        Construct a state machine whose C{measure} output is offloaded to
+        C{self.shards}.
+
+        @return: A L{tuple} of the machine and its L{OffloadingOutputer}.
+        """
+        outputer = OffloadingOutputer(
+            MethodSuffixOutputer(world), self.shards,
+            {"measure": (function, Measured)})
+        fsm = constructFiniteStateMachine(
+            ["apple", "measured"], ["note", "measure", "record"], ["waiting"],
+            TABLE, "waiting", [trivialInput("apple"), Measured], {},
+            outputer, None)
+        outputer.fsm = fsm
+        return fsm, outputer
+
+
+    def test_interface(self):
+        """
+        L{OffloadingOutputer} provides L{IOutputExecutor} and has the
+        identifier of the executor it wraps.
+        """
+        outputer = self.machine(World("a"))[1]
+        self.assertEqual(
+            (True, u"World(a)"),
+            (verifyObject(IOutputExecutor, outputer), outputer.identifier()))
+
+
+    def test_offloaded(self):
+        """
+        Offloaded outputs are executed in a worker process and their results
+        are received by the machine, in order, as rich inputs.  Other outputs
+        are executed inline.
+        """
+        world = World("a")
+        fsm = self.machine(world)[0]
+        for i in range(3):
+            fsm.receive("apple")
+        self.assertEqual((3, []), (world.notes, world.results))
+        self.reactor.runCalls(3)
+        self.assertEqual(["apple"] * 3, [r for (r, pid) in world.results])
+        pids = set(pid for (r, pid) in world.results)
+        self.assertEqual(1, len(pids))
+        self.assertNotIn(getpid(), pids)
+
+
+    def test_shard(self):
+        """
+        L{ProcessShards.shard} assigns executors to workers by the CRC-32
+        checksum of their identifiers, so machines with the same identifier
+        share a worker.
+        """
+        shards = [self.shards.shard(u"World(%d)" % (i,)) for i in range(8)]
+        self.assertEqual(
+            [(crc32(("World(%d)" % (i,)).encode("ascii")) & 0xffffffff) % 2
+             for i in range(8)],
+            shards)
+        self.assertEqual(
+            self.machine(World("a"))[1]._shard,
+            self.machine(World("a"))[1]._shard)
+
+
+    def test_failed(self):
+        """
+        If an offloaded function raises an exception, the error is logged and
+        the machine receives nothing.
+        """
+        world = World("a")
+        fsm = self.machine(world, explode)[0]
+        fsm.receive("apple")
+        self.reactor.runCalls(1)
+        errors = self.flushLoggedErrors(RuntimeError)
+        self.assertEqual(([], 1), (world.results, len(errors)))
+
+
+    def test_unpicklable(self):
+        """
+        If the context of an offloaded output cannot be pickled, the error is
+        logged and the machine receives nothing.
+        """
+        world = World("a")
+        outputer = self.machine(world)[1]
+        outputer.output("measure", Lock())
+        self.reactor.runCalls(1)
+        errors = self.flushLoggedErrors(RuntimeError)
+        self.assertEqual(([], 1), (world.results, len(errors)))
@@ -0,0 +1,140 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._payload}.
+"""
+
+from zope.interface.verify import verifyObject
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    IRichInput, MethodSuffixOutputer, constructFiniteStateMachine,
+    payloadInput,
+)
+
+from .test_fsm import Input, Output, MoreState, TRANSITIONS, AnimalWorld
+from .loglib import MemoryLogger, logSkipReason
+
+
+
+Frame = payloadInput(Input.apple, "channel", "payload")
+
+
+
+class PayloadInputTests(TestCase):
+    """
+    Tests for L{payloadInput}.
+    """
+    def test_interface(self):
+        """
+        Instances of the type returned by L{payloadInput} provide
+        L{IRichInput} and their C{symbol} method returns the symbol passed
+        in.
+        """
+        frame = Frame(1, b"")
+        self.assertEqual(
+            (True, Input.apple),
+            (verifyObject(IRichInput, frame), frame.symbol()))
+
+
+    def test_fields(self):
+        """
+        Instances have the values of the fields given to them, in order, and
+        keep buffers without copying them.
+        """
+        payload = memoryview(b"hello")
+        frame = Frame(3, payload)
+        self.assertEqual(3, frame.channel)
+        self.assertIs(payload, frame.payload)
+
+
+    def test_slots(self):
+        """
+        Instances have no C{__dict__}.
+        """
+        self.assertFalse(hasattr(Frame(1, b""), "__dict__"))
+
+
+    def test_memoized(self):
+        """
+        L{payloadInput} returns the same type each time it is called with the
+        same symbol and fields.
+        """
+        self.assertIs(Frame, payloadInput(Input.apple, "channel", "payload"))
+
+
+    def test_equalSymbols(self):
+        """
+        L{payloadInput} returns different types for symbols which are equal
+        but of different types.
+        """
+        number = payloadInput(0, "value")
+        boolean = payloadInput(False, "value")
+        self.assertEqual(
+            (False, int, bool),
+            (number is boolean, type(number.symbol()),
+             type(boolean.symbol())))
+
+
+    def test_invalidField(self):
+        """
+        L{payloadInput} raises L{ValueError} if a field name is not an
+        identifier, is repeated or is C{"symbol"}.
+        """
+        for fields in [("no good",), ("class",), ("a", "a"), ("symbol",)]:
+            self.assertRaises(
+                ValueError, payloadInput, Input.apple, *fields)
+
+
+    def test_repr(self):
+        """
+        Instances are rendered with the name of the symbol and the L{repr} of
+        each of their fields.
+        """
+        self.assertEqual(
+            "<Apple channel=1 payload='hi'>",
+            repr(Frame(1, memoryview(b"hi"))))
+
+
+    def test_reprSubclass(self):
+        """
+        Instances of a slotted subclass are rendered with the fields of the
+        type it subclasses.
+        """
+        class Subclass(Frame):
+            __slots__ = ()
+
+        self.assertEqual(
+            "<Subclass channel=1 payload='hi'>",
+            repr(Subclass(1, memoryview(b"hi"))))
+
+
+    def test_truncated(self):
+        """
+        Buffers longer than sixteen bytes are rendered as their length and
+        the first sixteen bytes, in hexadecimal.
+        """
+        self.assertEqual(
+            "<Apple channel=1 payload=<65536 bytes %s...>>" % ("00" * 16,),
+            repr(Frame(1, bytearray(65536))))
+
+
+    def test_logging(self):
+        """
+        A payload input is logged in the C{fsm_rich_input} field of a
+        transition as it is rendered.
+        """
+        logger = MemoryLogger()
+        fsm = constructFiniteStateMachine(
+            Input, Output, MoreState, TRANSITIONS, MoreState.amber, [Frame],
+            {}, MethodSuffixOutputer(AnimalWorld([])), logger)
+        frame = Frame(1, memoryview(b"hi"))
+        fsm.receive(frame)
+        self.assertEqual(
+            u"<Apple channel=1 payload='hi'>",
+            logger.messages[1][u"fsm_rich_input"])
+        logger.validate()
+
+    if logSkipReason is not None:
+        test_logging.skip = logSkipReason
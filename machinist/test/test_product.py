@@ -0,0 +1,179 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._product}.
+"""
+
+from zope.interface import implementer
+from zope.interface.exceptions import DoesNotImplement
+
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    IOutputExecutor, UnhandledInput, TransitionTable, trivialInput,
+    compileDefinition, constructFromDefinition, productDefinition,
+)
+
+from .test_fsm import Input, MoreInput, Output, MoreState, IFood
+from .test_definition import IOtherFood
+
+
+
+@implementer(IOutputExecutor)
+class RecordingWorld(object):
+    """
+    An L{IOutputExecutor} which records the outputs it is asked to execute.
+    """
+    def __init__(self):
+        self.outputs = []
+
+
+    def identifier(self):
+        return u"<RecordingWorld>"
+
+
+    def output(self, output, context):
+        self.outputs.append(output)
+
+
+
+# apple toggles between amber and blue, with an output on the way to blue.
+TOGGLE = compileDefinition(
+    MoreInput, Output, MoreState,
+    TransitionTable().addTransitions(
+        MoreState.amber, {
+            MoreInput.apple: ([Output.aardvark], MoreState.blue),
+            MoreInput.banana: ([], MoreState.amber)},
+    ).addTransitions(
+        MoreState.blue, {
+            MoreInput.apple: ([], MoreState.amber),
+            MoreInput.banana: ([], MoreState.blue)},
+    ),
+    MoreState.amber, [], {})
+
+# banana unlocks and apple locks again, beeping each time.
+LOCK = compileDefinition(
+    MoreInput, [u"beep"], [u"locked", u"unlocked"],
+    TransitionTable().addTransition(
+        u"locked", MoreInput.banana, [u"beep"], u"unlocked",
+    ).addTransitions(
+        u"unlocked", {
+            MoreInput.apple: ([u"beep"], u"locked"),
+            MoreInput.banana: ([], u"unlocked")},
+    ),
+    u"locked", [], {})
+
+
+
+class ProductDefinitionTests(TestCase):
+    """
+    Tests for L{productDefinition}.
+    """
+    def setUp(self):
+        self.definition = productDefinition([TOGGLE, LOCK])
+        self.world = RecordingWorld()
+        self.fsm = constructFromDefinition(self.definition, self.world, None)
+
+
+    def test_states(self):
+        """
+        The states of the combined definition are the reachable combinations
+        of the states of each definition, starting with the combination of the
+        initial states.
+        """
+        definition = productDefinition([TOGGLE, TOGGLE])
+        self.assertEqual(
+            ((MoreState.amber, MoreState.amber),
+             ((MoreState.amber, MoreState.amber),
+              (MoreState.blue, MoreState.blue))),
+            (definition.initial, definition.states))
+
+
+    def test_lockstep(self):
+        """
+        A state machine constructed from the combined definition moves
+        through the same states and produces the same outputs, in the order
+        the definitions were given, as separate state machines receiving the
+        same inputs.
+        """
+        toggleWorld = RecordingWorld()
+        lockWorld = RecordingWorld()
+        toggle = constructFromDefinition(TOGGLE, toggleWorld, None)
+        lock = constructFromDefinition(LOCK, lockWorld, None)
+        for input in [MoreInput.banana, MoreInput.apple, MoreInput.banana,
+                      MoreInput.apple]:
+            outputs = self.fsm.receive(input)
+            self.assertEqual(
+                (toggle.receive(input) + lock.receive(input),
+                 (toggle.state, lock.state)),
+                (outputs, self.fsm.state))
+        self.assertEqual(
+            [u"beep", Output.aardvark, u"beep", u"beep", u"beep"],
+            self.world.outputs)
+
+
+    def test_unhandled(self):
+        """
+        An input is not handled by the combined state machine if it is not
+        handled by one of the definitions in its current state.
+        """
+        exc = self.assertRaises(
+            UnhandledInput, self.fsm.receive, MoreInput.apple)
+        self.assertEqual(
+            ((MoreState.amber, u"locked"), MoreInput.apple), exc.args)
+
+
+    def test_differentInputs(self):
+        """
+        L{productDefinition} raises L{ValueError} if the definitions have
+        different input alphabets.
+        """
+        other = compileDefinition(
+            Input, Output, MoreState,
+            TransitionTable().addTransition(
+                MoreState.amber, Input.apple, [Output.aardvark],
+                MoreState.blue).addTerminalState(MoreState.blue),
+            MoreState.amber, [], {})
+        self.assertRaises(ValueError, productDefinition, [TOGGLE, other])
+
+
+    def test_timeouts(self):
+        """
+        L{productDefinition} raises L{ValueError} if any of the definitions
+        has timeouts.
+        """
+        timed = compileDefinition(
+            TOGGLE.inputs, TOGGLE.outputs, TOGGLE.states,
+            TOGGLE.table.addTimeout(MoreState.blue, 1, MoreInput.apple),
+            TOGGLE.initial, [], {})
+        self.assertRaises(ValueError, productDefinition, [LOCK, timed])
+
+
+    def test_differentInputContext(self):
+        """
+        L{productDefinition} raises L{ValueError} if the definitions require
+        different input contexts for the same output.
+        """
+        first = compileDefinition(
+            TOGGLE.inputs, TOGGLE.outputs, TOGGLE.states, TOGGLE.table,
+            TOGGLE.initial, [], {Output.aardvark: IFood})
+        second = compileDefinition(
+            TOGGLE.inputs, TOGGLE.outputs, TOGGLE.states, TOGGLE.table,
+            TOGGLE.initial, [], {Output.aardvark: IOtherFood})
+        self.assertRaises(ValueError, productDefinition, [first, second])
+
+
+    def test_richInputContext(self):
+        """
+        L{productDefinition} raises L{DoesNotImplement} if a rich input type
+        of one definition does not provide the interface required by an
+        output of another definition which it produces in the combined
+        definition.
+        """
+        toggle = compileDefinition(
+            TOGGLE.inputs, TOGGLE.outputs, TOGGLE.states, TOGGLE.table,
+            TOGGLE.initial, [trivialInput(MoreInput.banana)], {})
+        lock = compileDefinition(
+            LOCK.inputs, LOCK.outputs, LOCK.states, LOCK.table,
+            LOCK.initial, [], {u"beep": IFood})
+        self.assertRaises(DoesNotImplement, productDefinition, [toggle, lock])
@@ -0,0 +1,142 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._record}.
+"""
+
+from twisted.python.constants import Names, NamedConstant
+from twisted.trial.unittest import TestCase
+
+from machinist import (
+    InvalidStatefulState, WrongState, stateful, statefulRecord, statefulView,
+)
+
+from .test_fsm import MoreState
+
+
+
+class Phase(Names):
+    open = NamedConstant()
+    closing = NamedConstant()
+    closed = NamedConstant()
+
+
+
+class _Machine(object):
+    state = Phase.open
+
+
+
+@statefulRecord("_fsm.state", Phase)
+class Session(object):
+    __slots__ = ("_fsm", "_peer", "__dict__")
+
+    buffer = stateful("_fsm.state", Phase.open)
+    peer = stateful("_fsm.state", Phase.open, Phase.closing, slot="_peer")
+
+    def __init__(self):
+        self._fsm = _Machine()
+        self.buffer = b"data"
+        self.peer = u"peer"
+
+
+
+class StatefulRecordTests(TestCase):
+    """
+    Tests for L{statefulRecord}.
+    """
+    def test_invalidState(self):
+        """
+        L{statefulRecord} raises L{InvalidStatefulState} when it decorates a
+        class with a L{stateful} attribute allowed in a state which is not one
+        of the given states.
+        """
+        class Mixed(object):
+            good = stateful("_fsm.state", Phase.open)
+            bad = stateful("_fsm.state", Phase.closed, MoreState.amber)
+
+        exc = self.assertRaises(
+            InvalidStatefulState, statefulRecord("_fsm.state", Phase), Mixed)
+        self.assertEqual(("bad", set([MoreState.amber])), exc.args)
+
+
+    def test_inherited(self):
+        """
+        L{stateful} attributes inherited from base classes are part of the
+        record.
+        """
+        @statefulRecord("_fsm.state", Phase)
+        class Derived(Session):
+            extra = stateful("_fsm.state", Phase.closing)
+
+        self.assertEqual(
+            set(["buffer", "peer", "extra"]),
+            set(Derived._statefulRecord.attributes))
+
+
+
+class StatefulViewTests(TestCase):
+    """
+    Tests for L{statefulView}.
+    """
+    def setUp(self):
+        self.session = Session()
+
+
+    def test_allowed(self):
+        """
+        Attributes allowed in the state the object is in can be read through
+        the view.
+        """
+        view = statefulView(self.session)
+        self.assertEqual((b"data", u"peer"), (view.buffer, view.peer))
+
+
+    def test_disallowed(self):
+        """
+        Reading an attribute not allowed in the state the object was in when
+        the view was created raises L{WrongState}.
+        """
+        self.session._fsm.state = Phase.closing
+        view = statefulView(self.session)
+        self.assertEqual(u"peer", view.peer)
+        self.assertRaises(WrongState, getattr, view, "buffer")
+
+
+    def test_stateChecked(self):
+        """
+        The view does not look up the state of the object again when an
+        attribute is read.
+        """
+        view = statefulView(self.session)
+        self.session._fsm = None
+        self.assertEqual(b"data", view.buffer)
+
+
+    def test_missing(self):
+        """
+        Reading an allowed attribute without a value, or a name which is not a
+        L{stateful} attribute, raises L{AttributeError}.
+        """
+        del self.session.buffer
+        view = statefulView(self.session)
+        self.assertRaises(AttributeError, getattr, view, "buffer")
+        self.assertRaises(AttributeError, getattr, view, "unknown")
+
+
+    def test_contextManager(self):
+        """
+        A view can be used as a context manager, after which it no longer
+        allows attributes to be read.
+        """
+        with statefulView(self.session) as view:
+            self.assertEqual(u"peer", view.peer)
+        self.assertRaises(WrongState, getattr, view, "peer")
+
+
+    def test_notRecord(self):
+        """
+        L{statefulView} raises L{TypeError} for an object whose class is not
+        decorated with L{statefulRecord}.
+        """
+        self.assertRaises(TypeError, statefulView, object())
@@ -0,0 +1,115 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist._timer}.
+"""
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from machinist import TimerWheel
+
+
+
+class TimerWheelTests(TestCase):
+    """
+    Tests for L{TimerWheel}.
+    """
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.advance(1000)
+        # Small enough that some timers are kept in the coarser levels or
+        # beyond them.
+        self.wheel = TimerWheel(self.clock, resolution=0.1, size=4, levels=2)
+        self.calls = []
+
+
+    def schedule(self, seconds, name):
+        return self.wheel.callLater(seconds, self.calls.append, name)
+
+
+    def test_fires(self):
+        """
+        L{TimerWheel.callLater} calls the function with the given arguments
+        once the given number of seconds has passed.
+        """
+        self.schedule(1, "a")
+        self.clock.advance(0.9)
+        before = list(self.calls)
+        self.clock.advance(0.1)
+        self.assertEqual(([], ["a"]), (before, self.calls))
+
+
+    def test_order(self):
+        """
+        Timers due at different times, including those beyond the span of
+        the wheel, fire in order at the right times.
+        """
+        # Times and ticks which add up exactly.
+        wheel = TimerWheel(self.clock, resolution=0.125, size=4, levels=2)
+        for seconds in [0.375, 50, 2.5, 7, 1.25, 33.375]:
+            wheel.callLater(seconds, self.calls.append, seconds)
+        fired = []
+        for tick in range(1, 401):
+            self.clock.advance(0.125)
+            fired.extend((seconds, tick) for seconds in self.calls)
+            del self.calls[:]
+        self.assertEqual(
+            [(0.375, 3), (1.25, 10), (2.5, 20), (7, 56), (33.375, 267),
+             (50, 400)],
+            fired)
+
+
+    def test_cancel(self):
+        """
+        A timer which has been cancelled does not fire.
+        """
+        timer = self.schedule(1, "a")
+        self.schedule(10, "b")
+        before = timer.active()
+        timer.cancel()
+        self.clock.advance(10)
+        self.assertEqual(
+            (True, False, ["b"]), (before, timer.active(), self.calls))
+
+
+    def test_oneCall(self):
+        """
+        However many timers are scheduled, the wheel has one call scheduled
+        with the clock, and none once all of the timers have fired.
+        """
+        for seconds in range(1, 20):
+            self.schedule(seconds, seconds)
+        pending = len(self.clock.getDelayedCalls())
+        self.clock.pump([0.1] * 200)
+        self.assertEqual(
+            (1, [], list(range(1, 20))),
+            (pending, self.clock.getDelayedCalls(), self.calls))
+
+
+    def test_idle(self):
+        """
+        Timers scheduled after the wheel has been idle are due relative to
+        the time they are scheduled.
+        """
+        self.schedule(0.5, "a")
+        self.clock.advance(0.5)
+        self.clock.advance(100)
+        self.schedule(0.5, "b")
+        self.clock.advance(0.4)
+        before = list(self.calls)
+        self.clock.advance(0.1)
+        self.assertEqual((["a"], ["a", "b"]), (before, self.calls))
+
+
+    def test_error(self):
+        """
+        An exception raised by the function of a timer is logged and does not
+        stop other timers from firing.
+        """
+        self.wheel.callLater(1, lambda: 1 // 0)
+        self.schedule(1, "a")
+        self.clock.advance(1)
+        self.assertEqual(
+            (1, ["a"]),
+            (len(self.flushLoggedErrors(ZeroDivisionError)), self.calls))
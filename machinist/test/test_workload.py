@@ -0,0 +1,201 @@
+# Copyright Hybrid Logic Ltd.  See LICENSE file for details.
+
+"""
+Tests for L{machinist.benchmark._workload}.
+"""
+
+from twisted.python.constants import Names
+from twisted.trial.unittest import TestCase
+
+from machinist import IRichInput, UnhandledInput
+from machinist._definition import _symbols
+from machinist.benchmark import generateWorkload
+
+
+
+def deliver(workload, stream):
+    """
+    Deliver a stream of inputs to a new machine constructed from a workload.
+
+    @return: The number of inputs which were not handled.
+    """
+    machine = workload.construct()
+    unhandled = 0
+    for input in stream:
+        try:
+            machine.receive(input)
+        except UnhandledInput:
+            unhandled += 1
+    return unhandled
+
+
+
+class GenerateWorkloadTests(TestCase):
+    """
+    Tests for L{generateWorkload}.
+    """
+    def test_valid(self):
+        """
+        L{generateWorkload} returns a definition which passes all of the checks
+        made by L{constructFiniteStateMachine}, for a range of shapes.
+        """
+        for structure in (u"random", u"ring"):
+            for (states, inputs, outputs, density, fanOut) in [
+                    (1, 1, 1, 0.0, 1), (1, 5, 3, 1.0, 2), (40, 3, 2, 0.1, 1),
+                    (7, 11, 0, 0.5, 3), (64, 16, 8, 0.3, 4)]:
+                generateWorkload(
+                    states, inputs, outputs, density, fanOut, 0.5,
+                    structure).compile()
+
+
+    def test_sizes(self):
+        """
+        The workload has the requested numbers of symbols, transitions, outputs
+        per transition and rich inputs.
+        """
+        workload = generateWorkload(
+            states=10, inputs=4, outputs=3, density=0.5, fanOut=2,
+            richRatio=0.5)
+        transitions = [
+            transition
+            for row in workload.table.table.values()
+            for transition in row.values()]
+        self.assertEqual(
+            (4, 3, 10, 20, set([2]), 2),
+            (len(_symbols(workload.inputs)), len(_symbols(workload.outputs)),
+             len(_symbols(workload.states)), len(transitions),
+             set(len(transition.output) for transition in transitions),
+             len(workload.richInputs)))
+
+
+    def test_names(self):
+        """
+        By default the symbols are defined by L{Names} subclasses.
+        """
+        workload = generateWorkload()
+        self.assertTrue(issubclass(workload.states, Names))
+
+
+    def test_strings(self):
+        """
+        If C{u"strings"} is given for C{symbols}, the symbols are L{unicode}
+        strings.
+        """
+        workload = generateWorkload(inputs=2, symbols=u"strings")
+        self.assertEqual((u"input0", u"input1"), workload.inputs)
+
+
+    def test_deterministic(self):
+        """
+        L{generateWorkload} returns the same definition when called with the
+        same seed.
+        """
+        self.assertEqual(
+            generateWorkload(seed=5).compile().fingerprint,
+            generateWorkload(seed=5).compile().fingerprint)
+
+
+    def test_seed(self):
+        """
+        L{generateWorkload} returns different random definitions for different
+        seeds.
+        """
+        self.assertNotEqual(
+            generateWorkload(seed=5).compile().fingerprint,
+            generateWorkload(seed=6).compile().fingerprint)
+
+
+    def test_ring(self):
+        """
+        The C{u"ring"} structure does not depend on the seed.
+        """
+        self.assertEqual(
+            generateWorkload(structure=u"ring", seed=5).compile().fingerprint,
+            generateWorkload(structure=u"ring", seed=6).compile().fingerprint)
+
+
+    def test_tooFewTransitions(self):
+        """
+        L{generateWorkload} raises L{ValueError} if the transitions cannot emit
+        every output.
+        """
+        self.assertRaises(
+            ValueError, generateWorkload, states=1, inputs=1, outputs=3)
+
+
+    def test_unknownStructure(self):
+        """
+        L{generateWorkload} raises L{ValueError} if given an unknown structure.
+        """
+        self.assertRaises(ValueError, generateWorkload, structure=u"tree")
+
+
+
+class InputStreamTests(TestCase):
+    """
+    Tests for L{Workload.inputStream}.
+    """
+    def setUp(self):
+        self.workload = generateWorkload(
+            states=20, inputs=6, density=0.4, richRatio=0.5)
+
+
+    def test_length(self):
+        """
+        L{Workload.inputStream} returns the requested number of inputs.
+        """
+        for distribution in (u"uniform", u"zipf", u"adversarial"):
+            self.assertEqual(
+                37, len(self.workload.inputStream(37, distribution)))
+
+
+    def test_handled(self):
+        """
+        Every input in a C{u"uniform"} or C{u"zipf"} stream is handled by the
+        machine.
+        """
+        for distribution in (u"uniform", u"zipf"):
+            stream = self.workload.inputStream(500, distribution)
+            self.assertEqual(0, deliver(self.workload, stream))
+
+
+    def test_adversarial(self):
+        """
+        Every other input in a C{u"adversarial"} stream is not handled by the
+        machine.
+        """
+        stream = self.workload.inputStream(500, u"adversarial")
+        self.assertEqual(250, deliver(self.workload, stream))
+
+
+    def test_allHandled(self):
+        """
+        L{Workload.inputStream} raises L{ValueError} if asked for an
+        C{u"adversarial"} stream when every input is always handled.
+        """
+        workload = generateWorkload(density=1.0)
+        self.assertRaises(ValueError, workload.inputStream, 10, u"adversarial")
+
+
+    def test_zipf(self):
+        """
+        In a C{u"zipf"} stream, the first input of the alphabet is more common
+        than the last.
+        """
+        workload = generateWorkload(states=1, inputs=4, density=1.0)
+        first, last = _symbols(workload.inputs)[0::3]
+        stream = workload.inputStream(1000, u"zipf")
+        self.assertTrue(stream.count(first) > 2 * stream.count(last))
+
+
+    def test_rich(self):
+        """
+        Inputs with a rich input type are given as instances of that type.
+        """
+        richInputs = tuple(self.workload.richInputs)
+        for input in self.workload.inputStream(100):
+            if IRichInput.providedBy(input):
+                self.assertIsInstance(input, richInputs)
+            else:
+                self.assertNotIn(
+                    input, [rich.symbol() for rich in richInputs])
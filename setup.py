@@ -23,7 +23,7 @@ if __name__ == '__main__':
         version=versioneer.get_version(),
         # Allow versioneer to integrate with setup commands:
         cmdclass=versioneer.get_cmdclass(),
-        packages=["machinist", "machinist.test"],
+        packages=["machinist", "machinist.benchmark", "machinist.test"],
         description=cleandoc("""
             Machinist is a tool for building finite state machines.
         """),
@@ -60,11 +60,13 @@ if __name__ == '__main__':
             "Topic :: Software Development :: Libraries :: Python Modules",
             ],
         install_requires=[
-            "zope.interface>=3.6.0", "twisted>=13.1",
+            "zope.interface>=3.6.0",
             ],
         extras_require={
-            "dev": ["sphinx>=1.2.2"],
-            "logging": ["eliot>=" + _MINIMUM_ELIOT_VERSION],
+            "dev": ["sphinx>=1.2.2", "twisted>=13.1"],
+            "logging": [
+                "eliot>=" + _MINIMUM_ELIOT_VERSION, "twisted>=13.1",
+                ],
             },
         test_suite="machinist",
         )